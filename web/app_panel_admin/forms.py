@@ -1,5 +1,5 @@
-# FILE: web/app_panel_admin/forms.py  (обновлено — 2026-02-16)
-# PURPOSE: Emission-Form: добавить поле minimal_bonds_quantity (минимальное количество облигаций) + сохранить прежние фиксы даты/десятичных/contract__.
+# FILE: web/app_panel_admin/forms.py  (обновлено — 2026-10-17)
+# PURPOSE: Emission-Form: поля holiday_subdiv (Bundesland für Feiertage) и day_count_convention (Zinsmethode) + прежние фиксы даты/десятичных/contract__.
 
 from __future__ import annotations
 
@@ -47,6 +47,8 @@ class BondIssueForm(forms.ModelForm):
             "term_months",
             "minimal_bonds_quantity",
             "documents_sent_other",
+            "holiday_subdiv",
+            "day_count_convention",
         ]
         widgets = {"issue_date": forms.DateInput(attrs={"type": "date"})}
 
@@ -74,6 +76,8 @@ class BondIssueForm(forms.ModelForm):
         self.fields["term_months"].label = "Laufzeit (Monate)"
         self.fields["minimal_bonds_quantity"].label = "Mindestmenge"
         self.fields["documents_sent_other"].label = "Dokumente Sonstige"
+        self.fields["holiday_subdiv"].label = "Feiertage (Bundesland)"
+        self.fields["day_count_convention"].label = "Zinsmethode"
         self.fields["rate_tippgeber"].required = False
         self.fields["documents_sent_other"].required = False
         if not (self.instance and self.instance.pk):
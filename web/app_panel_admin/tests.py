@@ -1,3 +1,577 @@
-from django.test import TestCase
+from __future__ import annotations
 
-# Create your tests here.
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from io import StringIO
+import os
+import random
+import tempfile
+from unittest import mock
+
+import numpy as np
+from babel.numbers import format_decimal
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db.models.query import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from app_users.models import FlexxUser
+from flexx.contract_helpers import _contract_amounts, calc_stueckzins_for_date
+from flexx.contract_recalc import recalc_issue_contracts
+from flexx.coupon_run import COUPON_CSV_HEADER, contract_payment_schedule, iter_coupon_payments
+from flexx.day_count import _day_count_30_360_us, day_count_30_360_us_array
+from flexx.models import BondIssue, BondIssueStueckzinsTable, Contract, PdfRenderJob
+from flexx.pdf_fingerprint import file_sha256
+from flexx.pdf_jobs import run_pending_pdf_jobs
+from flexx.overdue_report import iter_overdue_contracts
+from flexx import stueckzins_table
+from flexx.stueckzins_table import (
+    calc_issue_contract_amounts,
+    get_issue_stueckzins_on,
+    get_issue_stueckzins_rows,
+    stueckzins_table_key,
+)
+from flexx.issue_scenarios import build_issue_scenarios
+from flexx.money import (
+    div_half_up,
+    format_cents_de,
+    format_units_de,
+    from_cents,
+    to_cents,
+    to_units,
+    tippgeber_provision_cents,
+)
+
+
+class IssueScenarioGridTests(SimpleTestCase):
+    """Векторный 30/360 и сетка сценариев == скалярные функции contract_helpers."""
+
+    def test_day_count_array_matches_scalar(self):
+        rnd = random.Random(5)
+        for _ in range(100):
+            d1 = date(2000, 1, 1) + timedelta(days=rnd.randrange(0, 365 * 30))
+            if rnd.random() < 0.5:
+                # 28.–31. (inkl. Februar-Monatsende)
+                d1 = date(d1.year, rnd.choice([1, 2, 3, 8]), 28) + timedelta(days=rnd.randint(0, 3))
+            days = np.datetime64(d1, "D") + np.arange(0, 800)
+            expected = [_day_count_30_360_us(d1, d1 + timedelta(days=i)) for i in range(0, 800)]
+            with self.subTest(d1=d1):
+                self.assertEqual(day_count_30_360_us_array(d1, days).tolist(), expected)
+
+    def test_grid_stueckzins_matches_single_date(self):
+        issue_date = date(2026, 1, 31)
+        rates = [Decimal("3.25"), Decimal("6.00")]
+        terms = [12, 36]
+        prices = [Decimal("100.00"), Decimal("1000.00")]
+        grid = build_issue_scenarios(
+            issue_date=issue_date,
+            rates_percent=rates,
+            terms_months=terms,
+            bond_prices=prices,
+            issue_volume=Decimal("1000000"),
+        )
+        self.assertEqual(grid.total_cost.shape, (2, 2, 2))
+        for r, rate in enumerate(rates):
+            for t, term in enumerate(terms):
+                for p, price in enumerate(prices):
+                    curve = grid.curve(r, t, p)
+                    for offset in (0, 29, 180, len(curve) - 1):
+                        expected = calc_stueckzins_for_date(
+                            issue_date=issue_date,
+                            term_months=term,
+                            interest_rate_percent=rate,
+                            nominal_value=price,
+                            pay_date=issue_date + timedelta(days=offset),
+                        )
+                        self.assertAlmostEqual(float(curve[offset]), float(expected), places=9)
+
+
+def _q2(value: Decimal) -> Decimal:
+    return value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+class MoneyTests(SimpleTestCase):
+    """Целочисленные центы == прежняя Decimal-арифметика с quantize(ROUND_HALF_UP)."""
+
+    def test_div_half_up(self):
+        for num, den, expected in [(5, 10, 1), (4, 10, 0), (15, 10, 2), (-5, 10, -1), (-4, 10, 0), (-15, 10, -2), (0, 7, 0)]:
+            with self.subTest(num=num, den=den):
+                self.assertEqual(div_half_up(num, den), expected)
+
+    def test_units_roundtrip_and_format(self):
+        self.assertEqual(to_cents(Decimal("1.005")), 101)
+        self.assertEqual(to_cents(Decimal("-1.005")), -101)
+        self.assertEqual(to_cents("12.34"), 1234)
+        self.assertEqual(str(from_cents(1234)), "12.34")
+        self.assertEqual(str(from_cents(0)), "0.00")
+        self.assertEqual(format_units_de(to_units(Decimal("3.1415926"), 6), 6), "3,141593")
+        self.assertEqual(format_units_de(5, 6), "0,000005")
+
+    def test_tippgeber_provision_matches_decimal(self):
+        rnd = random.Random(7)
+        rates = [0, 1, 2.5, 3.0, 5, 5.25, 7.125, 0.333, 10.0]
+        for _ in range(3000):
+            nominal = Decimal(rnd.randint(0, 10**11)) / Decimal("100")
+            rate = rnd.choice(rates)
+            provision = _q2(nominal * Decimal(str(rate)) / Decimal("100"))
+            vat = _q2(provision * Decimal("0.19"))
+            expected = (provision, vat, _q2(provision + vat))
+            with self.subTest(nominal=nominal, rate=rate):
+                self.assertEqual(list(tippgeber_provision_cents(nominal, rate)), [to_cents(v) for v in expected])
+
+    def test_format_cents_de_matches_babel(self):
+        rnd = random.Random(11)
+        for cents in [0, 5, 99, 100, -1, -123456, 100000, 123456789] + [rnd.randint(-10**12, 10**12) for _ in range(500)]:
+            with self.subTest(cents=cents):
+                self.assertEqual(format_cents_de(cents), format_decimal(from_cents(cents), format="#,##0.00", locale="de_DE"))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PDF_RENDER_ASYNC=True)
+class ContractRecalcTests(TestCase):
+    """Пересчёт после изменения условий эмиссии: finalisierte, не подписанные договоры + новый PDF, bulk_update пачками."""
+
+    def setUp(self):
+        self.issue = BondIssue.objects.create(
+            title="Anleihe",
+            issue_date=date(2025, 1, 15),
+            interest_rate=Decimal("5.50"),
+            bond_price=Decimal("1000.00"),
+            issue_volume=Decimal("1000000.00"),
+            term_months=120,
+        )
+        self.user = FlexxUser.objects.create_user(email="kunde@example.de", last_name="Muster", role="client")
+        self.admin = FlexxUser.objects.create_user(email="admin@example.de", role="admin")
+        self.contract_date = timezone.localdate() + timedelta(days=3)
+
+        self.rendered = [self._finalize(qty) for qty in (1, 2, 3)]
+        self.signed = self._finalize(4)
+        run_pending_pdf_jobs()  # PDF beim Kunden
+        self.client.force_login(self.admin)
+        self.client.post(reverse("panel_admin_contract_toggle_signed", args=[self.signed.id]))
+        self.queued = self._finalize(5)  # PDF noch in der Warteschlange
+        self.unfinalized = Contract.objects.create(issue=self.issue, client=self.user)
+
+        self.issue.interest_rate = Decimal("6.00")
+        self.issue.save()
+
+    def _finalize(self, qty: int) -> Contract:
+        contract = Contract.objects.create(issue=self.issue, client=self.user)
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse("panel_client_contract_application"),
+            {
+                "action": "finalize",
+                "contract_id": contract.id,
+                "contract_date": self.contract_date.isoformat(),
+                "bonds_quantity": str(qty),
+                "receipt_confirm_contract": "1",
+            },
+        )
+        contract.refresh_from_db()
+        self.assertEqual(contract.bonds_quantity, qty)
+        return contract
+
+    def _expected(self, qty: int) -> tuple:
+        settlement_date, nominal, _, total = calc_issue_contract_amounts(
+            issue=self.issue, sign_date=self.contract_date, quantity=qty, banking_days_plus=10
+        )
+        return settlement_date, nominal, total
+
+    def _amounts(self, contract: Contract) -> tuple:
+        contract.refresh_from_db()
+        return contract.settlement_date, contract.nominal_amount, contract.nominal_amount_plus_percent
+
+    def test_dry_run_reports_diff_without_writing(self):
+        before = [self._amounts(c) for c in self.rendered + [self.queued]]
+        jobs = PdfRenderJob.objects.count()
+
+        report = recalc_issue_contracts(self.issue, dry_run=True)
+        self.assertEqual(report.checked, 4)
+        self.assertEqual([c.contract_id for c in report.changes], [c.id for c in self.rendered + [self.queued]])
+        for change, contract, old in zip(report.changes, self.rendered + [self.queued], before):
+            self.assertEqual(change.old, old)
+            self.assertEqual(change.new, self._expected(contract.bonds_quantity))
+            self.assertIn("nominal_amount_plus_percent: ", change.line())
+        self.assertEqual(report.rerender_ids, [c.id for c in self.rendered])
+        self.assertIn(f"Contract#{self.rendered[-1].id}", report.lines()[-1])
+
+        self.assertEqual([self._amounts(c) for c in self.rendered + [self.queued]], before)
+        self.assertEqual(PdfRenderJob.objects.count(), jobs)
+
+    def test_apply_updates_amounts_and_rerenders_pdf(self):
+        signed_before = self._amounts(self.signed)
+        pdf_before = {c.id: file_sha256(c.contract_pdf) for c in self.rendered}
+        get_issue_stueckzins_rows(self.issue)  # Tabelle im Prozess-Cache
+        # Warteschlange + Auswahl + 2 bulk_update (Pakete 2/2) + 3 neue Aufträge + SAVEPOINT/RELEASE
+        with self.assertNumQueries(9):
+            report = recalc_issue_contracts(self.issue, dry_run=False, batch_size=2)
+        self.assertEqual(len(report.changes), 4)
+        for contract in self.rendered + [self.queued]:
+            self.assertEqual(self._amounts(contract), self._expected(contract.bonds_quantity))
+        self.assertEqual(self._amounts(self.signed), signed_before)
+        self.assertEqual(self._amounts(self.unfinalized), (None, None, None))
+
+        pending = PdfRenderJob.objects.filter(status=PdfRenderJob.Status.PENDING, kind=PdfRenderJob.Kind.CREATED)
+        self.assertEqual(
+            sorted(pending.values_list("contract_id", flat=True)), [c.id for c in self.rendered + [self.queued]]
+        )
+        run_pending_pdf_jobs()
+        for contract in self.rendered:
+            contract.refresh_from_db()
+            self.assertNotEqual(file_sha256(contract.contract_pdf), pdf_before[contract.id])
+        self.queued.refresh_from_db()
+        self.assertTrue(self.queued.contract_pdf)
+
+        self.assertEqual(recalc_issue_contracts(self.issue, dry_run=True).changes, [])
+
+class CouponRunTests(TestCase):
+    """Zinslauf: Fälligkeit je Zahltag, Zinsen/Rückzahlung in Cent, Depotdaten, Streaming über .iterator()."""
+
+    def setUp(self):
+        # Laufzeitende 15.03.2026 = Sonntag -> Auszahlung am Montag 16.03.2026
+        self.issue = BondIssue.objects.create(
+            title="Anleihe 2025",
+            isin_wkn="DE000A1B2C3",
+            issue_date=date(2025, 3, 15),
+            interest_rate=Decimal("5.50"),
+            bond_price=Decimal("1000.00"),
+            issue_volume=Decimal("1000000.00"),
+            term_months=12,
+        )
+        self.user = FlexxUser.objects.create_user(
+            email="kunde@example.de",
+            first_name="Erika",
+            last_name="Müller",
+            role="client",
+            bank_depo_account_holder="Erika Müller",
+            bank_depo_depotnummer="123456",
+            bank_depo_name="Sparkasse Köln",
+            bank_depo_blz="37050198",
+        )
+        self.paid = [self._contract(qty, paid_at=date(2025, 4, 1)) for qty in (2, 3)]
+        self._contract(4)  # nicht bezahlt
+        self._contract(5, paid_at=date(2026, 3, 17))  # nach dem Zahltag bezahlt
+        self._contract(0, paid_at=date(2025, 4, 1))
+
+    def _contract(self, qty: int, paid_at=None) -> Contract:
+        return Contract.objects.create(issue=self.issue, client=self.user, bonds_quantity=qty, paid_at=paid_at)
+
+    def test_due_date_selection_and_amounts(self):
+        self.assertEqual(list(iter_coupon_payments(date(2026, 3, 15))), [])
+        self.assertEqual(list(iter_coupon_payments(date(2026, 3, 13))), [])
+
+        payments = list(iter_coupon_payments(date(2026, 3, 16)))
+        self.assertEqual([p.contract_id for p in payments], [c.id for c in self.paid])
+        for payment, contract in zip(payments, self.paid):
+            qty = contract.bonds_quantity
+            self.assertEqual(payment.coupon.period_end, date(2026, 3, 15))
+            self.assertEqual(payment.coupon.payout_date, date(2026, 3, 16))
+            self.assertTrue(payment.coupon.is_final)
+            self.assertEqual(payment.interest_cents, 5500 * qty)  # 5,5 % auf 1.000,00 für ein volles Jahr
+            self.assertEqual(payment.redemption_cents, 100000 * qty)
+            self.assertEqual(payment.total_cents, 105500 * qty)
+
+    def test_csv_row_contains_depot_fields(self):
+        row = next(iter_coupon_payments(date(2026, 3, 16))).csv_row()
+        self.assertEqual(len(row), len(COUPON_CSV_HEADER))
+        fields = dict(zip(COUPON_CSV_HEADER, row))
+        self.assertEqual(fields["client_name"], "Erika Müller")
+        self.assertEqual(fields["isin_wkn"], "DE000A1B2C3")
+        self.assertEqual(
+            [fields["depot_account_holder"], fields["depot_number"], fields["depot_bank"], fields["depot_blz"]],
+            ["Erika Müller", "123456", "Sparkasse Köln", "37050198"],
+        )
+        self.assertEqual([fields["interest"], fields["redemption"], fields["total"]], ["110,00", "2000,00", "2110,00"])
+
+    def test_streams_contracts_via_bounded_iterator(self):
+        with self.assertNumQueries(0):  # Generator: vor dem ersten next() keine Abfrage
+            payments = iter_coupon_payments(date(2026, 3, 16), chunk_size=1)
+        with mock.patch.object(QuerySet, "iterator", autospec=True, side_effect=QuerySet.iterator) as iterator:
+            ids = [p.contract_id for p in payments]
+        self.assertEqual(ids, [c.id for c in self.paid])
+        iterator.assert_called_once()
+        self.assertEqual(iterator.call_args.kwargs, {"chunk_size": 1})
+
+    def test_command_writes_single_bom_and_counts_rows(self):
+        path = os.path.join(tempfile.mkdtemp(), "zinslauf.csv")
+        stderr = StringIO()
+        call_command("coupon_run", date="2026-03-16", output=path, stderr=stderr)
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines[0].startswith("\ufeffpayout_date;"))
+        self.assertFalse(lines[0].startswith("\ufeff\ufeff"))
+        self.assertEqual(len(lines), 3)
+        self.assertIn(": 2 payments", stderr.getvalue())
+
+    def test_payment_schedule_of_one_contract(self):
+        schedule = contract_payment_schedule(self.paid[0], period_months=6)
+        self.assertEqual([p.coupon.period_end for p in schedule], [date(2025, 9, 15), date(2026, 3, 15)])
+        self.assertEqual([p.redemption_cents for p in schedule], [0, 200000])
+        self.assertEqual(sum(p.interest_cents for p in schedule), 11000)
+
+
+class CouponRunCsvViewTests(TestCase):
+    def setUp(self):
+        self.issue = BondIssue.objects.create(
+            title="Anleihe",
+            issue_date=date(2025, 1, 15),
+            interest_rate=Decimal("5.00"),
+            bond_price=Decimal("1000.00"),
+            issue_volume=Decimal("1000000.00"),
+            term_months=12,
+        )
+        self.admin = FlexxUser.objects.create_user(email="admin@example.de", role="admin")
+        self.kunde = FlexxUser.objects.create_user(email="kunde@example.de", last_name="Müller", role="client")
+        self.contract = Contract.objects.create(
+            issue=self.issue, client=self.kunde, bonds_quantity=1, paid_at=date(2025, 2, 1)
+        )
+        self.client.force_login(self.admin)
+
+    def _content(self, response) -> str:
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_invalid_date_is_rejected(self):
+        response = self.client.get(reverse("panel_admin_contracts_coupon_run_csv"), {"date": "2026-02-30"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_csv_starts_with_bom(self):
+        response = self.client.get(reverse("panel_admin_contracts_coupon_run_csv"), {"date": "2026-01-15"})
+        self.assertEqual(response.status_code, 200)
+        content = self._content(response)
+        self.assertTrue(content.startswith("﻿payout_date;"))
+        self.assertEqual(len(content.splitlines()), 2)
+        self.assertIn(";Müller;", content)
+
+    def test_payment_schedule_csv(self):
+        response = self.client.get(reverse("panel_admin_contract_payment_schedule_csv", args=[self.contract.id]))
+        self.assertEqual(response.status_code, 200)
+        lines = response.content.decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith("2026-01-15;2025-01-15;2026-01-15;"))
+        self.assertTrue(lines[1].endswith(";50,00;1000,00;1050,00"))
+
+    def test_non_admin_is_redirected(self):
+        self.client.force_login(self.kunde)
+        response = self.client.get(reverse("panel_admin_contracts_coupon_run_csv"))
+        self.assertEqual(response.status_code, 302)
+
+
+class OverdueReportTests(TestCase):
+    """Verzug: settlement_date überschritten, paid_at leer; Bankarbeitstage, Stückzinsen bis Stichtag (max. Laufzeitende)."""
+
+    def setUp(self):
+        self.issue = BondIssue.objects.create(
+            title="Anleihe",
+            issue_date=date(2025, 1, 15),
+            interest_rate=Decimal("6.00"),
+            bond_price=Decimal("1000.00"),
+            issue_volume=Decimal("1000000.00"),
+            term_months=12,
+        )
+        self.user = FlexxUser.objects.create_user(email="kunde@example.de", last_name="Muster", role="client")
+        # 30/360: 15.01. -> 03.03. = 48 Tage -> 8,00 je Anleihe
+        self.overdue = self._contract(date(2025, 3, 3), total=Decimal("2016.00"))
+        self._contract(date(2025, 3, 3), total=Decimal("2016.00"), paid_at=date(2025, 3, 5))
+        self._contract(date(2025, 3, 10), total=Decimal("2019.33"))  # fällig am Stichtag — noch nicht im Verzug
+        self.easter = self._contract(date(2025, 4, 17), total=Decimal("2030.33"))
+
+    def _contract(self, settlement_date, *, total, paid_at=None) -> Contract:
+        return Contract.objects.create(
+            issue=self.issue,
+            client=self.user,
+            settlement_date=settlement_date,
+            paid_at=paid_at,
+            bonds_quantity=2,
+            nominal_amount=Decimal("2000.00"),
+            nominal_amount_plus_percent=total,
+        )
+
+    def test_selects_unpaid_contracts_past_settlement(self):
+        rows = list(iter_overdue_contracts(date(2025, 3, 10)))
+        self.assertEqual([r.contract_id for r in rows], [self.overdue.id])
+        row = rows[0]
+        self.assertEqual((row.days_overdue, row.banking_days_overdue), (7, 5))
+        self.assertEqual((row.amount_due_cents, row.accrued_contract_cents), (201600, 1600))
+        # 55 Tage: 9,166667 je Anleihe * 2 -> 18,33
+        self.assertEqual(row.accrued_as_of_cents, 1833)
+        self.assertEqual(row.additional_cents, 233)
+        self.assertEqual(row.new_total_cents, 201833)
+        self.assertEqual(row.csv_row()[-2:], ["2,33", "2018,33"])
+
+    def test_banking_days_skip_easter_holidays(self):
+        row = next(r for r in iter_overdue_contracts(date(2025, 4, 22)) if r.contract_id == self.easter.id)
+        # 18.04. Karfreitag, 19./20. Wochenende, 21.04. Ostermontag
+        self.assertEqual((row.days_overdue, row.banking_days_overdue), (5, 1))
+
+    def test_accrual_is_capped_at_maturity(self):
+        rows = {r.contract_id: r for r in iter_overdue_contracts(date(2026, 6, 1))}
+        self.assertEqual(set(rows), {self.overdue.id, Contract.objects.get(settlement_date=date(2025, 3, 10)).id, self.easter.id})
+        for row in rows.values():
+            self.assertEqual(row.accrued_as_of_cents, 12000)  # 6 % auf 2 x 1.000,00 für ein volles Jahr
+        self.assertEqual(rows[self.overdue.id].additional_cents, 10400)
+
+    def test_additional_interest_is_never_negative(self):
+        self.overdue.nominal_amount_plus_percent = Decimal("2100.00")
+        self.overdue.save()
+        row = next(iter_overdue_contracts(date(2025, 3, 10)))
+        self.assertEqual(row.additional_cents, 0)
+        self.assertEqual(row.new_total_cents, row.amount_due_cents)
+
+    def test_command_writes_single_bom_and_counts_rows(self):
+        path = os.path.join(tempfile.mkdtemp(), "verzug.csv")
+        stderr = StringIO()
+        call_command("overdue_report", as_of="2025-03-10", output=path, stderr=stderr)
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines[0].startswith("\ufeffas_of;"))
+        self.assertFalse(lines[0].startswith("\ufeff\ufeff"))
+        self.assertEqual(len(lines), 2)
+        self.assertIn(": 1 overdue contracts", stderr.getvalue())
+
+    def test_no_additional_interest_when_accrual_unchanged(self):
+        # 30/360 US ab dem 31.: 30.07. und 31.07. haben dieselbe Zinstage-Zahl — Stichtag = Zahlungstag für die Zinsen
+        issue = BondIssue.objects.create(
+            title="Krumm",
+            issue_date=date(2025, 1, 31),
+            interest_rate=Decimal("5.37"),
+            bond_price=Decimal("333.33"),
+            issue_volume=Decimal("1000000.00"),
+            term_months=60,
+        )
+        settlement_date = date(2025, 7, 30)
+        st_one = get_issue_stueckzins_on(issue, settlement_date)
+        ids = []
+        for qty in range(1, 60):
+            _, nominal, _, total = _contract_amounts(
+                settlement_date=settlement_date, nominal_value=issue.bond_price, quantity=qty, st_one=st_one
+            )
+            ids.append(
+                Contract.objects.create(
+                    issue=issue,
+                    client=self.user,
+                    settlement_date=settlement_date,
+                    bonds_quantity=qty,
+                    nominal_amount=nominal,
+                    nominal_amount_plus_percent=total,
+                ).id
+            )
+        rows = [r for r in iter_overdue_contracts(date(2025, 7, 31)) if r.issue_id == issue.id]
+        self.assertEqual([r.contract_id for r in rows], ids)
+        for row in rows:
+            with self.subTest(qty=row.bonds_quantity):
+                self.assertEqual(row.accrued_as_of_cents, row.accrued_contract_cents)
+                self.assertEqual(row.additional_cents, 0)
+
+    def test_csv_view(self):
+        admin = FlexxUser.objects.create_user(email="admin@example.de", role="admin")
+        self.client.force_login(admin)
+        url = reverse("panel_admin_contracts_overdue_csv")
+        self.assertEqual(self.client.get(url, {"date": "10.03.2025"}).status_code, 400)
+
+        response = self.client.get(url, {"date": "2025-03-10"})
+        self.assertEqual(response.status_code, 200)
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertTrue(lines[0].startswith("﻿as_of;contract_id;"))
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f"2025-03-10;{self.overdue.id};"))
+
+
+class StueckzinsTableTests(TestCase):
+    """BondIssue.save() пересобирает сохранённую таблицу только при изменении исходных полей; чтение — 1 запрос."""
+
+    def setUp(self):
+        self.issue = BondIssue.objects.create(
+            title="Anleihe",
+            issue_date=date(2025, 1, 15),
+            interest_rate=Decimal("5.00"),
+            bond_price=Decimal("1000.00"),
+            issue_volume=Decimal("1000000.00"),
+            term_months=12,
+        )
+
+    def _stored(self) -> BondIssueStueckzinsTable:
+        return BondIssueStueckzinsTable.objects.get(issue=self.issue)
+
+    def test_create_builds_table(self):
+        stored = self._stored()
+        self.assertEqual(stored.table_key, stueckzins_table_key(self.issue))
+        rows = get_issue_stueckzins_rows(self.issue)
+        self.assertEqual(len(stored.rows), len(rows))
+        self.assertEqual(rows[0].pay_date, date(2025, 1, 15))
+        self.assertEqual(rows[-1].pay_date, date(2026, 1, 14))
+
+    def test_source_field_change_rebuilds_table(self):
+        old = self._stored()
+        old_last = get_issue_stueckzins_rows(self.issue)[-1].stueckzins
+        self.issue.interest_rate = Decimal("6.00")
+        self.issue.save(update_fields=["interest_rate"])
+
+        stored = self._stored()
+        self.assertNotEqual(stored.table_key, old.table_key)
+        self.assertEqual(stored.table_key, stueckzins_table_key(self.issue))
+        self.assertEqual(get_issue_stueckzins_rows(self.issue)[-1].stueckzins, old_last * Decimal("1.2"))
+
+    def test_unrelated_field_change_keeps_table(self):
+        built_at = self._stored().built_at
+        self.issue.title = "Anleihe 2025"
+        with self.assertNumQueries(1):  # nur UPDATE bond_issues
+            self.issue.save(update_fields=["title"])
+
+        self.issue.issue_volume = Decimal("2000000.00")
+        with self.assertNumQueries(2):  # UPDATE + Schlüsselvergleich, kein Neuaufbau
+            self.issue.save()
+        self.assertEqual(self._stored().built_at, built_at)
+
+    def test_read_costs_one_query_then_process_cache(self):
+        expected = get_issue_stueckzins_rows(self.issue)
+        stueckzins_table._ROWS_CACHE.clear()
+        with self.assertNumQueries(1):
+            rows = get_issue_stueckzins_rows(self.issue)
+        self.assertEqual(rows, expected)
+        with self.assertNumQueries(0):
+            get_issue_stueckzins_rows(self.issue)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PDF_RENDER_ASYNC=False)
+class ContractPaidMailTests(TestCase):
+    """Bezahlt: Fehler der Kunden-E-Mail aus dem PdfRenderJob bleibt für den Admin sichtbar."""
+
+    def setUp(self):
+        issue = BondIssue.objects.create(
+            title="Anleihe",
+            issue_date=date(2025, 1, 15),
+            interest_rate=Decimal("5.50"),
+            bond_price=Decimal("1000.00"),
+            issue_volume=Decimal("1000000.00"),
+            term_months=24,
+        )
+        kunde = FlexxUser.objects.create_user(email="kunde@example.de", last_name="Muster", role="client")
+        self.contract = Contract.objects.create(issue=issue, client=kunde, bonds_quantity=1)
+        self.client.force_login(FlexxUser.objects.create_user(email="admin@example.de", role="admin"))
+
+    def _toggle_paid(self, *, mail_error: Exception | None):
+        # TestCase: on_commit-Aufträge laufen erst nach der Antwort des Views
+        with mock.patch("flexx.pdf_jobs.send_contract_paid_received_email", side_effect=mail_error) as send:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse("panel_admin_contract_toggle_paid", args=[self.contract.id]), {"notify": "1"})
+        self.assertEqual(send.call_count, 1)
+
+    def test_mail_error_marks_job_and_shows_in_list(self):
+        self._toggle_paid(mail_error=OSError("SMTP down"))
+        job = PdfRenderJob.objects.get(contract=self.contract, kind=PdfRenderJob.Kind.PAID)
+        self.assertEqual(job.status, PdfRenderJob.Status.MAIL_FAILED)
+        self.assertIn("SMTP down", job.last_error)
+        self.contract.refresh_from_db()
+        self.assertIsNotNone(self.contract.paid_at)
+
+        page = self.client.get(reverse("panel_admin_contracts_list"))
+        self.assertContains(page, "E-Mail an den Kunden wurde nicht versendet")
+        self.assertNotContains(page, "Dokument wird vorbereitet")
+
+    def test_sent_mail_leaves_no_mark(self):
+        self._toggle_paid(mail_error=None)
+        job = PdfRenderJob.objects.get(contract=self.contract, kind=PdfRenderJob.Kind.PAID)
+        self.assertEqual(job.status, PdfRenderJob.Status.DONE)
+        self.assertNotContains(self.client.get(reverse("panel_admin_contracts_list")), "nicht versendet")
@@ -1,5 +1,6 @@
-# FILE: web/app_panel_admin/urls.py  (обновлено — 2026-02-16)
-# PURPOSE: Admin panel URLs: добавить список всех Verträge (/contracts/).
+# FILE: web/app_panel_admin/urls.py  (обновлено — 2026-10-17)
+# PURPOSE: Admin panel URLs: Szenarien für neue Emission (/issues/scenarios/), Zinslauf-CSV (/contracts/coupon-run.csv),
+#          Verzug-CSV (/contracts/overdue.csv), Zahlungsplan-CSV eines Vertrags (/contracts/<id>/payment-schedule.csv).
 
 from django.urls import path
 
@@ -14,12 +15,15 @@ from .views.clients import (
 )
 from .views.contracts import (
     contract_delete,
+    contract_payment_schedule_csv,
     contract_toggle_paid,
     contract_toggle_signed_received,
     contract_toggle_tippgeber_paid,
+    contracts_coupon_run_csv,
     contracts_list,
+    contracts_overdue_csv,
 )
-from .views.issues import issues_list, issues_create, issues_edit, issues_delete
+from .views.issues import issues_list, issues_create, issues_edit, issues_delete, issues_scenarios
 from .views.tippgeber import tippgeber_list, tippgeber_edit, tippgeber_toggle_active, tippgeber_delete
 from .views.user_info import user_info_modal
 
@@ -36,9 +40,12 @@ urlpatterns = [
 
     # Contracts
     path("contracts/", contracts_list, name="panel_admin_contracts_list"),
+    path("contracts/coupon-run.csv", contracts_coupon_run_csv, name="panel_admin_contracts_coupon_run_csv"),
+    path("contracts/overdue.csv", contracts_overdue_csv, name="panel_admin_contracts_overdue_csv"),
     path("contracts/<int:contract_id>/toggle-signed/", contract_toggle_signed_received, name="panel_admin_contract_toggle_signed"),
     path("contracts/<int:contract_id>/toggle-paid/", contract_toggle_paid, name="panel_admin_contract_toggle_paid"),
     path("contracts/<int:contract_id>/toggle-tippgeber-paid/", contract_toggle_tippgeber_paid, name="panel_admin_contract_toggle_tippgeber_paid"),
+    path("contracts/<int:contract_id>/payment-schedule.csv", contract_payment_schedule_csv, name="panel_admin_contract_payment_schedule_csv"),
     path("contracts/<int:contract_id>/delete/", contract_delete, name="panel_admin_contract_delete"),
 
     path("tippgeber/", tippgeber_list, name="panel_admin_tippgeber_list"),
@@ -48,6 +55,7 @@ urlpatterns = [
 
     path("issues/", issues_list, name="panel_admin_issues_list"),
     path("issues/new/", issues_create, name="panel_admin_issues_create"),
+    path("issues/scenarios/", issues_scenarios, name="panel_admin_issues_scenarios"),
     path("issues/<int:issue_id>/edit/", issues_edit, name="panel_admin_issues_edit"),
     path("issues/<int:issue_id>/delete/", issues_delete, name="panel_admin_issues_delete"),
 ]
@@ -1,26 +1,37 @@
-# FILE: web/app_panel_admin/views/contracts.py
+# FILE: web/app_panel_admin/views/contracts.py  (обновлено — 2026-10-17)
+# PURPOSE: Tippgeber-Provision/MwSt в списке договоров — через flexx.money (целые центы).
+#          contracts_coupon_run_csv — Zinslauf на дату выплаты как потоковый CSV (flexx.coupon_run);
+#          contract_payment_schedule_csv — Zahlungsplan одного договора (Zinsen + Rückzahlung) als CSV.
+#          contracts_overdue_csv — Verzug-Report (weitere Stückzinsen bis Stichtag) als CSV (flexx.overdue_report).
+#          contract_toggle_paid — paid_at сразу, gegengezeichnetes PDF + письмо — PdfRenderJob (flexx.pdf_jobs);
+#          ошибка письма (MAIL_FAILED) / PDF (FAILED) — пометка в списке договоров.
 
 from __future__ import annotations
 
-from decimal import Decimal, ROUND_HALF_UP
+from datetime import date
 from urllib.parse import urlencode
 
 from babel.numbers import format_decimal
 from django.contrib.auth.decorators import login_required
-from django.core.files.base import ContentFile
 from django.db import transaction
-from django.http import HttpRequest, HttpResponse, HttpResponseNotAllowed
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseNotAllowed,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone
 
 from app_users.models import TippgeberClient
-from flexx.models import Contract
-from flexx.pdf_contract import (
-    build_contract_pdf_signed,
-)
+from flexx.coupon_run import contract_payment_schedule, iter_coupon_csv_lines, iter_coupon_payments
+from flexx.models import Contract, PdfRenderJob
+from flexx.money import format_cents_de, tippgeber_provision_cents
+from flexx.overdue_report import iter_overdue_csv_lines
+from flexx.pdf_jobs import annotate_pdf_jobs, enqueue_pdf_job
 from flexx.emailer import (
-    send_contract_paid_received_email,
     send_contract_signed_received_email,
 )
 
@@ -42,6 +53,17 @@ def _format_decimal_de(value, fmt: str) -> str:
         return str(value)
 
 
+def _date_param(request: HttpRequest) -> date | None:
+    """?date=YYYY-MM-DD; без параметра — сегодня, некорректная дата — None (-> 400)."""
+    raw = (request.GET.get("date") or "").strip()
+    if not raw:
+        return timezone.localdate()
+    try:
+        return date.fromisoformat(raw)
+    except ValueError:
+        return None
+
+
 def _redirect_contracts_list_with_notice(code: str) -> HttpResponse:
     base = reverse("panel_admin_contracts_list")
     return redirect(f"{base}?{urlencode({'notice': code})}")
@@ -69,6 +91,7 @@ def contracts_list(request: HttpRequest) -> HttpResponse:
     for c in contracts:
         contract_count_by_client_id[c.client_id] = contract_count_by_client_id.get(c.client_id, 0) + 1
 
+    annotate_pdf_jobs(contracts)
     for c in contracts:
         link = links_by_client_id.get(c.client_id)
         c.tippgeber = link.tippgeber if link and link.tippgeber_id else None
@@ -76,11 +99,14 @@ def contracts_list(request: HttpRequest) -> HttpResponse:
             c.status_stage = "paid"
         elif c.signed_received_at:
             c.status_stage = "signed_received"
-        elif c.contract_pdf:
+        elif c.contract_pdf or PdfRenderJob.Kind.CREATED in c.pdf_jobs:
             c.status_stage = "created"
         else:
             c.status_stage = "not_created"
         c.can_delete = contract_count_by_client_id.get(c.client_id, 0) > 1
+        c.pdf_job_failed = PdfRenderJob.Status.FAILED in c.pdf_jobs.values()
+        c.pdf_job_mail_failed = PdfRenderJob.Status.MAIL_FAILED in c.pdf_jobs.values()
+        c.pdf_job_pending = not c.pdf_job_failed and bool(c.pdf_jobs_open)
         c.issue_bond_price_display = _format_decimal_de(c.issue.bond_price, "#,##0.00")
         c.issue_volume_display = _format_decimal_de(c.issue.issue_volume, "#,##0.00")
         c.minimal_bonds_quantity_display = _format_decimal_de(c.issue.minimal_bonds_quantity, "#,##0")
@@ -119,16 +145,12 @@ def contracts_list(request: HttpRequest) -> HttpResponse:
         c.tip_paid_status = ""
         c.tip_can_show_finance = bool(c.tippgeber and c.nominal_amount is not None)
         if c.tip_can_show_finance:
-            amount = Decimal(str(c.nominal_amount))
-            rate = Decimal(str(c.issue.rate_tippgeber or 0))
-            provision = (amount * rate / Decimal("100")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-            vat = (provision * Decimal("0.19")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-            total = (provision + vat).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+            provision, vat, total = tippgeber_provision_cents(c.nominal_amount, c.issue.rate_tippgeber)
 
             c.tip_rate_display = _format_decimal_de(c.issue.rate_tippgeber or 0, "#,##0.##")
-            c.tip_provision_display = _format_decimal_de(provision, "#,##0.00")
-            c.tip_vat_display = _format_decimal_de(vat, "#,##0.00")
-            c.tip_total_display = _format_decimal_de(total, "#,##0.00")
+            c.tip_provision_display = format_cents_de(provision)
+            c.tip_vat_display = format_cents_de(vat)
+            c.tip_total_display = format_cents_de(total)
             c.tip_paid_status = "Bezahlt" if c.tippgeber_paid_at else "Nicht bezahlt"
 
     notice_code = (request.GET.get("notice") or "").strip()
@@ -137,8 +159,8 @@ def contracts_list(request: HttpRequest) -> HttpResponse:
         notice_text = "E-Mail wurde wegen technischer Probleme nicht versendet. Status wurde geändert."
     elif notice_code == "delete_last_forbidden":
         notice_text = "Der letzte Vertrag eines Kunden kann nicht gelöscht werden."
-    elif notice_code == "paid_finalize_failed":
-        notice_text = "Der Vertrag konnte technisch nicht finalisiert werden. Status wurde nicht geändert."
+    elif notice_code == "paid_pdf_failed":
+        notice_text = "Der gegengezeichnete Vertrag konnte technisch nicht erstellt werden. Status wurde geändert."
 
     return render(
         request,
@@ -185,46 +207,22 @@ def contract_toggle_paid(request: HttpRequest, contract_id: int) -> HttpResponse
 
     c = get_object_or_404(Contract.objects.select_related("client", "issue"), id=contract_id)
     was_set = c.paid_at is not None
-    paid_date = timezone.localdate()
-    paid_email_attachments: list[tuple[str, bytes, str]] = []
-    has_countersigned_contract = False
 
-    try:
-        with transaction.atomic():
-            c.paid_at = None if was_set else paid_date
-            c.save(update_fields=["paid_at", "updated_at"])
-
-            if not was_set and c.contract_pdf_signed:
-                signed_signed_res = build_contract_pdf_signed(c.id)
-                if c.contract_pdf_signed_signed:
-                    c.contract_pdf_signed_signed.delete(save=False)
-                c.contract_pdf_signed_signed.save(
-                    signed_signed_res.filename,
-                    ContentFile(signed_signed_res.pdf_bytes),
-                    save=False,
-                )
-                c.save(update_fields=["contract_pdf_signed_signed", "updated_at"])
-                paid_email_attachments.append(
-                    (signed_signed_res.filename, signed_signed_res.pdf_bytes, "application/pdf")
-                )
-                has_countersigned_contract = True
-    except Exception:
-        return _redirect_contracts_list_with_notice("paid_finalize_failed")
-
-    if (not was_set) and c.paid_at and request.POST.get("notify") == "1":
-        try:
-            send_contract_paid_received_email(
-                to_email=c.client.email,
-                first_name=c.client.first_name or "",
-                last_name=c.client.last_name or "",
-                contract_id=c.id,
-                issue_title=c.issue.title,
-                paid_date=c.paid_at,
-                has_countersigned_contract=has_countersigned_contract,
-                attachments=paid_email_attachments,
-            )
-        except Exception:
+    job = None
+    with transaction.atomic():
+        c.paid_at = None if was_set else timezone.localdate()
+        c.save(update_fields=["paid_at", "updated_at"])
+        notify = request.POST.get("notify") == "1"
+        if not was_set and (c.contract_pdf_signed or notify):
+            job = enqueue_pdf_job(c, PdfRenderJob.Kind.PAID, notify=notify)
+
+    # без PDF_RENDER_ASYNC задание уже выполнено (on_commit) — результат сразу в notice, как раньше
+    if job is not None:
+        job.refresh_from_db(fields=["status"])
+        if job.status == PdfRenderJob.Status.MAIL_FAILED:
             return _redirect_contracts_list_with_notice("mail_failed_status_changed")
+        if job.status == PdfRenderJob.Status.FAILED:
+            return _redirect_contracts_list_with_notice("paid_pdf_failed")
     return redirect("panel_admin_contracts_list")
 
 
@@ -255,3 +253,49 @@ def contract_delete(request: HttpRequest, contract_id: int) -> HttpResponse:
         return _redirect_contracts_list_with_notice("delete_last_forbidden")
     c.delete()
     return redirect("panel_admin_contracts_list")
+
+
+@login_required
+def contracts_coupon_run_csv(request: HttpRequest) -> HttpResponse:
+    denied = admin_only(request)
+    if denied:
+        return denied
+
+    payout_date = _date_param(request)
+    if payout_date is None:
+        return HttpResponseBadRequest("Ungültiges Datum.")
+    response = StreamingHttpResponse(
+        iter_coupon_csv_lines(iter_coupon_payments(payout_date)),
+        content_type="text/csv; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'attachment; filename="zinslauf_{payout_date:%Y-%m-%d}.csv"'
+    return response
+
+
+@login_required
+def contracts_overdue_csv(request: HttpRequest) -> HttpResponse:
+    denied = admin_only(request)
+    if denied:
+        return denied
+
+    as_of = _date_param(request)
+    if as_of is None:
+        return HttpResponseBadRequest("Ungültiges Datum.")
+    response = StreamingHttpResponse(iter_overdue_csv_lines(as_of), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="verzug_{as_of:%Y-%m-%d}.csv"'
+    return response
+
+
+@login_required
+def contract_payment_schedule_csv(request: HttpRequest, contract_id: int) -> HttpResponse:
+    denied = admin_only(request)
+    if denied:
+        return denied
+
+    c = get_object_or_404(Contract.objects.select_related("issue", "client"), id=contract_id)
+    response = HttpResponse(
+        "".join(iter_coupon_csv_lines(contract_payment_schedule(c))),
+        content_type="text/csv; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'attachment; filename="zahlungsplan_vertrag_{c.id}.csv"'
+    return response
@@ -1,15 +1,28 @@
-# FILE: web/app_panel_admin/views/issues.py  (обновлено — 2026-02-16)
-# PURPOSE: Copy Emission: прокинуть minimal_bonds_quantity в initial при copy.
+# FILE: web/app_panel_admin/views/issues.py  (обновлено — 2026-10-17)
+# PURPOSE: Copy Emission: прокинуть minimal_bonds_quantity, holiday_subdiv и day_count_convention в initial при copy.
+#          issues_scenarios — сравнение Zinssatz × Laufzeit × Preis до создания эмиссии (flexx.issue_scenarios).
 
 from __future__ import annotations
 
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
 from babel.numbers import format_decimal
 from django.contrib.auth.decorators import login_required
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils import timezone
 
-from app_panel_admin.forms import BondIssueForm
+from app_panel_admin.forms import BondIssueForm, _normalize_date_like, _normalize_decimal_like
 from flexx.contract_fields import CONTRACT_FIELDS
+from flexx.day_count import DEFAULT_DAY_COUNT, day_count_choices, get_day_count
+from flexx.issue_scenarios import (
+    SCENARIO_MAX_PRICES,
+    SCENARIO_MAX_RATES,
+    SCENARIO_MAX_TERM_MONTHS,
+    SCENARIO_MAX_TERMS,
+    build_issue_scenarios,
+)
 from flexx.models import BondIssue, BondIssueAttachment
 
 from .common import admin_only
@@ -97,6 +110,8 @@ def issues_create(request: HttpRequest) -> HttpResponse:
                 "term_months": src.term_months,
                 "minimal_bonds_quantity": src.minimal_bonds_quantity,
                 "documents_sent_other": src.documents_sent_other,
+                "holiday_subdiv": src.holiday_subdiv,
+                "day_count_convention": src.day_count_convention,
             }
             for f in CONTRACT_FIELDS:
                 key = f["key"]
@@ -150,3 +165,129 @@ def issues_delete(request: HttpRequest, issue_id: int) -> HttpResponse:
     if request.method == "POST":
         issue.delete()
     return redirect("panel_admin_issues_list")
+
+
+def _parse_decimal(raw: str) -> Decimal:
+    return Decimal(_normalize_decimal_like(raw))
+
+
+def _parse_scenario_axis(raw: str, *, integer: bool) -> list[Decimal]:
+    """
+    "3,5; 4; 4,5" или диапазон "3..8/0,25" (von..bis/Schritt), можно смешивать через ";".
+    """
+    values: list[Decimal] = []
+    for token in raw.replace("\n", ";").split(";"):
+        token = token.strip()
+        if not token:
+            continue
+        if ".." in token:
+            span, _, step_raw = token.partition("/")
+            lo_raw, _, hi_raw = span.partition("..")
+            lo, hi = _parse_decimal(lo_raw), _parse_decimal(hi_raw)
+            step = _parse_decimal(step_raw) if step_raw.strip() else Decimal("1")
+            if step <= 0 or hi < lo:
+                raise InvalidOperation(token)
+            v = lo
+            while v <= hi and len(values) <= 1000:
+                values.append(v)
+                v += step
+        else:
+            values.append(_parse_decimal(token))
+    if integer and any(v != v.to_integral_value() for v in values):
+        raise InvalidOperation(raw)
+    return sorted(set(values))
+
+
+@login_required
+def issues_scenarios(request: HttpRequest) -> HttpResponse:
+    denied = admin_only(request)
+    if denied:
+        return denied
+
+    # пустые поля (в т.ч. из незаполненной формы эмиссии) -> сетка по умолчанию
+    defaults = {
+        "issue_date": timezone.localdate().isoformat(),
+        "rates": "3..7,75/0,25",
+        "terms": "12..120/12",
+        "prices": "100; 500; 1000",
+        "issue_volume": "5000000",
+        "day_count": DEFAULT_DAY_COUNT,
+    }
+    params = {key: (request.GET.get(key) or "").strip() or default for key, default in defaults.items()}
+
+    errors: list[str] = []
+    rows: list[dict[str, object]] = []
+    grid = None
+
+    try:
+        issue_date = datetime.strptime(_normalize_date_like(params["issue_date"]), "%Y-%m-%d").date()
+    except ValueError:
+        issue_date = None
+        errors.append("Emissionsdatum ungültig (JJJJ-MM-TT).")
+
+    axes: dict[str, list[Decimal]] = {}
+    for key, label, integer, limit in (
+        ("rates", "Zinssätze", False, SCENARIO_MAX_RATES),
+        ("terms", "Laufzeiten", True, SCENARIO_MAX_TERMS),
+        ("prices", "Preise", False, SCENARIO_MAX_PRICES),
+    ):
+        try:
+            values = _parse_scenario_axis(params[key], integer=integer)
+        except (InvalidOperation, ValueError):
+            errors.append(f"{label}: ungültige Eingabe.")
+            continue
+        if not values or any(v <= 0 for v in values):
+            errors.append(f"{label}: mindestens ein positiver Wert.")
+        elif len(values) > limit:
+            errors.append(f"{label}: höchstens {limit} Werte.")
+        axes[key] = values
+
+    if any(t > SCENARIO_MAX_TERM_MONTHS for t in axes.get("terms", [])):
+        errors.append(f"Laufzeiten: höchstens {SCENARIO_MAX_TERM_MONTHS} Monate.")
+
+    try:
+        issue_volume = _parse_decimal(params["issue_volume"])
+        if issue_volume <= 0:
+            raise InvalidOperation(params["issue_volume"])
+    except (InvalidOperation, ValueError):
+        issue_volume = None
+        errors.append("Volumen ungültig.")
+
+    try:
+        day_count = get_day_count(params["day_count"]).code
+    except ValueError:
+        errors.append("Zinsmethode unbekannt.")
+
+    if not errors:
+        grid = build_issue_scenarios(
+            issue_date=issue_date,
+            rates_percent=axes["rates"],
+            terms_months=[int(t) for t in axes["terms"]],
+            bond_prices=axes["prices"],
+            issue_volume=issue_volume,
+            day_count=day_count,
+        )
+        rows = grid.rows()
+
+    if request.GET.get("format") == "json":
+        if errors:
+            return JsonResponse({"ok": False, "errors": errors}, status=400)
+        for row in rows:
+            row["end_date"] = row["end_date"].isoformat()
+            row["curve"] = [[d.isoformat(), round(v, 6)] for d, v in grid.monthly_curve(*row.pop("index"))]
+        return JsonResponse({"ok": True, "issue_date": issue_date.isoformat(), "scenarios": rows})
+
+    for row in rows:
+        row["rate_fmt"] = _format_decimal_de(row["rate"], "#,##0.00")
+        row["price_fmt"] = _format_decimal_de(row["price"], "#,##0.00")
+        row["bonds_count_fmt"] = _format_decimal_de(row["bonds_count"], "#,##0")
+        row["interest_total_fmt"] = _format_decimal_de(row["interest_total"], "#,##0.00")
+        row["interest_per_year_fmt"] = _format_decimal_de(row["interest_per_year"], "#,##0.00")
+        row["total_cost_fmt"] = _format_decimal_de(row["total_cost"], "#,##0.00")
+        row["stueckzins_last_fmt"] = _format_decimal_de(row["stueckzins_last"], "#,##0.000000")
+
+    return render(
+        request,
+        "app_panel_admin/issues_scenarios.html",
+        {"params": params, "errors": errors, "rows": rows, "day_count_choices": day_count_choices()},
+    )
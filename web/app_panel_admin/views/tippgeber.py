@@ -1,10 +1,9 @@
-# FILE: web/app_panel_admin/views/tippgeber.py  (обновлено — 2026-02-15)
+# FILE: web/app_panel_admin/views/tippgeber.py  (обновлено — 2026-10-17)
 # PURPOSE: Admin-Panel: Tippgeber list (с его Kunden), edit/delete, POST toggle aktiv/inaktiv с confirm-уведомлением по email при активации.
+#          Provision + MwSt — flexx.money (целые центы).
 
 from __future__ import annotations
 
-from decimal import Decimal, ROUND_HALF_UP
-
 from babel.numbers import format_decimal
 from django.db import transaction
 from django.contrib.auth.decorators import login_required
@@ -15,6 +14,7 @@ from app_panel_admin.forms import AdminTippgeberForm
 from app_users.models import FlexxUser, TippgeberClient
 from flexx.emailer import send_tippgeber_activated_email, send_tippgeber_deleted_email
 from flexx.models import Contract
+from flexx.money import format_cents_de, tippgeber_provision_cents
 
 from .common import admin_only, build_set_password_url
 
@@ -80,12 +80,8 @@ def tippgeber_list(request: HttpRequest) -> HttpResponse:
                 provision_base_amount = contract.nominal_amount
                 provision_display = "—"
                 if provision_base_amount is not None:
-                    provision = (
-                        Decimal(str(provision_base_amount)) * Decimal(str(contract.issue.rate_tippgeber or 0)) / Decimal("100")
-                    ).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                    provision_vat = (provision * Decimal("0.19")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                    provision_total = (provision + provision_vat).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                    provision_display = _format_decimal_de(provision_total, "#,##0.00")
+                    _, _, provision_total = tippgeber_provision_cents(provision_base_amount, contract.issue.rate_tippgeber)
+                    provision_display = format_cents_de(provision_total)
                 contract_summaries.append(
                     {
                         "issue_date_display": issue_date_display,
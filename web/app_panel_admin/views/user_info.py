@@ -1,7 +1,5 @@
 from __future__ import annotations
 
-from decimal import Decimal, ROUND_HALF_UP
-
 from babel.numbers import format_decimal
 from django.contrib.auth.decorators import login_required
 from django.http import Http404, HttpRequest, HttpResponse
@@ -9,6 +7,7 @@ from django.shortcuts import get_object_or_404, render
 
 from app_users.models import FlexxUser, TippgeberClient
 from flexx.models import Contract, TippgeberContract
+from flexx.money import format_cents_de, tippgeber_provision_cents
 
 from .common import admin_only
 
@@ -85,12 +84,8 @@ def _render_tippgeber_user_info(request: HttpRequest, target: FlexxUser) -> Http
             provision_base_amount = contract.nominal_amount
             provision_display = "—"
             if provision_base_amount is not None:
-                provision = (
-                    Decimal(str(provision_base_amount)) * Decimal(str(contract.issue.rate_tippgeber or 0)) / Decimal("100")
-                ).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                provision_vat = (provision * Decimal("0.19")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                provision_total = (provision + provision_vat).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                provision_display = _format_decimal_de(provision_total, "#,##0.00")
+                _, _, provision_total = tippgeber_provision_cents(provision_base_amount, contract.issue.rate_tippgeber)
+                provision_display = format_cents_de(provision_total)
             status_label, _, _ = _client_contract_status(contract)
             rows.append(
                 {
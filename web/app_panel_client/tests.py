@@ -1,3 +1,743 @@
-from django.test import TestCase
+from __future__ import annotations
 
-# Create your tests here.
+import base64
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+import math
+import os
+import random
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+import holidays
+import numpy as np
+import pikepdf
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Paragraph
+
+from app_users.models import FlexxUser
+
+from flexx.contract_helpers import (
+    _add_months,
+    add_banking_days,
+    banking_days_between,
+    build_stueckzinsen_rows_for_issue,
+    calc_contract_amounts,
+    calc_contract_amounts_from_stueckzins_table,
+    calc_stueckzins_for_date,
+)
+from flexx.day_count import DAY_COUNT_ACT_ACT_ICMA, day_count_choices, get_day_count
+from flexx.management.commands.signature_benchmark import (
+    _convert_white_to_transparent_loop,
+    _count_visible_alpha_pixels_loop,
+)
+from flexx.models import BondIssue, Contract, FlexxlagerSignature, PdfRenderJob
+from flexx.pdf_contract import (
+    PDF_ANCHORS_KEY,
+    ClientSignedContractPdfCreator,
+    ContractPdfCreator,
+    _convert_white_to_transparent,
+    _count_visible_alpha_pixels,
+    build_contract_pdf,
+    build_contract_pdf_client_signed,
+    build_contract_pdf_signed,
+    get_company_signature,
+    warm_company_signature,
+)
+from flexx.pdf_fingerprint import file_sha256, stored_pdf_fingerprint
+from flexx.pdf_jobs import PDF_JOB_MAX_ATTEMPTS, run_pending_pdf_jobs
+from flexx.pdf_output import (
+    PDF_PROFILE_COMPACT,
+    PDF_SIGNATURE_DPI,
+    dedupe_images,
+    finalize_pdf_bytes,
+    save_pdf,
+    signature_for_print,
+)
+from flexx.pdf_regenerate import (
+    REGENERATE_KIND_CONTRACT,
+    read_regenerate_state,
+    regenerate_documents,
+    select_documents,
+)
+from flexx.stueckzins_table import calc_issue_contract_amounts
+
+
+def _random_issue(rnd: random.Random) -> dict:
+    issue_date = date(2020, 1, 1) + timedelta(days=rnd.randrange(0, 365 * 10))
+    if rnd.random() < 0.25:
+        # Monatsende / Februar-Sonderfälle für 30/360 US.
+        issue_date = date(issue_date.year, rnd.choice([1, 2, 3, 8]), 1)
+        issue_date = _add_months(issue_date, 1) - timedelta(days=1)
+    return {
+        "issue_date": issue_date,
+        "term_months": rnd.randint(1, 72),
+        "interest_rate_percent": Decimal(rnd.randint(1, 1500)) / Decimal("100"),
+        "nominal_value": rnd.choice(
+            [Decimal("100.00"), Decimal("1000.00"), Decimal("1000.50"), Decimal(rnd.randint(1, 500000)) / Decimal("100")]
+        ),
+    }
+
+
+def _random_dates(rnd: random.Random, issue: dict, count: int) -> list[date]:
+    start = issue["issue_date"]
+    end = _add_months(start, issue["term_months"])
+    dates = [start - timedelta(days=1), start, end - timedelta(days=1), end, end + timedelta(days=30)]
+    span = (end - start).days
+    dates.extend(start + timedelta(days=rnd.randrange(0, span)) for _ in range(count))
+    return dates
+
+
+class StueckzinsClosedFormEquivalenceTests(SimpleTestCase):
+    """Прямой расчёт Stückzins на дату == значение из полной таблицы (байт в байт)."""
+
+    def test_single_date_matches_table_row(self):
+        rnd = random.Random(20261017)
+        for _ in range(60):
+            issue = _random_issue(rnd)
+            rows = build_stueckzinsen_rows_for_issue(**issue)
+            st_map = {r.pay_date: r.stueckzins for r in rows}
+            for pay_date in _random_dates(rnd, issue, 20):
+                expected = st_map.get(pay_date, Decimal("0"))
+                actual = calc_stueckzins_for_date(pay_date=pay_date, **issue)
+                with self.subTest(issue=issue, pay_date=pay_date):
+                    self.assertEqual(str(actual), str(expected))
+
+    def test_contract_amounts_match_table_path(self):
+        rnd = random.Random(17102026)
+        for _ in range(25):
+            issue = _random_issue(rnd)
+            rows = build_stueckzinsen_rows_for_issue(**issue)
+            for sign_date in _random_dates(rnd, issue, 8):
+                quantity = rnd.randint(1, 50000)
+                expected = calc_contract_amounts_from_stueckzins_table(
+                    sign_date=sign_date,
+                    quantity=quantity,
+                    stueckzins_rows=rows,
+                    **issue,
+                )
+                actual = calc_contract_amounts(sign_date=sign_date, quantity=quantity, **issue)
+                with self.subTest(issue=issue, sign_date=sign_date, quantity=quantity):
+                    self.assertEqual([str(v) for v in actual], [str(v) for v in expected])
+
+
+class DayCountConventionTests(SimpleTestCase):
+    """Пакетные доли года == скалярные для каждой Zinsmethode; таблица == расчёт на дату."""
+
+    def test_batched_fractions_match_scalar(self):
+        rnd = random.Random(10)
+        for code, _label in day_count_choices():
+            convention = get_day_count(code)
+            for _ in range(40):
+                start = _random_issue(rnd)["issue_date"]
+                days = np.datetime64(start, "D") + np.arange(0, 1200)
+                nums, dens = convention.fractions(start, days)
+                expected = [convention.fraction(start, start + timedelta(days=i)) for i in range(0, 1200)]
+                with self.subTest(code=code, start=start):
+                    self.assertEqual(list(zip(nums.tolist(), dens.tolist())), expected)
+
+    def test_act_act_icma_whole_years(self):
+        convention = get_day_count(DAY_COUNT_ACT_ACT_ICMA)
+        for start in (date(2024, 2, 29), date(2025, 1, 31), date(2026, 7, 15)):
+            for k in range(6):
+                num, den = convention.fraction(start, _add_months(start, 12 * k))
+                with self.subTest(start=start, k=k):
+                    self.assertEqual(num, k * den)
+
+    def test_single_date_matches_table_row(self):
+        rnd = random.Random(11)
+        for code, _label in day_count_choices():
+            for _ in range(10):
+                issue = _random_issue(rnd)
+                rows = build_stueckzinsen_rows_for_issue(day_count=code, **issue)
+                st_map = {r.pay_date: r.stueckzins for r in rows}
+                for pay_date in _random_dates(rnd, issue, 10):
+                    expected = st_map.get(pay_date, Decimal("0"))
+                    actual = calc_stueckzins_for_date(pay_date=pay_date, day_count=code, **issue)
+                    with self.subTest(code=code, issue=issue, pay_date=pay_date):
+                        self.assertEqual(str(actual), str(expected))
+
+
+def _walk_add_banking_days(start: date, days: int, subdiv: str | None) -> date:
+    de_holidays = holidays.country_holidays("DE", subdiv=subdiv)
+    d = start
+    added = 0
+    while added < days:
+        d += timedelta(days=1)
+        if d.weekday() < 5 and de_holidays.get(d) is None:
+            added += 1
+    return d
+
+
+class BankingCalendarTests(SimpleTestCase):
+    """Индексный календарь банковских дней == пошаговый обход по holidays."""
+
+    def test_add_banking_days_matches_day_walk(self):
+        rnd = random.Random(3)
+        for subdiv in (None, "BY", "SN"):
+            for _ in range(300):
+                # включая даты вне предрасчитанного диапазона (fallback)
+                start = date(1990, 1, 1) + timedelta(days=rnd.randrange(0, 365 * 100))
+                days = rnd.randint(0, 30)
+                with self.subTest(start=start, days=days, subdiv=subdiv):
+                    self.assertEqual(
+                        add_banking_days(start, days, holiday_subdiv=subdiv),
+                        _walk_add_banking_days(start, days, subdiv),
+                    )
+
+    def test_banking_days_between_inverts_add(self):
+        rnd = random.Random(4)
+        for _ in range(300):
+            start = date(2020, 1, 1) + timedelta(days=rnd.randrange(0, 365 * 20))
+            days = rnd.randint(0, 60)
+            end = add_banking_days(start, days, holiday_subdiv="BW")
+            with self.subTest(start=start, days=days):
+                self.assertEqual(banking_days_between(start, end, holiday_subdiv="BW"), days)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PDF_RENDER_ASYNC=True)
+class ContractPdfQueueTests(TestCase):
+    """Finalisieren: статус сохраняется в запросе, PDF делает воркер (PdfRenderJob)."""
+
+    def setUp(self):
+        issue = BondIssue.objects.create(
+            title="Anleihe",
+            issue_date=date(2025, 1, 15),
+            interest_rate=Decimal("5.50"),
+            bond_price=Decimal("1000.00"),
+            issue_volume=Decimal("1000000.00"),
+            term_months=24,
+        )
+        self.user = FlexxUser.objects.create_user(
+            email="kunde@example.de", first_name="Max", last_name="Muster", role="client"
+        )
+        self.contract = Contract.objects.create(issue=issue, client=self.user)
+        self.client.force_login(self.user)
+
+    def test_finalize_enqueues_and_worker_renders(self):
+        response = self.client.post(
+            reverse("panel_client_contract_application"),
+            {
+                "action": "finalize",
+                "contract_id": self.contract.id,
+                "contract_date": timezone.localdate().isoformat(),
+                "bonds_quantity": "5",
+                "receipt_confirm_contract": "1",
+            },
+        )
+        self.assertContains(response, "Dokument wird vorbereitet")
+        self.contract.refresh_from_db()
+        self.assertFalse(self.contract.contract_pdf)
+        self.assertEqual(self.contract.bonds_quantity, 5)
+        job = PdfRenderJob.objects.get(contract=self.contract)
+        self.assertEqual((job.kind, job.status), (PdfRenderJob.Kind.CREATED, PdfRenderJob.Status.PENDING))
+
+        # повторное Finalisieren не ставит второе задание
+        self.client.post(
+            reverse("panel_client_contract_application"),
+            {"action": "finalize", "contract_id": self.contract.id, "contract_date": timezone.localdate().isoformat(),
+             "bonds_quantity": "7", "receipt_confirm_contract": "1"},
+        )
+        self.assertEqual(PdfRenderJob.objects.filter(contract=self.contract).count(), 1)
+
+        status_url = reverse("panel_client_contracts_pdf_status")
+        pending = self.client.get(status_url, {"ids": str(self.contract.id)}).json()
+        self.assertEqual(pending["contracts"][str(self.contract.id)]["created"]["status"], "pending")
+
+        self.assertEqual(run_pending_pdf_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, PdfRenderJob.Status.DONE)
+        self.contract.refresh_from_db()
+        self.assertTrue(self.contract.contract_pdf)
+        ready = self.client.get(status_url, {"ids": str(self.contract.id)}).json()
+        self.assertTrue(ready["contracts"][str(self.contract.id)]["created"]["url"])
+
+    def _finalize(self, qty: str = "5"):
+        return self.client.post(
+            reverse("panel_client_contract_application"),
+            {
+                "action": "finalize",
+                "contract_id": self.contract.id,
+                "contract_date": timezone.localdate().isoformat(),
+                "bonds_quantity": qty,
+                "receipt_confirm_contract": "1",
+            },
+        )
+
+    def test_failed_job_lets_client_finalize_again(self):
+        self._finalize()
+        with mock.patch("flexx.pdf_jobs.build_contract_pdf", side_effect=RuntimeError("ReportLab")):
+            self.assertEqual(run_pending_pdf_jobs(), PDF_JOB_MAX_ATTEMPTS)
+        job = PdfRenderJob.objects.get(contract=self.contract)
+        self.assertEqual(job.status, PdfRenderJob.Status.FAILED)
+
+        listing = self.client.get(reverse("panel_client_contracts_list"))
+        self.assertContains(listing, "konnte technisch nicht erstellt werden")
+        self.assertNotContains(listing, "Dokument wird vorbereitet")
+        page = self.client.post(
+            reverse("panel_client_contract_application"), {"action": "open", "contract_id": self.contract.id}
+        )
+        self.assertContains(page, "Bitte versuchen Sie es erneut.")
+
+        self.assertContains(self._finalize("6"), "Dokument wird vorbereitet")
+        retry = PdfRenderJob.objects.filter(contract=self.contract).latest("id")
+        self.assertEqual((retry.kind, retry.status), (PdfRenderJob.Kind.CREATED, PdfRenderJob.Status.PENDING))
+        self.assertEqual(run_pending_pdf_jobs(), 1)
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.bonds_quantity, 6)
+        self.assertTrue(self.contract.contract_pdf)
+
+    def test_failed_signed_job_shows_signature_form_again(self):
+        self._finalize()
+        run_pending_pdf_jobs()
+        data_url = "data:image/png;base64," + base64.b64encode(_signature_png()).decode()
+        sign_url = reverse("panel_client_contract_sign")
+        self.client.post(sign_url, {"action": "sign", "contract_id": self.contract.id, "signature_png": data_url})
+        with mock.patch("flexx.pdf_jobs.build_contract_pdf_client_signed", side_effect=RuntimeError("ReportLab")):
+            run_pending_pdf_jobs()
+        self.assertTrue(
+            PdfRenderJob.objects.filter(
+                contract=self.contract, kind=PdfRenderJob.Kind.SIGNED, status=PdfRenderJob.Status.FAILED
+            ).exists()
+        )
+
+        self.assertContains(self.client.get(reverse("panel_client_contracts_list")), "Erneut unterzeichnen")
+        page = self.client.post(sign_url, {"action": "open", "contract_id": self.contract.id})
+        self.assertTrue(page.context["show_signature_form"])
+        self.client.post(sign_url, {"action": "sign", "contract_id": self.contract.id, "signature_png": data_url})
+        self.assertEqual(run_pending_pdf_jobs(), 1)
+        self.contract.refresh_from_db()
+        self.assertTrue(self.contract.contract_pdf_signed)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PDF_RENDER_ASYNC=True)
+class ContractQuoteTests(TestCase):
+    """contract_quote: JSON-Berechnung nur für eigene, noch nicht erstellte Verträge; Beträge = calc_issue_contract_amounts."""
+
+    def setUp(self):
+        self.issue = BondIssue.objects.create(
+            title="Anleihe",
+            issue_date=date(2025, 1, 15),
+            interest_rate=Decimal("5.50"),
+            bond_price=Decimal("1000.00"),
+            issue_volume=Decimal("1000000.00"),
+            minimal_bonds_quantity=3,
+            term_months=120,
+        )
+        self.user = FlexxUser.objects.create_user(email="kunde@example.de", last_name="Muster", role="client")
+        self.contract = Contract.objects.create(issue=self.issue, client=self.user)
+        self.contract_date = timezone.localdate() + timedelta(days=2)
+        self.client.force_login(self.user)
+
+    def _quote(self, contract_id=None, **params):
+        query = {
+            "contract_id": self.contract.id if contract_id is None else contract_id,
+            "contract_date": self.contract_date.isoformat(),
+            "bonds_quantity": "5",
+        }
+        query.update(params)
+        return self.client.get(reverse("panel_client_contract_quote"), query)
+
+    def test_amounts_match_contract_calculation(self):
+        response = self._quote()
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        settlement_date, nominal, accrued, total = calc_issue_contract_amounts(
+            self.issue, sign_date=self.contract_date, quantity=5, banking_days_plus=10
+        )
+        self.assertTrue(data["ok"])
+        self.assertEqual(data["settlement_date"], settlement_date.isoformat())
+        self.assertEqual(
+            [Decimal(data["nominal_amount"]), Decimal(data["accrued_interest"]), Decimal(data["total_amount"])],
+            [nominal, accrued, total],
+        )
+        self.assertEqual(data["nominal_amount_display"], "5.000,00")
+        self.assertFalse(Contract.objects.get(id=self.contract.id).bonds_quantity)  # ohne Speichern
+
+    def test_validation_errors(self):
+        for params in (
+            {"bonds_quantity": "2"},
+            {"bonds_quantity": "abc"},
+            {"contract_date": ""},
+            {"contract_date": (timezone.localdate() - timedelta(days=1)).isoformat()},
+        ):
+            with self.subTest(params=params):
+                response = self._quote(**params)
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                self.assertFalse(data["ok"])
+                self.assertEqual(len(data["errors"]), 1)
+
+    def test_access_and_ownership(self):
+        other = FlexxUser.objects.create_user(email="andere@example.de", role="client")
+        foreign = Contract.objects.create(issue=self.issue, client=other)
+        self.assertEqual(self._quote(contract_id=foreign.id).status_code, 404)
+        self.assertEqual(self._quote(contract_id="x").status_code, 404)
+
+        agent = FlexxUser.objects.create_user(email="agent@example.de", role="agent")
+        self.client.force_login(agent)
+        self.assertEqual(self._quote().status_code, 403)
+
+        self.client.logout()
+        self.assertEqual(self._quote().status_code, 302)
+
+    def test_conflict_after_finalize(self):
+        self.client.post(
+            reverse("panel_client_contract_application"),
+            {
+                "action": "finalize",
+                "contract_id": self.contract.id,
+                "contract_date": self.contract_date.isoformat(),
+                "bonds_quantity": "5",
+                "receipt_confirm_contract": "1",
+            },
+        )
+        self.assertTrue(PdfRenderJob.objects.filter(contract=self.contract).exists())
+        response = self._quote()
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()["ok"])
+
+
+class ParagraphLayoutCacheTests(SimpleTestCase):
+    def test_cached_layout_matches_fresh_wrap(self):
+        creator = ContractPdfCreator.__new__(ContractPdfCreator)
+        text = "Die Anleihe wird mit **5,50 %** p.a. verzinst.\nZeile zwei\tmit Tab. " * 5
+        first, h1 = creator._layout_paragraph(text, 10, 300.0)
+        second, h2 = creator._layout_paragraph(text, 10, 300.0)
+
+        self.assertIsNot(first, second)  # копии — drawOn не делит self.canv между потоками
+        self.assertIs(first.blPara, second.blPara)
+        fresh = Paragraph(first.text, first.style)
+        self.assertEqual(fresh.wrap(300.0, 10_000)[1], h1)
+        self.assertEqual(h1, h2)
+        self.assertNotEqual(creator._layout_paragraph(text, 10, 200.0)[1], h1)
+
+
+class ContractPdfIssuePagesTests(TestCase):
+    """Страницы 3+ (Ergänzung + Stückzinstabelle) — общий фрагмент эмиссии, договор дописывает его к своим страницам."""
+
+    def setUp(self):
+        self.issue = BondIssue.objects.create(
+            title="Anleihe",
+            issue_date=date(2025, 1, 15),
+            interest_rate=Decimal("5.50"),
+            bond_price=Decimal("1000.00"),
+            issue_volume=Decimal("1000000.00"),
+            term_months=24,
+            contract={"ueberschrift_ergaenzung": "Ergänzung", "ergaenzung_text_1": "Text " * 50},
+        )
+        self.user = FlexxUser.objects.create_user(email="kunde@example.de", last_name="Muster", role="client")
+
+    def _contract(self) -> Contract:
+        return Contract.objects.create(issue=self.issue, client=self.user, bonds_quantity=5)
+
+    def test_issue_pages_shared_and_invalidated(self):
+        first, second = self._contract(), self._contract()
+        creator = ContractPdfCreator(first.id)
+        creator.load_content()
+        fragment = creator.issue_pages_pdf()
+
+        other = ContractPdfCreator(second.id)
+        other.load_content()
+        self.assertIs(other.issue_pages_pdf(), fragment)
+
+        with pikepdf.open(BytesIO(build_contract_pdf(first.id).pdf_bytes)) as pdf, pikepdf.open(BytesIO(fragment)) as tail:
+            self.assertEqual(len(pdf.pages), 2 + len(tail.pages))
+
+        self.issue.contract = {"ueberschrift_ergaenzung": "Ergänzung neu", "ergaenzung_text_1": "Text " * 50}
+        self.issue.save()
+        changed = ContractPdfCreator(first.id)
+        changed.load_content()
+        self.assertNotEqual(changed.issue_pages_key(), creator.issue_pages_key())
+        self.assertIsNot(changed.issue_pages_pdf(), fragment)
+
+
+def _signature_png() -> bytes:
+    image = Image.new("RGBA", (300, 80), (255, 255, 255, 0))
+    for x in range(20, 280):
+        image.putpixel((x, 40), (0, 0, 0, 255))
+    buffer = BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ContractPdfStampTests(TestCase):
+    """Unterschriften штампуются на сохранённый PDF (по /FlexxAnchors), без повторного рендера текста."""
+
+    def setUp(self):
+        issue = BondIssue.objects.create(
+            title="Anleihe",
+            issue_date=date(2025, 1, 15),
+            interest_rate=Decimal("5.50"),
+            bond_price=Decimal("1000.00"),
+            issue_volume=Decimal("1000000.00"),
+            term_months=24,
+        )
+        user = FlexxUser.objects.create_user(email="kunde@example.de", last_name="Muster", role="client")
+        self.contract = Contract.objects.create(issue=issue, client=user, bonds_quantity=5)
+        self.contract.signature.save("sig.png", ContentFile(_signature_png()), save=True)
+        FlexxlagerSignature.objects.create().signature.save("co.png", ContentFile(_signature_png()), save=True)
+
+    @staticmethod
+    def _page_texts(pdf_bytes: bytes) -> tuple[int, bytes, str]:
+        with pikepdf.open(BytesIO(pdf_bytes)) as pdf:
+            return len(pdf.pages), pdf.pages[0].Contents.read_bytes(), str(pdf.docinfo.get(PDF_ANCHORS_KEY, ""))
+
+    def test_stamp_keeps_base_document(self):
+        created = build_contract_pdf(self.contract.id)
+        self.contract.contract_pdf.save(created.filename, ContentFile(created.pdf_bytes), save=True)
+        pages, first_page, anchors = self._page_texts(created.pdf_bytes)
+        self.assertIn('"buyer"', anchors)
+
+        signed = build_contract_pdf_client_signed(self.contract.id).pdf_bytes
+        self.assertEqual(self._page_texts(signed), (pages, first_page, anchors))
+        self.contract.contract_pdf_signed.save("signed.pdf", ContentFile(signed), save=True)
+
+        paid = build_contract_pdf_signed(self.contract.id).pdf_bytes
+        self.assertEqual(self._page_texts(paid)[:2], (pages, first_page))
+        with pikepdf.open(BytesIO(paid)) as pdf:
+            overlays = [name for name, xobj in pdf.pages[1].Resources.XObject.items() if xobj.get("/Subtype") == "/Form"]
+        self.assertEqual(len(overlays), 2)  # buyer + company
+
+    @staticmethod
+    def _text(pdf_bytes: bytes) -> str:
+        """Строки Tj со всех страниц и наложений (Form XObject)."""
+        parts: list[str] = []
+        with pikepdf.open(BytesIO(pdf_bytes)) as pdf:
+            for page in pdf.pages:
+                xobjects = page.Resources.get("/XObject", {})
+                streams = [page] + [x for x in xobjects.values() if x.get("/Subtype") == "/Form"]
+                for stream in streams:
+                    for operands, operator in pikepdf.parse_content_stream(stream):
+                        if str(operator) == "Tj":
+                            parts.append(str(operands[0]))
+        return "\n".join(parts)
+
+    def test_signed_pdf_shows_signing_date(self):
+        self.contract.client.city = "Köln"
+        self.contract.client.save()
+        created = build_contract_pdf(self.contract.id, render_date=date(2025, 3, 3))
+        self.contract.contract_pdf.save(created.filename, ContentFile(created.pdf_bytes), save=True)
+        self.assertNotIn("Köln, ", self._text(created.pdf_bytes))  # Ort, Datum leer bis zur Unterschrift
+
+        signing_day = date(2025, 3, 10)
+        with mock.patch("flexx.pdf_contract.timezone.localdate", return_value=signing_day):
+            signed = build_contract_pdf_client_signed(self.contract.id).pdf_bytes
+        text = self._text(signed)
+        self.assertIn("Köln, 10.03.2025", text)
+        self.assertNotIn("03.03.2025", text)
+
+    def test_pdf_without_anchors_falls_back_to_full_render(self):
+        created = build_contract_pdf(self.contract.id)
+        with pikepdf.open(BytesIO(created.pdf_bytes)) as pdf:
+            del pdf.docinfo[PDF_ANCHORS_KEY]
+            legacy = BytesIO()
+            pdf.save(legacy)
+        self.contract.contract_pdf.save(created.filename, ContentFile(legacy.getvalue()), save=True)
+
+        creator = ClientSignedContractPdfCreator(self.contract.id)
+        self.assertIsNone(creator.stamp(legacy.getvalue(), buyer=True))
+        signed = creator.build().pdf_bytes
+        self.assertIn('"buyer"', self._page_texts(signed)[2])
+
+
+class SignatureCleanupTests(SimpleTestCase):
+    """Векторизованная очистка подписи == прежний цикл по пикселям (все суммы r+g+b, alpha вкл. 0)."""
+
+    def test_vectorized_matches_pixel_loop(self):
+        rng = np.random.default_rng(17)
+        pixels = rng.integers(0, 256, size=(64, 96, 4), dtype=np.uint8)
+        pixels[0, :, :3] = 255  # чистый белый
+        pixels[1, :, 3] = 0
+        image = Image.fromarray(pixels)
+
+        expected = _convert_white_to_transparent_loop(image)
+        actual = _convert_white_to_transparent(image)
+        self.assertEqual(actual.tobytes(), expected.tobytes())
+        for threshold in (0, 8, 12, 254):
+            self.assertEqual(
+                _count_visible_alpha_pixels(actual, threshold),
+                _count_visible_alpha_pixels_loop(actual, threshold),
+            )
+
+    def test_benchmark_command_checks_output(self):
+        out = StringIO()
+        call_command("signature_benchmark", sizes="120x40", repeat=1, stdout=out)
+        self.assertIn("120x40", out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class CompanySignatureCacheTests(TestCase):
+    """Подпись FleXXLager: один раз на процесс, новая загрузка (имя файла / mtime) — заново."""
+
+    def test_cached_until_file_changes(self):
+        record = FlexxlagerSignature.objects.create()
+        record.signature.save("co.png", ContentFile(_signature_png()), save=True)
+
+        first = get_company_signature()
+        self.assertIsNotNone(first.image)
+        with mock.patch("flexx.pdf_contract._prepare_signature_image") as prepare:
+            self.assertIs(get_company_signature(), first)
+            prepare.assert_not_called()
+
+        record.signature.save("co-neu.png", ContentFile(_signature_png()), save=True)
+        self.assertIsNot(get_company_signature(), first)
+
+    def test_warm_without_signature(self):
+        self.assertFalse(warm_company_signature())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RegeneratePdfsTests(TestCase):
+    """regenerate_pdfs: файл заменяется под тем же именем, state-файл позволяет продолжить."""
+
+    def setUp(self):
+        self.issue = BondIssue.objects.create(
+            title="Anleihe",
+            issue_date=date(2025, 1, 15),
+            interest_rate=Decimal("5.50"),
+            bond_price=Decimal("1000.00"),
+            issue_volume=Decimal("1000000.00"),
+            term_months=24,
+        )
+        user = FlexxUser.objects.create_user(email="kunde@example.de", last_name="Muster", role="client")
+        self.contracts = []
+        self.original_pdfs = []
+        for _ in range(3):
+            contract = Contract.objects.create(
+                issue=self.issue, client=user, bonds_quantity=5, contract_date=date(2025, 3, 3)
+            )
+            result = build_contract_pdf(contract.id)
+            contract.contract_pdf.save(result.filename, ContentFile(result.pdf_bytes), save=True)
+            self.contracts.append(contract)
+            self.original_pdfs.append(result.pdf_bytes)
+        Contract.objects.create(issue=self.issue, client=user)  # ohne PDF — nicht ausgewählt
+
+    def test_regenerate_replaces_in_place_and_resumes(self):
+        items = select_documents([REGENERATE_KIND_CONTRACT], issue_ids=[self.issue.id], status="created")
+        self.assertEqual(items, [(REGENERATE_KIND_CONTRACT, c.id) for c in self.contracts])
+
+        self.issue.contract = {"ueberschrift_ergaenzung": "Ergänzung neu"}
+        self.issue.save()
+        state_path = os.path.join(tempfile.mkdtemp(), "regen.state")
+        with open(state_path, "w", encoding="utf-8") as state:
+            state.write(f"{REGENERATE_KIND_CONTRACT}:{self.contracts[0].id} ok 0.1\n")
+
+        summary = regenerate_documents(items, workers=1, state_path=state_path, resume=True)
+        self.assertEqual((summary.skipped, summary.done, summary.failed), (1, 2, []))
+        self.assertEqual(len(read_regenerate_state(state_path)), 3)
+
+        for contract in self.contracts:
+            name = contract.contract_pdf.name
+            contract.refresh_from_db()
+            self.assertEqual(contract.contract_pdf.name, name)
+        with open(self.contracts[0].contract_pdf.path, "rb") as skipped, open(self.contracts[1].contract_pdf.path, "rb") as done:
+            self.assertEqual(skipped.read(), self.original_pdfs[0])
+            self.assertNotEqual(done.read(), self.original_pdfs[1])
+        # Datum der ursprünglichen Erstellung, nicht das heutige Datum
+        with pikepdf.open(self.contracts[1].contract_pdf.path) as pdf:
+            self.assertEqual(str(pdf.docinfo["/CreationDate"]), "D:20250303000000+00'00'")
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PdfFingerprintTests(TestCase):
+    """Отпечаток входа: тот же вход -> те же байты; неизменный отпечаток -> рендер пропускается."""
+
+    def setUp(self):
+        issue = BondIssue.objects.create(
+            title="Anleihe",
+            issue_date=date(2025, 1, 15),
+            interest_rate=Decimal("5.50"),
+            bond_price=Decimal("1000.00"),
+            issue_volume=Decimal("1000000.00"),
+            term_months=24,
+        )
+        self.user = FlexxUser.objects.create_user(
+            email="kunde@example.de", first_name="Max", last_name="Muster", city="Köln", role="client"
+        )
+        self.contract = Contract.objects.create(issue=issue, client=self.user, bonds_quantity=5)
+
+    def test_same_input_same_bytes_and_fixed_metadata(self):
+        first = build_contract_pdf(self.contract.id, render_date=date(2025, 3, 3))
+        second = build_contract_pdf(self.contract.id, render_date=date(2025, 3, 3))
+        self.assertEqual((first.pdf_bytes, first.fingerprint), (second.pdf_bytes, second.fingerprint))
+        with pikepdf.open(BytesIO(first.pdf_bytes)) as pdf:
+            self.assertEqual(str(pdf.docinfo["/CreationDate"]), "D:20250303000000+00'00'")
+        self.assertIsNone(
+            build_contract_pdf(self.contract.id, render_date=date(2025, 3, 3), previous_fingerprint=first.fingerprint)
+        )
+        self.assertNotEqual(build_contract_pdf(self.contract.id, render_date=date(2025, 3, 4)).fingerprint, first.fingerprint)
+
+    def test_regenerate_skips_unchanged_input(self):
+        PdfRenderJob.objects.create(contract=self.contract, kind=PdfRenderJob.Kind.CREATED, notify=False)
+        self.assertEqual(run_pending_pdf_jobs(), 1)
+        self.contract.refresh_from_db()
+        stored = self.contract.pdf_fingerprints["contract_pdf"]
+        self.assertEqual(stored["sha256"], file_sha256(self.contract.contract_pdf))
+        items = [(REGENERATE_KIND_CONTRACT, self.contract.id)]
+
+        with mock.patch.object(ContractPdfCreator, "build") as build:
+            summary = regenerate_documents(items, workers=1)
+        build.assert_not_called()
+        self.assertEqual((summary.done, summary.unchanged), (1, 1))
+
+        self.user.city = "Bonn"
+        self.user.save()
+        summary = regenerate_documents(items, workers=1)
+        self.assertEqual((summary.done, summary.unchanged), (1, 0))
+        self.contract.refresh_from_db()
+        changed = self.contract.pdf_fingerprints["contract_pdf"]
+        self.assertNotEqual(changed["fingerprint"], stored["fingerprint"])
+        self.assertEqual(changed["sha256"], file_sha256(self.contract.contract_pdf))
+
+        # файл изменён вне рендера — отпечаток не действителен
+        with open(self.contract.contract_pdf.path, "ab") as stored_file:
+            stored_file.write(b"%")
+        self.assertIsNone(stored_pdf_fingerprint(self.contract, "contract_pdf"))
+        self.assertEqual(regenerate_documents(items, workers=1).unchanged, 0)
+
+
+class PdfOutputProfileTests(SimpleTestCase):
+    """compact: подпись в разрешении печати, одинаковые картинки — один XObject, linearized."""
+
+    @staticmethod
+    def _image_pdf(image: Image.Image) -> bytes:
+        buffer = BytesIO()
+        c = Canvas(buffer)
+        c.drawImage(ImageReader(image), 50, 500, width=233, height=44, mask="auto")
+        c.save()
+        return buffer.getvalue()
+
+    def test_signature_downscaled_and_invisible_rgb_cleared(self):
+        pixels = np.zeros((600, 2000, 4), dtype=np.uint8)
+        pixels[..., :3] = 200
+        pixels[280:320, 100:1900] = (20, 20, 60, 255)
+        small = signature_for_print(Image.fromarray(pixels), 233.0, 44.0)
+        self.assertLessEqual(small.width, math.ceil(233 / 72 * PDF_SIGNATURE_DPI))
+        out = np.array(small)
+        self.assertFalse(out[out[..., 3] == 0, :3].any())
+
+    def test_compact_dedupes_images_and_linearizes(self):
+        page = self._image_pdf(Image.open(BytesIO(_signature_png())))
+        with pikepdf.open(BytesIO(page)) as pdf, pikepdf.open(BytesIO(page)) as second:
+            pdf.pages.extend(second.pages)
+            self.assertEqual(dedupe_images(pdf), 1)
+            compact = save_pdf(pdf, profile=PDF_PROFILE_COMPACT)
+        with pikepdf.open(BytesIO(compact)) as pdf:
+            self.assertTrue(pdf.is_linearized)
+            images = {xobj.objgen for p in pdf.pages for xobj in p.Resources.XObject.values()}
+            self.assertEqual(len(images), 1)
+
+    def test_compact_accepts_document_without_pages(self):
+        buffer = BytesIO()
+        Canvas(buffer).save()  # пустой текст договора — ReportLab пишет PDF без страниц
+        self.assertTrue(finalize_pdf_bytes(buffer.getvalue(), profile=PDF_PROFILE_COMPACT).startswith(b"%PDF"))
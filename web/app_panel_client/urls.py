@@ -2,7 +2,14 @@
 
 from django.urls import path
 
-from .views import buyer_data, contract_application, contract_sign, contracts_list
+from .views import (
+    buyer_data,
+    contract_application,
+    contract_quote,
+    contract_sign,
+    contracts_list,
+    contracts_pdf_status,
+)
 
 
 urlpatterns = [
@@ -10,5 +17,7 @@ urlpatterns = [
     path("contracts/", contracts_list, name="panel_client_contracts_list"),
     path("buyer-data/", buyer_data, name="panel_client_buyer_data"),
     path("contract-application/", contract_application, name="panel_client_contract_application"),
+    path("contract-quote/", contract_quote, name="panel_client_contract_quote"),
     path("contract-sign/", contract_sign, name="panel_client_contract_sign"),
+    path("contracts/pdf-status/", contracts_pdf_status, name="panel_client_contracts_pdf_status"),
 ]
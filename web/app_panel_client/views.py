@@ -1,5 +1,8 @@
-# FILE: web/app_panel_client/views.py
+# FILE: web/app_panel_client/views.py  (обновлено — 2026-10-17)
 # PURPOSE: Client panel reduced to one read-only page with the user's contracts.
+#          contract_quote — JSON-расчёт (Zahlungsdatum/Nominal/Stückzinsen/Gesamt) для live-обновления Antrag-страницы.
+#          Finalisieren / Unterzeichnen: статус сохраняется сразу, PDF + письма — PdfRenderJob (flexx.pdf_jobs);
+#          contracts_pdf_status — JSON для «Dokument wird vorbereitet…» (static/js/pdf_status.js).
 
 from __future__ import annotations
 
@@ -14,20 +17,14 @@ from babel.numbers import format_decimal
 from django.contrib.auth.decorators import login_required
 from django.core.files.base import ContentFile
 from django.db import transaction
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import redirect, render
 from django.utils import timezone
 from PIL import Image, UnidentifiedImageError
 
-from flexx.contract_helpers import calc_contract_amounts_from_stueckzins_table
-from flexx.emailer import (
-    send_client_contract_created_email,
-    send_client_contract_created_notify_email,
-    send_client_contract_signed_email,
-    send_client_contract_signed_notify_email,
-)
-from flexx.models import Contract
-from flexx.pdf_contract import build_contract_pdf, build_contract_pdf_client_signed
+from flexx.models import Contract, PdfRenderJob
+from flexx.pdf_jobs import PDF_JOB_TARGET_FIELDS, annotate_pdf_jobs, enqueue_pdf_job, pdf_job_failed, pdf_job_open
+from flexx.stueckzins_table import calc_issue_contract_amounts
 from .forms import ClientBuyerDataForm
 
 
@@ -74,7 +71,11 @@ def _contract_status_label(contract: Contract) -> str:
         return "Bezahlt"
     if contract.signed_received_at:
         return "Signiert"
-    if contract.contract_pdf and not contract.contract_pdf_signed and not contract.contract_pdf_signed_signed:
+    if (
+        (contract.contract_pdf or pdf_job_open(contract, PdfRenderJob.Kind.CREATED))
+        and not contract.contract_pdf_signed
+        and not contract.contract_pdf_signed_signed
+    ):
         return "Erstellt"
     return "Unbekannt"
 
@@ -84,7 +85,7 @@ def _client_contract_stage(contract: Contract) -> str:
         return "paid"
     if contract.signed_received_at:
         return "signed"
-    if contract.contract_pdf:
+    if contract.contract_pdf or pdf_job_open(contract, PdfRenderJob.Kind.CREATED):
         return "created"
     return "unknown"
 
@@ -107,17 +108,32 @@ def _build_consent_text(issue) -> str:
     )
 
 
+def _parse_application_input(issue, contract_date_raw: str, qty_raw: str) -> tuple[date | None, int | None, list[str]]:
+    """(Vertragsdatum | None, Anzahl | None, Fehler) — Anzahl nur wenn >= Mindestmenge."""
+    errors: list[str] = []
+    contract_date = _parse_iso_date(contract_date_raw)
+    if contract_date is None:
+        errors.append("Bitte geben Sie das Datum des Vertragsabschlusses an.")
+    elif contract_date < timezone.localdate():
+        errors.append("Das Datum des Vertragsabschlusses darf nicht in der Vergangenheit liegen.")
+
+    try:
+        qty = int((qty_raw or "").strip())
+    except Exception:
+        qty = 0
+
+    if qty < int(issue.minimal_bonds_quantity):
+        errors.append(f"Anzahl der Anleihen muss mindestens {issue.minimal_bonds_quantity} sein.")
+        return contract_date, None, errors
+    return contract_date, qty, errors
+
+
 def _build_calc_result(issue, contract_date: date, quantity: int) -> dict[str, object]:
-    settlement_date, nominal_amount, accrued_interest, total_amount = calc_contract_amounts_from_stueckzins_table(
-        issue_date=issue.issue_date,
-        term_months=issue.term_months,
-        interest_rate_percent=issue.interest_rate,
-        nominal_value=issue.bond_price,
+    settlement_date, nominal_amount, accrued_interest, total_amount = calc_issue_contract_amounts(
+        issue,
         sign_date=contract_date,
         quantity=quantity,
         banking_days_plus=10,
-        holiday_country="DE",
-        holiday_subdiv=None,
     )
     return {
         "settlement_date": settlement_date,
@@ -127,21 +143,6 @@ def _build_calc_result(issue, contract_date: date, quantity: int) -> dict[str, o
     }
 
 
-def _read_file_field_bytes(file_field) -> bytes | None:
-    if not file_field:
-        return None
-    try:
-        file_field.open("rb")
-        return file_field.read()
-    except Exception:
-        return None
-    finally:
-        try:
-            file_field.close()
-        except Exception:
-            pass
-
-
 def _decode_image_data_url(data_url: str) -> bytes | None:
     raw = (data_url or "").strip()
     if not raw:
@@ -171,52 +172,21 @@ def _normalize_signature_png(raw_bytes: bytes) -> bytes | None:
         return None
 
 
-def _build_client_contract_email_payload(
-    contract: Contract,
-    *,
-    primary_pdf_field_name: str,
-) -> tuple[list[tuple[str, bytes, str]], str, bool]:
-    attachments: list[tuple[str, bytes, str]] = []
-    file_lines: list[str] = []
-    has_contract_pdf = False
-
-    primary_pdf_field = getattr(contract, primary_pdf_field_name)
-    contract_pdf_bytes = _read_file_field_bytes(primary_pdf_field)
-    contract_pdf_name = os.path.basename(primary_pdf_field.name) if primary_pdf_field else ""
-    if contract_pdf_bytes and contract_pdf_name:
-        attachments.append((contract_pdf_name, contract_pdf_bytes, "application/pdf"))
-        has_contract_pdf = True
-
-    issue_attachments = sorted(
-        list(contract.issue.attachments.all()),
-        key=lambda a: (((a.description or "").strip().lower()), a.id),
-    )
-    for attachment in issue_attachments:
-        filename = os.path.basename(attachment.file.name or "")
-        if not filename.lower().endswith(".pdf"):
-            continue
-        raw_bytes = _read_file_field_bytes(attachment.file)
-        if not raw_bytes:
-            continue
-        description = (attachment.description or "").strip() or filename
-        file_lines.append(f"* {description}")
-        attachments.append((filename, raw_bytes, "application/pdf"))
-
-    return attachments, "\n".join(file_lines), has_contract_pdf
-
-
 def _get_client_contract_from_post(request: HttpRequest) -> Contract | None:
     contract_id_raw = (request.POST.get("contract_id") or "").strip()
     try:
         contract_id = int(contract_id_raw)
     except Exception:
         return None
-    return (
+    contract = (
         Contract.objects.select_related("issue", "client")
         .prefetch_related("issue__attachments")
         .filter(id=contract_id, client=request.user)
         .first()
     )
+    if contract is not None:
+        annotate_pdf_jobs([contract])
+    return contract
 
 
 def _prepare_issue_display(issue) -> None:
@@ -259,13 +229,15 @@ def _render_contract_application_page(
     issue = contract.issue
     _prepare_issue_display(issue)
 
-    finalized_view = bool(contract.contract_pdf)
+    finalized_view = bool(contract.contract_pdf) or pdf_job_open(contract, PdfRenderJob.Kind.CREATED)
     if form_contract_date is None:
         form_contract_date = contract.contract_date or timezone.localdate()
     if form_qty is None:
         form_qty = contract.bonds_quantity or issue.minimal_bonds_quantity
     if finalized_view and calc_result is None:
         calc_result = _build_saved_calc_result(contract)
+    if not finalized_view and pdf_job_failed(contract, PdfRenderJob.Kind.CREATED):
+        errors = [*(errors or []), "Der Vertrag / Antrag konnte technisch nicht erstellt werden. Bitte versuchen Sie es erneut."]
 
     calc_nominal_display = None
     calc_accrued_display = None
@@ -343,7 +315,7 @@ def _render_contract_sign_page(
             "issue_bond_price_display": contract.issue.bond_price_display,
             "issue_volume_display": contract.issue.issue_volume_display,
             "sign_errors": sign_errors or [],
-            "show_signature_form": not contract.contract_pdf_signed,
+            "show_signature_form": not contract.contract_pdf_signed and not pdf_job_open(contract, PdfRenderJob.Kind.SIGNED),
             "signed_contract_pdf_url": contract.contract_pdf_signed.url if contract.contract_pdf_signed else "",
             "signed_contract_pdf_name": os.path.basename(contract.contract_pdf_signed.name) if contract.contract_pdf_signed else "",
         },
@@ -363,6 +335,7 @@ def contracts_list(request: HttpRequest) -> HttpResponse:
         .order_by("-id")
     )
 
+    annotate_pdf_jobs(contracts)
     for contract in contracts:
         _prepare_issue_display(contract.issue)
         contract.status_label = _contract_status_label(contract)
@@ -452,8 +425,9 @@ def contract_application(request: HttpRequest) -> HttpResponse:
     if not contract:
         return redirect("panel_client_contracts_list")
 
+    finalized = bool(contract.contract_pdf) or pdf_job_open(contract, PdfRenderJob.Kind.CREATED)
     if action == "open":
-        if not contract.contract_pdf and _contract_status_label(contract) != "Unbekannt":
+        if not finalized and _contract_status_label(contract) != "Unbekannt":
             return redirect("panel_client_contracts_list")
         return _render_contract_application_page(request, contract)
 
@@ -464,30 +438,22 @@ def contract_application(request: HttpRequest) -> HttpResponse:
     calc_result: dict[str, object] | None = None
     show_finalize_modal = False
 
-    if contract.contract_pdf:
+    if finalized:
         return _render_contract_application_page(request, contract)
     if _contract_status_label(contract) != "Unbekannt":
         return redirect("panel_client_contracts_list")
 
     receipt_confirm_contract = request.POST.get("receipt_confirm_contract") == "1"
-    parsed_contract_date = _parse_iso_date(request.POST.get("contract_date") or "")
-    if parsed_contract_date is None:
-        errors.append("Bitte geben Sie das Datum des Vertragsabschlusses an.")
-    else:
+    parsed_contract_date, parsed_qty, input_errors = _parse_application_input(
+        contract.issue,
+        request.POST.get("contract_date") or "",
+        request.POST.get("bonds_quantity") or "",
+    )
+    errors.extend(input_errors)
+    if parsed_contract_date is not None:
         form_contract_date = parsed_contract_date
-        if form_contract_date < timezone.localdate():
-            errors.append("Das Datum des Vertragsabschlusses darf nicht in der Vergangenheit liegen.")
-
-    qty_raw = (request.POST.get("bonds_quantity") or "").strip()
-    try:
-        qty = int(qty_raw)
-    except Exception:
-        qty = 0
-
-    if qty < int(contract.issue.minimal_bonds_quantity):
-        errors.append(f"Anzahl der Anleihen muss mindestens {contract.issue.minimal_bonds_quantity} sein.")
-    else:
-        form_qty = qty
+    if parsed_qty is not None:
+        form_qty = parsed_qty
 
     if not errors:
         calc_result = _build_calc_result(contract.issue, form_contract_date, form_qty)
@@ -499,51 +465,23 @@ def contract_application(request: HttpRequest) -> HttpResponse:
         show_finalize_modal = True
 
     if not errors and action == "finalize" and calc_result is not None:
-        if not contract.contract_pdf:
-            with transaction.atomic():
-                contract.contract_date = form_contract_date
-                contract.settlement_date = calc_result["settlement_date"]
-                contract.bonds_quantity = form_qty
-                contract.nominal_amount = calc_result["nominal_amount"]
-                contract.nominal_amount_plus_percent = calc_result["total_amount"]
-                contract.save(update_fields=[
-                    "contract_date",
-                    "settlement_date",
-                    "bonds_quantity",
-                    "nominal_amount",
-                    "nominal_amount_plus_percent",
-                    "updated_at",
-                ])
-                pdf_result = build_contract_pdf(contract.id)
-                if contract.contract_pdf:
-                    contract.contract_pdf.delete(save=False)
-                contract.contract_pdf.save(pdf_result.filename, ContentFile(pdf_result.pdf_bytes), save=True)
-            attachments, file_decrs, has_contract_pdf = _build_client_contract_email_payload(
-                contract,
-                primary_pdf_field_name="contract_pdf",
-            )
-            if has_contract_pdf:
-                try:
-                    send_client_contract_created_email(
-                        to_email=contract.client.email,
-                        first_name=contract.client.first_name or "",
-                        last_name=contract.client.last_name or "",
-                        file_decrs=file_decrs,
-                        attachments=attachments,
-                    )
-                except Exception:
-                    pass
-            try:
-                send_client_contract_created_notify_email(
-                    client_email=contract.client.email,
-                    first_name=contract.client.first_name or "",
-                    last_name=contract.client.last_name or "",
-                    contract_id=contract.id,
-                    issue_title=str(contract.issue),
-                )
-            except Exception:
-                pass
-            contract.refresh_from_db()
+        with transaction.atomic():
+            contract.contract_date = form_contract_date
+            contract.settlement_date = calc_result["settlement_date"]
+            contract.bonds_quantity = form_qty
+            contract.nominal_amount = calc_result["nominal_amount"]
+            contract.nominal_amount_plus_percent = calc_result["total_amount"]
+            contract.save(update_fields=[
+                "contract_date",
+                "settlement_date",
+                "bonds_quantity",
+                "nominal_amount",
+                "nominal_amount_plus_percent",
+                "updated_at",
+            ])
+            enqueue_pdf_job(contract, PdfRenderJob.Kind.CREATED)
+        contract.refresh_from_db()
+        annotate_pdf_jobs([contract])
         return _render_contract_application_page(request, contract)
 
     return _render_contract_application_page(
@@ -574,7 +512,7 @@ def contract_sign(request: HttpRequest) -> HttpResponse:
 
     if action == "open":
         return _render_contract_sign_page(request, contract)
-    if contract.contract_pdf_signed:
+    if contract.contract_pdf_signed or pdf_job_open(contract, PdfRenderJob.Kind.SIGNED):
         return _render_contract_sign_page(request, contract)
 
     sign_errors: list[str] = []
@@ -600,53 +538,92 @@ def contract_sign(request: HttpRequest) -> HttpResponse:
                     ContentFile(signature_png),
                     save=False,
                 )
-                contract.save(update_fields=[
-                    "signature",
-                    "updated_at",
-                ])
-                signed_contract_res = build_contract_pdf_client_signed(contract.id)
-                if contract.contract_pdf_signed:
-                    contract.contract_pdf_signed.delete(save=False)
-                contract.contract_pdf_signed.save(
-                    signed_contract_res.filename,
-                    ContentFile(signed_contract_res.pdf_bytes),
-                    save=False,
-                )
                 if not contract.signed_received_at:
                     contract.signed_received_at = timezone.localdate()
                 contract.save(update_fields=[
-                    "contract_pdf_signed",
+                    "signature",
                     "signed_received_at",
                     "updated_at",
                 ])
+                enqueue_pdf_job(contract, PdfRenderJob.Kind.SIGNED)
         except Exception as exc:
             sign_errors.append(f"Signatur konnte nicht gespeichert werden: {exc}")
         else:
             contract.refresh_from_db()
-            attachments, file_decrs, has_signed_pdf = _build_client_contract_email_payload(
-                contract,
-                primary_pdf_field_name="contract_pdf_signed",
-            )
-            if has_signed_pdf:
-                try:
-                    send_client_contract_signed_email(
-                        to_email=contract.client.email,
-                        first_name=contract.client.first_name or "",
-                        last_name=contract.client.last_name or "",
-                        file_decrs=file_decrs,
-                        attachments=attachments,
-                    )
-                except Exception:
-                    pass
-            try:
-                send_client_contract_signed_notify_email(
-                    client_email=contract.client.email,
-                    first_name=contract.client.first_name or "",
-                    last_name=contract.client.last_name or "",
-                    contract_id=contract.id,
-                    issue_title=str(contract.issue),
-                )
-            except Exception:
-                pass
+            annotate_pdf_jobs([contract])
 
     return _render_contract_sign_page(request, contract, sign_errors=sign_errors)
+
+
+@login_required
+def contract_quote(request: HttpRequest) -> HttpResponse:
+    """GET contract_id, contract_date, bonds_quantity -> JSON-Berechnung (ohne Speichern)."""
+    if request.user.role != "client":
+        return JsonResponse({"ok": False, "errors": ["Kein Zugriff."]}, status=403)
+
+    try:
+        contract_id = int((request.GET.get("contract_id") or "").strip())
+    except Exception:
+        contract_id = 0
+    contract = (
+        Contract.objects.select_related("issue")
+        .filter(id=contract_id, client=request.user)
+        .first()
+    )
+    if contract is None:
+        return JsonResponse({"ok": False, "errors": ["Vertrag nicht gefunden."]}, status=404)
+    annotate_pdf_jobs([contract])
+    if contract.contract_pdf or _contract_status_label(contract) != "Unbekannt":
+        return JsonResponse({"ok": False, "errors": ["Vertrag bereits erstellt."]}, status=409)
+
+    contract_date, qty, errors = _parse_application_input(
+        contract.issue,
+        request.GET.get("contract_date") or "",
+        request.GET.get("bonds_quantity") or "",
+    )
+    if errors:
+        return JsonResponse({"ok": False, "errors": errors})
+
+    calc_result = _build_calc_result(contract.issue, contract_date, qty)
+    return JsonResponse(
+        {
+            "ok": True,
+            "settlement_date": calc_result["settlement_date"].isoformat(),
+            "settlement_date_display": calc_result["settlement_date"].strftime("%d.%m.%Y"),
+            "nominal_amount": str(calc_result["nominal_amount"]),
+            "accrued_interest": str(calc_result["accrued_interest"]),
+            "total_amount": str(calc_result["total_amount"]),
+            "nominal_amount_display": _format_decimal_de(calc_result["nominal_amount"], "#,##0.00"),
+            "accrued_interest_display": _format_decimal_de(calc_result["accrued_interest"], "#,##0.00"),
+            "total_amount_display": _format_decimal_de(calc_result["total_amount"], "#,##0.00"),
+        }
+    )
+
+
+@login_required
+def contracts_pdf_status(request: HttpRequest) -> HttpResponse:
+    """GET ids=1,2 -> {contract_id: {kind: {status, url, name}}} — опрос «Dokument wird vorbereitet…»."""
+    if request.user.role != "client":
+        return JsonResponse({"ok": False, "errors": ["Kein Zugriff."]}, status=403)
+
+    ids: list[int] = []
+    for raw in (request.GET.get("ids") or "").split(",")[:50]:
+        try:
+            ids.append(int(raw))
+        except ValueError:
+            continue
+    contracts = list(Contract.objects.filter(id__in=ids, client=request.user))
+    annotate_pdf_jobs(contracts)
+
+    result: dict[str, dict[str, dict[str, str]]] = {}
+    for contract in contracts:
+        kinds: dict[str, dict[str, str]] = {}
+        for kind, field_name in PDF_JOB_TARGET_FIELDS.items():
+            field = getattr(contract, field_name)
+            kinds[kind] = {
+                "status": contract.pdf_jobs.get(kind, PdfRenderJob.Status.DONE),
+                "url": field.url if field else "",
+                "name": os.path.basename(field.name) if field else "",
+            }
+        result[str(contract.id)] = kinds
+    return JsonResponse({"ok": True, "contracts": result})
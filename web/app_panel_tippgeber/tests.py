@@ -1,3 +1,283 @@
-from django.test import TestCase
+from __future__ import annotations
 
-# Create your tests here.
+from datetime import date
+from decimal import Decimal
+from io import BytesIO, StringIO
+import os
+import re
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from app_users.models import FlexxUser
+from flexx.management.commands.tippgeber_layout_benchmark import (
+    _split_long_piece_stringwidth,
+    _tokenize_text_with_bold_loop,
+)
+from flexx.models import BondIssue, TippgeberContract, TippgeberContractText
+from flexx import pdf_preview_cache
+from flexx.pdf_fingerprint import stored_pdf_fingerprint
+from flexx.pdf_preview_cache import (
+    PDF_PREVIEW_CACHE_MAX_AGE,
+    _preview_lock,
+    preview_cache_dir,
+    prune_preview_cache,
+)
+from flexx.pdf_regenerate import REGENERATE_KIND_TIPPGEBER, regenerate_documents
+from flexx.pdf_tippgeber_contract import (
+    _PARSED_CONTRACT_TEXTS,
+    _SIGNATURE_TABLE_MARKER,
+    TippgeberContractTextRenderer,
+    _layout_chunks,
+    _layout_text,
+    _split_long_piece,
+    _text_width,
+    _tokenize_text_with_bold,
+    build_tippgeber_contract_text_pdf,
+    parse_contract_text,
+    tippgeber_contract_fingerprint,
+)
+
+from .views.contracts import _sign_missing_contracts_for_tippgeber
+
+
+def _signature_png() -> bytes:
+    image = Image.new("RGBA", (300, 80), (255, 255, 255, 0))
+    for x in range(20, 280):
+        image.putpixel((x, 40), (0, 0, 0, 255))
+    buffer = BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class GlyphWidthLayoutTests(TestCase):
+    """Кэш ширин глифов и токенизатор кусками == stringWidth / посимвольный цикл (макет не меняется)."""
+
+    samples = ["", "Vergütung", "ÄÖÜ ß € „netto“", "αβγ ✓ ✈ 漢字", "W" * 300, "iIl.,;:" * 50]
+
+    def test_text_width_matches_stringwidth(self):
+        for text in self.samples:
+            for bold in (False, True):
+                font_name = "Helvetica-Bold" if bold else "Helvetica"
+                self.assertEqual(_text_width(text, bold), stringWidth(text, font_name, 11.0))
+
+    def test_split_long_piece_matches_previous(self):
+        for text in self.samples:
+            for max_width in (1.0, 37.5, 200.0):
+                self.assertEqual(
+                    list(_split_long_piece(text, max_width=max_width, is_bold=True)),
+                    list(_split_long_piece_stringwidth(text, max_width=max_width, is_bold=True)),
+                )
+
+    def test_tokenizer_matches_previous(self):
+        text = "**fett** __unter__ {BR} { BR } {x} * _ ***a**\n\t****raw **b**\n\t*x****\nEnde_"
+        self.assertEqual(_tokenize_text_with_bold(text), _tokenize_text_with_bold_loop(text))
+
+    def test_benchmark_command_checks_output(self):
+        out = StringIO()
+        call_command("tippgeber_layout_benchmark", paragraphs=3, repeat=1, stdout=out)
+        self.assertIn("identical", out.getvalue())
+
+
+class ParsedContractTextTests(SimpleTestCase):
+    """Разбор разметки — один раз на версию текста; подстановка после разбора == подстановка в строку до разбора."""
+
+    text = (
+        "!!Vertrag mit {Tippgeber}!!\nISIN:{WKN / ISIN}: **fett{WKN/ISIN}** __{ WKN / ISIN }__ {BR}\n"
+        "****raw x{WKN / ISIN}y\n\t{Tippgeber}****\n1) Punkt {WKN / ISIN}\n{Unterschrift}\n"
+    )
+
+    def setUp(self):
+        _PARSED_CONTRACT_TEXTS.clear()
+
+    def test_parsed_once_per_text_version(self):
+        first = parse_contract_text(self.text)
+        self.assertIs(parse_contract_text(self.text), first)
+        self.assertEqual(first.placeholders, {"tippgeber", "isin_wkn", "signature"})
+        self.assertIsNot(parse_contract_text(self.text + "Neu"), first)
+
+    def test_expand_matches_substitution_before_parsing(self):
+        block = "ACME GmbH\n\tWeg 1, 12345 Köln"
+        for isin in ("DE000A1B2C3", ""):
+            values = {"tippgeber": block, "isin_wkn": isin, "signature": _SIGNATURE_TABLE_MARKER}
+            substituted = re.sub(r"\{\s*Tippgeber\s*\}", lambda _: block, self.text)
+            substituted = re.sub(r"\{\s*WKN\s*/\s*ISIN\s*\}", lambda _: isin, substituted)
+            substituted = re.sub(r"\{\s*Unterschrift\s*\}", _SIGNATURE_TABLE_MARKER, substituted)
+            self.assertEqual(_layout_chunks(parse_contract_text(self.text).expand(values)), _layout_text(substituted))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TippgeberContractRendererTests(TestCase):
+    """Servicepartner-Vertrag für mehrere Emissionen: Layout einmal, PDF parallel — wie Einzel-Build."""
+
+    def setUp(self):
+        TippgeberContractText.objects.create(
+            text="Vertrag\n{Tippgeber}\nEmission {WKN / ISIN}\n\n" + "Text mit Inhalt. " * 200 + "\n{Unterschrift}\n"
+        )
+        self.user = FlexxUser.objects.create_user(
+            email="partner@example.de", first_name="Max", last_name="Partner", role="agent"
+        )
+        self.issues = [
+            BondIssue.objects.create(
+                title=f"Anleihe {n}",
+                issue_date=date(2025, 1, 15),
+                interest_rate=Decimal("5.50"),
+                bond_price=Decimal("1000.00"),
+                issue_volume=Decimal("1000000.00"),
+                term_months=24,
+                isin_wkn=f"DE000A{n}XYZ",
+                active=True,
+            )
+            for n in range(3)
+        ]
+
+    def test_build_many_matches_single_builds(self):
+        signature = _signature_png()
+        renderer = TippgeberContractTextRenderer(
+            tippgeber=self.user, tippgeber_signature_png=signature, sign_date=date(2025, 3, 3)
+        )
+        results = renderer.build_many(self.issues, max_workers=3)
+        self.assertEqual(len(results), len(self.issues))
+        for issue, result in zip(self.issues, results):
+            single = build_tippgeber_contract_text_pdf(
+                issue=issue, tippgeber=self.user, tippgeber_signature_png=signature, sign_date=date(2025, 3, 3)
+            )
+            self.assertEqual((result.pdf_bytes, result.fingerprint), (single.pdf_bytes, single.fingerprint))
+            self.assertEqual(
+                result.fingerprint,
+                tippgeber_contract_fingerprint(
+                    issue=issue, tippgeber=self.user, sign_date=date(2025, 3, 3), tippgeber_signature_png=signature
+                ),
+            )
+        self.assertEqual(len({result.pdf_bytes for result in results}), len(self.issues))
+
+    def test_layout_shared_without_issue_placeholder(self):
+        TippgeberContractText.objects.update(text="Vertrag ohne Emission\n" + "Text. " * 100)
+        renderer = TippgeberContractTextRenderer(tippgeber=self.user)
+        self.assertIs(renderer.layout(self.issues[0]), renderer.layout(self.issues[1]))
+
+    def test_renderers_share_parsed_text_version(self):
+        first = TippgeberContractTextRenderer(tippgeber=self.user)
+        first.layout(self.issues[0])
+        second = TippgeberContractTextRenderer()
+        self.assertIs(second.parsed, first.parsed)
+        self.assertTrue(second.parsed.line_cache)
+        TippgeberContractText.objects.update(text="Neuer Text {WKN / ISIN}")
+        self.assertIsNot(TippgeberContractTextRenderer().parsed, first.parsed)
+
+    def test_sign_missing_contracts_saves_all_issues(self):
+        error, saved_ids = _sign_missing_contracts_for_tippgeber(user=self.user, signature_png=_signature_png())
+        self.assertIsNone(error)
+        self.assertEqual(len(saved_ids), len(self.issues))
+        contracts = TippgeberContract.objects.filter(id__in=saved_ids)
+        self.assertEqual({c.issue_id for c in contracts}, {issue.id for issue in self.issues})
+        for contract in contracts:
+            self.assertIsNotNone(contract.signed_at)
+            with contract.signed_contract_pdf.open("rb") as stored:
+                self.assertTrue(stored.read().startswith(b"%PDF"))
+            self.assertIsNotNone(stored_pdf_fingerprint(contract, "signed_contract_pdf"))
+
+        # вход не менялся — перегенерация ничего не рисует
+        items = [(REGENERATE_KIND_TIPPGEBER, contract_id) for contract_id in saved_ids]
+        self.assertEqual(regenerate_documents(items, workers=1).unchanged, len(saved_ids))
+        self.user.last_name = "Neu"
+        self.user.save()
+        self.assertEqual(regenerate_documents(items, workers=1).unchanged, 0)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PDF_PREVIEW_CACHE_DIR=tempfile.mkdtemp())
+class ContractPreviewCacheTests(TestCase):
+    """Vorschau: PDF auf Platte nach Fingerprint, ETag -> 304, neu nur bei geänderten Eingaben."""
+
+    def setUp(self):
+        TippgeberContractText.objects.create(text="Vertrag\n{Tippgeber}\nEmission {WKN / ISIN}\n{Unterschrift}\n")
+        self.user = FlexxUser.objects.create_user(
+            email="partner@example.de",
+            first_name="Max",
+            last_name="Partner",
+            role="agent",
+            birth_date=date(1980, 1, 1),
+            street="Weg 1",
+            zip_code="12345",
+            city="Köln",
+            phone="0221 1",
+            bank_account_holder="Max Partner",
+            bank_iban="DE89370400440532013000",
+            bank_name="Bank",
+        )
+        self.issue = BondIssue.objects.create(
+            title="Anleihe",
+            issue_date=date(2025, 1, 15),
+            interest_rate=Decimal("5.50"),
+            bond_price=Decimal("1000.00"),
+            issue_volume=Decimal("1000000.00"),
+            term_months=24,
+            isin_wkn="DE000A1B2C3",
+            active=True,
+        )
+        self.url = reverse("panel_tippgeber_contract_preview", args=[self.issue.id])
+        self.client.force_login(self.user)
+
+    def _get(self, **headers):
+        with mock.patch(
+            "app_panel_tippgeber.views.contracts.build_tippgeber_contract_text_pdf",
+            wraps=build_tippgeber_contract_text_pdf,
+        ) as build:
+            response = self.client.get(self.url, headers=headers)
+            body = b"".join(response.streaming_content) if response.status_code == 200 else b""
+        return response, body, build.call_count
+
+    def test_preview_cached_on_disk_and_revalidated(self):
+        first, first_body, builds = self._get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(builds, 1)
+        self.assertTrue(first_body.startswith(b"%PDF"))
+        etag = first["ETag"]
+        self.assertEqual(os.listdir(settings.PDF_PREVIEW_CACHE_DIR), [etag.strip('"') + ".pdf"])
+
+        again, again_body, builds = self._get()
+        self.assertEqual((again.status_code, builds, again["ETag"]), (200, 0, etag))
+        self.assertEqual(again_body, first_body)
+
+        not_modified, _, builds = self._get(If_None_Match=etag)
+        self.assertEqual((not_modified.status_code, builds), (304, 0))
+
+    def test_profile_change_renders_new_preview(self):
+        first, _, _ = self._get()
+        self.user.city = "Bonn"
+        self.user.save()
+        changed, _, builds = self._get(If_None_Match=first["ETag"])
+        self.assertEqual((changed.status_code, builds), (200, 1))
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+
+    def test_unavailable_preview_has_no_etag(self):
+        self.issue.active = False
+        self.issue.save()
+        response, _, builds = self._get()
+        self.assertEqual((response.status_code, builds), (404, 0))
+        self.assertFalse(response.has_header("ETag"))
+
+    @override_settings(PDF_PREVIEW_CACHE_DIR=tempfile.mkdtemp())
+    def test_prune_keeps_locks_in_use(self):
+        cache_dir = preview_cache_dir()
+        old = time.time() - PDF_PREVIEW_CACHE_MAX_AGE - 60
+        for name in ("alt-frei", "alt-belegt", "neu"):
+            (cache_dir / f"{name}.pdf").write_bytes(b"%PDF")
+            _preview_lock(name)
+        for name in ("alt-frei", "alt-belegt"):
+            os.utime(cache_dir / f"{name}.pdf", (old, old))
+
+        held = _preview_lock("alt-belegt")
+        with held:
+            self.assertEqual(prune_preview_cache(), 2)
+            self.assertIs(_preview_lock("alt-belegt"), held)
+        self.assertEqual(sorted(os.listdir(cache_dir)), ["neu.pdf"])
+        self.assertNotIn("alt-frei", pdf_preview_cache._PREVIEW_LOCKS)
+        self.assertIn("neu", pdf_preview_cache._PREVIEW_LOCKS)
@@ -12,11 +12,19 @@ from django.db import transaction
 from django.http import FileResponse, Http404, HttpRequest, HttpResponse
 from django.shortcuts import redirect, render
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from PIL import Image, UnidentifiedImageError
 
 from flexx.emailer import send_tippgeber_contract_signed_email
-from flexx.models import BondIssue, FlexxlagerSignature, TippgeberContract
-from flexx.pdf_tippgeber_contract import build_tippgeber_contract_text_pdf
+from flexx.models import BondIssue, TippgeberContract
+from flexx.pdf_fingerprint import record_pdf_fingerprint
+from flexx.pdf_preview_cache import cached_preview_path
+from flexx.pdf_tippgeber_contract import (
+    TippgeberContractTextRenderer,
+    build_tippgeber_contract_text_pdf,
+    tippgeber_preview_fingerprint,
+)
 from ..forms import TippgeberProfileForm
 from .common import agent_only, get_missing_signed_issue_ids_for_tippgeber
 
@@ -62,21 +70,6 @@ def _build_servicepartner_filename(issue: BondIssue, *, tippgeber_id: int) -> st
     return f"ServicepartnerVertrag-{middle}-N{tippgeber_id}.pdf"
 
 
-def _read_file_field_bytes(file_field) -> bytes | None:
-    if not file_field:
-        return None
-    try:
-        file_field.open("rb")
-        return file_field.read()
-    except Exception:
-        return None
-    finally:
-        try:
-            file_field.close()
-        except Exception:
-            pass
-
-
 def _is_tippgeber_profile_complete(user) -> bool:
     probe_form = TippgeberProfileForm(prefix="tipp", instance=user)
     for field_name, field in probe_form.fields.items():
@@ -127,50 +120,48 @@ def _sign_missing_contracts_for_tippgeber(
     now_dt = timezone.now()
     attachments: list[tuple[str, bytes, str]] = []
     saved_contract_ids: list[int] = []
-    flexx_sign = FlexxlagerSignature.objects.first()
-    company_signature_png = _read_file_field_bytes(flexx_sign.signature) if flexx_sign else None
 
     try:
+        # текст и подписи — один раз на прогон, PDF по эмиссиям — параллельно, без открытой транзакции
+        renderer = TippgeberContractTextRenderer(
+            tippgeber=user, tippgeber_signature_png=signature_png, sign_date=timezone.localdate(now_dt)
+        )
+        results = renderer.build_many(missing_issues)
+
+        contracts: list[TippgeberContract] = []
+        for issue, signed_pdf_res in zip(missing_issues, results):
+            contract = contract_rows.get(issue.id)
+            if contract is None:
+                contract = TippgeberContract(tippgeber=user, issue=issue)
+            if contract.signature_file:
+                contract.signature_file.delete(save=False)
+            if contract.signed_contract_pdf:
+                contract.signed_contract_pdf.delete(save=False)
+
+            contract.signature_file.save(
+                f"signature-IN{issue.id}-TG{user.id}.png",
+                ContentFile(signature_png),
+                save=False,
+            )
+            contract.signed_contract_pdf.save(
+                _build_servicepartner_filename(issue, tippgeber_id=user.id),
+                ContentFile(signed_pdf_res.pdf_bytes),
+                save=False,
+            )
+            record_pdf_fingerprint(contract, "signed_contract_pdf", signed_pdf_res.fingerprint, signed_pdf_res.pdf_bytes)
+            contract.signed_at = now_dt
+            contracts.append(contract)
+            attachments.append((os.path.basename(contract.signed_contract_pdf.name), signed_pdf_res.pdf_bytes, "application/pdf"))
+
         with transaction.atomic():
-            for issue in missing_issues:
-                contract = contract_rows.get(issue.id)
-                if contract is None:
-                    contract = TippgeberContract(tippgeber=user, issue=issue)
-                if contract.signature_file:
-                    contract.signature_file.delete(save=False)
-                if contract.signed_contract_pdf:
-                    contract.signed_contract_pdf.delete(save=False)
-
-                contract.signature_file.save(
-                    f"signature-IN{issue.id}-TG{user.id}.png",
-                    ContentFile(signature_png),
-                    save=False,
-                )
-                signed_pdf_res = build_tippgeber_contract_text_pdf(
-                    issue=issue,
-                    tippgeber=user,
-                    tippgeber_signature_png=signature_png,
-                    tippgeber_signature_line_text=(
-                        f"{timezone.localdate():%d.%m.%Y} "
-                        f"({(user.first_name or '').strip()} {(user.last_name or '').strip()})"
-                    ).strip(),
-                    company_signature_png=company_signature_png,
-                    company_signature_line_text="(FleXXLager GmbH & Co. KG)",
-                )
-                pdf_filename = _build_servicepartner_filename(issue, tippgeber_id=user.id)
-                contract.signed_contract_pdf.save(
-                    pdf_filename,
-                    ContentFile(signed_pdf_res.pdf_bytes),
-                    save=False,
-                )
-                contract.signed_at = now_dt
+            for contract in contracts:
                 if contract.id:
-                    contract.save(update_fields=["signature_file", "signed_contract_pdf", "signed_at", "updated_at"])
+                    contract.save(
+                        update_fields=["signature_file", "signed_contract_pdf", "pdf_fingerprints", "signed_at", "updated_at"]
+                    )
                 else:
                     contract.save()
-                if contract.id:
-                    saved_contract_ids.append(contract.id)
-                attachments.append((os.path.basename(contract.signed_contract_pdf.name), signed_pdf_res.pdf_bytes, "application/pdf"))
+                saved_contract_ids.append(contract.id)
     except Exception as exc:
         return f"Vertraege konnten nicht gespeichert werden: {exc}", []
 
@@ -187,7 +178,31 @@ def _sign_missing_contracts_for_tippgeber(
     return None, saved_contract_ids
 
 
+def _contract_preview_state(request: HttpRequest, issue_id: int):
+    """
+    (issue, дата, отпечаток) или None, если превью недоступно; один раз на HTTP-запрос (condition + view).
+    None -> без ETag, view отвечает редиректом / 404 как раньше.
+    """
+    state = getattr(request, "_tippgeber_preview_state", False)
+    if state is False:
+        state = None
+        user = request.user
+        if getattr(user, "role", None) == "agent" and _is_tippgeber_profile_complete(user):
+            issue = BondIssue.objects.filter(id=issue_id, active=True).first()
+            if issue and issue.id in get_missing_signed_issue_ids_for_tippgeber(user):
+                today = timezone.localdate()
+                state = (issue, today, tippgeber_preview_fingerprint(issue=issue, tippgeber=user, sign_date=today))
+        request._tippgeber_preview_state = state
+    return state
+
+
+def _contract_preview_etag(request: HttpRequest, issue_id: int, **kwargs) -> str | None:
+    state = _contract_preview_state(request, issue_id)
+    return state[2] if state else None
+
+
 @login_required
+@condition(etag_func=_contract_preview_etag)
 def contract_preview(request: HttpRequest, issue_id: int) -> HttpResponse:
     denied = agent_only(request, allow_contracts_required_page=True)
     if denied:
@@ -195,25 +210,28 @@ def contract_preview(request: HttpRequest, issue_id: int) -> HttpResponse:
     if not _is_tippgeber_profile_complete(request.user):
         return redirect("/panel/tippgeber/contracts/required/")
 
-    issue = BondIssue.objects.filter(id=issue_id, active=True).first()
-    if not issue:
-        raise Http404("Issue not found")
-
-    missing_issue_ids = get_missing_signed_issue_ids_for_tippgeber(request.user)
-    if issue.id not in missing_issue_ids:
+    state = _contract_preview_state(request, issue_id)
+    if state is None:
+        if not BondIssue.objects.filter(id=issue_id, active=True).exists():
+            raise Http404("Issue not found")
         raise Http404("Contract preview is unavailable")
+    issue, today, fingerprint = state
 
-    pdf_result = build_tippgeber_contract_text_pdf(
-        issue=issue,
-        tippgeber=request.user,
+    # PDF на диске по отпечатку (эмиссия, профиль Servicepartner, версия текста, дата) — рендер только при изменении
+    path = cached_preview_path(
+        fingerprint,
+        lambda: build_tippgeber_contract_text_pdf(issue=issue, tippgeber=request.user, sign_date=today).pdf_bytes,
     )
     filename = _build_servicepartner_filename(issue, tippgeber_id=request.user.id)
-    return FileResponse(
-        BytesIO(pdf_result.pdf_bytes),
+    response = FileResponse(
+        open(path, "rb"),
         as_attachment=True,
         filename=filename,
         content_type="application/pdf",
     )
+    # браузер может хранить ответ, но каждый раз ревалидирует (If-None-Match -> 304)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @login_required
@@ -1,3 +1,63 @@
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+
 from django.test import TestCase
+from django.urls import reverse
+
+from flexx.models import BondIssue
+
+
+class PublicInterestTableTests(TestCase):
+    """Публичная Stückzinstabelle: кэш фрагмента + условный GET (ETag / Last-Modified)."""
+
+    def setUp(self):
+        self.issue = BondIssue.objects.create(
+            title="Anleihe",
+            issue_date=date(2025, 1, 15),
+            interest_rate=Decimal("5.50"),
+            bond_price=Decimal("1000.00"),
+            issue_volume=Decimal("1000000.00"),
+            term_months=24,
+        )
+        self.url = reverse("public_issue_interest_table", args=[self.issue.id])
+
+    def test_etag_304_and_invalidation_on_save(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("ETag", first)
+        self.assertIn("Last-Modified", first)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+        with self.assertNumQueries(1):
+            again = self.client.get(self.url)
+        self.assertEqual(again.content, first.content)
+
+        self.issue.title = "Anleihe neu"
+        self.issue.save()
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertContains(changed, "Anleihe neu")
+
+    def test_unknown_issue_404(self):
+        self.assertEqual(self.client.get(reverse("public_issue_interest_table", args=[self.issue.id + 1])).status_code, 404)
+
+    def test_json_segments_match_html_groups(self):
+        toc = self.client.get(reverse("public_issue_interest_segments", args=[self.issue.id])).json()
+        self.assertEqual(toc["issue"]["bond_price"], "1000,00")
+        self.assertEqual([seg["label"] for seg in toc["segments"]], ["15.01.2025 – 14.01.2026", "15.01.2026 – 14.01.2027"])
+
+        total = 0
+        for seg in toc["segments"]:
+            url = reverse("public_issue_interest_segment", args=[self.issue.id, seg["index"]])
+            segment = self.client.get(url).json()
+            self.assertEqual(len(segment["rows"]), seg["count"])
+            self.assertEqual(segment["rows"][0][0], seg["start"])
+            total += seg["count"]
+        self.assertEqual(total, 730)
+        self.assertEqual(toc["segments"][0]["start"], "2025-01-15")
 
-# Create your tests here.
+        missing = reverse("public_issue_interest_segment", args=[self.issue.id, len(toc["segments"])])
+        self.assertEqual(self.client.get(missing).status_code, 404)
@@ -1,5 +1,6 @@
-# FILE: web/app_users/urls.py  (обновлено — 2026-02-16)
-# PURPOSE: Public endpoint для Stückzinstabelle по эмиссии (для переиспользуемого попапа в админке/панелях).
+# FILE: web/app_users/urls.py  (обновлено — 2026-10-17)
+# PURPOSE: Public endpoint для Stückzinstabelle по эмиссии (для переиспользуемого попапа в админке/панелях);
+#          JSON по годам: оглавление сегментов + один сегмент на запрос.
 
 from django.urls import path
 
@@ -10,6 +11,8 @@ from .views import (
     register_agent,
     forgot_password,
     set_password,
+    public_issue_interest_segment,
+    public_issue_interest_segments,
     public_issue_interest_table,
 )
 
@@ -21,4 +24,10 @@ urlpatterns = [
     path("password/forgot/", forgot_password, name="password_forgot"),
     path("password/set/<uidb64>/<token>/", set_password, name="password_set"),
     path("issue/<int:issue_id>/interest-table/", public_issue_interest_table, name="public_issue_interest_table"),
+    path("issue/<int:issue_id>/interest-table/segments/", public_issue_interest_segments, name="public_issue_interest_segments"),
+    path(
+        "issue/<int:issue_id>/interest-table/segments/<int:index>/",
+        public_issue_interest_segment,
+        name="public_issue_interest_segment",
+    ),
 ]
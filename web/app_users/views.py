@@ -1,23 +1,33 @@
-# FILE: web/app_users/views.py  (обновлено — 2026-02-16)
-# PURPOSE: Полный файл views: авторизация, регистрация, единый password flow + публичный endpoint Stückzinstabelle.
+# FILE: web/app_users/views.py  (обновлено — 2026-10-17)
+# PURPOSE: Полный файл views: авторизация, регистрация, единый password flow + публичный endpoint Stückzinstabelle
+#          (строки из сохранённой таблицы эмиссии, без пересчёта на каждый запрос).
+#          Stückzinstabelle: готовый HTML-фрагмент в памяти процесса по (updated_at, сегодня), ETag/Last-Modified -> 304,
+#          один рендер на эмиссию одновременно (lock), остальные запросы ждут и берут результат из кэша.
+#          JSON по сегментам (годам, как _split_rows_by_year): оглавление + один сегмент на запрос — для interest_modal.js.
 
 from __future__ import annotations
 
+import hashlib
 import logging
-from datetime import timedelta
+import threading
+from datetime import datetime, time, timedelta
 from dateutil.relativedelta import relativedelta
 
 from django.contrib.auth import get_user_model, login as auth_login
 from django.contrib.auth.tokens import default_token_generator
-from django.http import HttpRequest, HttpResponse
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.encoding import force_bytes, force_str
+from django.utils.formats import date_format, localize
+from django.utils.cache import patch_cache_control
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.views.decorators.http import condition
 
 from flexx.models import BondIssue, Contract
-from flexx.contract_helpers import build_stueckzinsen_rows_for_issue
+from flexx.stueckzins_table import STUECKZINS_TABLE_VERSION, get_issue_stueckzins_rows
 from flexx.emailer import (
     send_client_password_set_notify_email,
     send_password_reset_email,
@@ -235,20 +245,55 @@ def _split_rows_by_year(rows: list) -> list:
     return groups
 
 
-def public_issue_interest_table(request: HttpRequest, issue_id: int) -> HttpResponse:
-    issue = get_object_or_404(BondIssue, id=issue_id)
-
-    rows = build_stueckzinsen_rows_for_issue(
-        issue_date=issue.issue_date,
-        term_months=issue.term_months,
-        interest_rate_percent=issue.interest_rate,
-        nominal_value=issue.bond_price,
-        decimals=6,
-        holiday_country="DE",
-        holiday_subdiv=None,
-    )
+# Менять при изменении шаблона issue_interest_table.html — ETag и кэш фрагмента станут другими.
+INTEREST_TABLE_RENDER_VERSION = 1
+
+# issue_id -> (etag, html); одна запись на эмиссию, устаревшая заменяется при следующем рендере.
+_INTEREST_TABLE_HTML: dict[int, tuple[str, str]] = {}
+# issue_id -> (data_key, {"issue": ..., "segments": [...]}); от сегодняшней даты не зависит.
+_INTEREST_TABLE_SEGMENTS: dict[int, tuple[str, dict]] = {}
+_INTEREST_TABLE_LOCKS: dict[int, threading.Lock] = {}
+_INTEREST_TABLE_LOCKS_GUARD = threading.Lock()
+
+
+def _interest_table_state(request: HttpRequest, issue_id: int) -> tuple[str, datetime, str]:
+    """
+    (etag, last_modified, data_key) — один запрос updated_at на HTTP-запрос (condition вызывает обе функции).
+    Подсветка прошедших дат зависит от сегодняшней даты -> она входит в ETag, Last-Modified не раньше полуночи;
+    data_key — то же без даты (строки таблицы).
+    """
+    state = getattr(request, "_interest_table_state", None)
+    if state is None:
+        updated_at = BondIssue.objects.filter(id=issue_id).values_list("updated_at", flat=True).first()
+        if updated_at is None:
+            raise Http404("BondIssue not found")
+        today = timezone.localdate()
+        data_key = f"r{INTEREST_TABLE_RENDER_VERSION}|t{STUECKZINS_TABLE_VERSION}|{issue_id}|{updated_at.isoformat()}"
+        midnight = timezone.make_aware(datetime.combine(today, time.min))
+        etag = hashlib.sha1(f"{data_key}|{today.isoformat()}".encode("utf-8")).hexdigest()
+        state = (etag, max(updated_at, midnight), data_key)
+        request._interest_table_state = state
+    return state
+
+
+def _interest_table_etag(request: HttpRequest, issue_id: int, **kwargs) -> str:
+    return _interest_table_state(request, issue_id)[0]
+
+
+def _interest_table_last_modified(request: HttpRequest, issue_id: int, **kwargs) -> datetime:
+    return _interest_table_state(request, issue_id)[1]
+
+
+def _interest_table_lock(issue_id: int) -> threading.Lock:
+    with _INTEREST_TABLE_LOCKS_GUARD:
+        lock = _INTEREST_TABLE_LOCKS.get(issue_id)
+        if lock is None:
+            lock = _INTEREST_TABLE_LOCKS[issue_id] = threading.Lock()
+        return lock
 
-    rows = sorted(rows, key=lambda r: r.pay_date)
+
+def _render_interest_table(issue: BondIssue) -> str:
+    rows = sorted(get_issue_stueckzins_rows(issue), key=lambda r: r.pay_date)
     raw_groups = _split_rows_by_year(rows)
 
     today = timezone.localdate()
@@ -265,8 +310,7 @@ def public_issue_interest_table(request: HttpRequest, issue_id: int) -> HttpResp
             "cols": cols
         })
 
-    return render(
-        request,
+    return render_to_string(
         "app_users/issue_interest_table.html",
         {
             "issue": issue,
@@ -274,3 +318,115 @@ def public_issue_interest_table(request: HttpRequest, issue_id: int) -> HttpResp
             "today": today,
         },
     )
+
+
+def _cached_interest_table_html(issue_id: int, etag: str) -> str:
+    cached = _INTEREST_TABLE_HTML.get(issue_id)
+    if cached is not None and cached[0] == etag:
+        return cached[1]
+
+    with _interest_table_lock(issue_id):
+        # пока ждали lock, фрагмент мог отрендерить другой поток
+        cached = _INTEREST_TABLE_HTML.get(issue_id)
+        if cached is not None and cached[0] == etag:
+            return cached[1]
+        html = _render_interest_table(get_object_or_404(BondIssue, id=issue_id))
+        _INTEREST_TABLE_HTML[issue_id] = (etag, html)
+        return html
+
+
+@condition(etag_func=_interest_table_etag, last_modified_func=_interest_table_last_modified)
+def public_issue_interest_table(request: HttpRequest, issue_id: int) -> HttpResponse:
+    etag, _, _ = _interest_table_state(request, issue_id)
+    response = HttpResponse(_cached_interest_table_html(issue_id, etag))
+    # браузер хранит ответ, но каждый раз ревалидирует (If-None-Match -> 304)
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def _build_interest_segments(issue: BondIssue) -> dict:
+    """
+    Сегменты как в HTML-таблице (_split_rows_by_year); строка — [pay_date ISO, pay_date "d. M y",
+    stueckzins_de, "h" Feiertag / "w" Wochenende / "", holiday_name].
+    """
+    rows = sorted(get_issue_stueckzins_rows(issue), key=lambda r: r.pay_date)
+    segments = []
+    for g in _split_rows_by_year(rows):
+        seg_rows = g["rows"]
+        segments.append({
+            "label": g["label"],
+            "start": seg_rows[0].pay_date.isoformat() if seg_rows else None,
+            "end": seg_rows[-1].pay_date.isoformat() if seg_rows else None,
+            "rows": [
+                [
+                    r.pay_date.isoformat(),
+                    date_format(r.pay_date, "d. M y"),
+                    r.stueckzins_de,
+                    "h" if r.is_holiday else ("w" if r.is_weekend else ""),
+                    r.holiday_name,
+                ]
+                for r in seg_rows
+            ],
+        })
+    return {
+        "issue": {
+            "id": issue.id,
+            "title": issue.title,
+            "issue_date": date_format(issue.issue_date, "d.m.Y"),
+            "bond_price": localize(issue.bond_price),
+        },
+        "segments": segments,
+    }
+
+
+def _cached_interest_segments(issue_id: int, data_key: str) -> dict:
+    cached = _INTEREST_TABLE_SEGMENTS.get(issue_id)
+    if cached is not None and cached[0] == data_key:
+        return cached[1]
+
+    with _interest_table_lock(issue_id):
+        cached = _INTEREST_TABLE_SEGMENTS.get(issue_id)
+        if cached is not None and cached[0] == data_key:
+            return cached[1]
+        data = _build_interest_segments(get_object_or_404(BondIssue, id=issue_id))
+        _INTEREST_TABLE_SEGMENTS[issue_id] = (data_key, data)
+        return data
+
+
+def _interest_json_response(payload: dict) -> JsonResponse:
+    response = JsonResponse(payload, json_dumps_params={"ensure_ascii": False, "separators": (",", ":")})
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+@condition(etag_func=_interest_table_etag, last_modified_func=_interest_table_last_modified)
+def public_issue_interest_segments(request: HttpRequest, issue_id: int) -> HttpResponse:
+    """Оглавление: данные эмиссии + сегменты (label, start, end, count) без строк; current — сегмент с сегодняшней датой."""
+    _, _, data_key = _interest_table_state(request, issue_id)
+    data = _cached_interest_segments(issue_id, data_key)
+    today = timezone.localdate().isoformat()
+
+    current = 0
+    segments = []
+    for i, seg in enumerate(data["segments"]):
+        if seg["start"] and seg["start"] <= today:
+            current = i
+        segments.append({"index": i, "label": seg["label"], "start": seg["start"], "end": seg["end"], "count": len(seg["rows"])})
+
+    return _interest_json_response({"issue": data["issue"], "today": today, "current": current, "segments": segments})
+
+
+@condition(etag_func=_interest_table_etag, last_modified_func=_interest_table_last_modified)
+def public_issue_interest_segment(request: HttpRequest, issue_id: int, index: int) -> HttpResponse:
+    """Строки одного сегмента (года)."""
+    _, _, data_key = _interest_table_state(request, issue_id)
+    segments = _cached_interest_segments(issue_id, data_key)["segments"]
+    if index >= len(segments):
+        raise Http404("segment not found")
+    seg = segments[index]
+    return _interest_json_response({
+        "index": index,
+        "label": seg["label"],
+        "today": timezone.localdate().isoformat(),
+        "rows": seg["rows"],
+    })
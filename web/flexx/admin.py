@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-from django.contrib import admin
+from django.contrib import admin, messages
 from django import forms
 
+from .contract_recalc import recalc_issue_contracts
+from .pdf_jobs import requeue_pdf_jobs
+
 from .models import (
     BondIssue,
     BondIssueAttachment,
@@ -10,6 +13,7 @@ from .models import (
     Contract,
     EmailTemplate,
     FlexxlagerSignature,
+    PdfRenderJob,
     TippgeberContract,
     TippgeberContractText,
 )
@@ -29,11 +33,35 @@ class BondIssueAdmin(admin.ModelAdmin):
         "term_months",
         "minimal_bonds_quantity",
         "documents_sent_other",
+        "holiday_subdiv",
+        "day_count_convention",
         "active",
     )
-    list_filter = ("active", "issue_date")
+    list_filter = ("active", "issue_date", "holiday_subdiv", "day_count_convention")
     search_fields = ("title", "isin_wkn")
     ordering = ("-issue_date", "-id")
+    actions = ("recalc_contracts_dry_run", "recalc_contracts_apply")
+
+    # В сообщение — только первые строки diff; полный отчёт: manage.py recalc_issue_contracts.
+    RECALC_MESSAGE_MAX_LINES = 20
+
+    def _recalc_contracts(self, request, queryset, *, dry_run: bool) -> None:
+        for issue in queryset.order_by("id"):
+            report = recalc_issue_contracts(issue, dry_run=dry_run)
+            lines = report.lines()
+            if len(lines) > self.RECALC_MESSAGE_MAX_LINES + 1:
+                rest = len(lines) - 1 - self.RECALC_MESSAGE_MAX_LINES
+                lines = lines[: self.RECALC_MESSAGE_MAX_LINES + 1] + [f"… +{rest}"]
+            level = messages.WARNING if report.rerender_ids else messages.INFO
+            self.message_user(request, " | ".join(lines), level=level)
+
+    @admin.action(description="Verträge neu berechnen (Vorschau)")
+    def recalc_contracts_dry_run(self, request, queryset):
+        self._recalc_contracts(request, queryset, dry_run=True)
+
+    @admin.action(description="Verträge neu berechnen (speichern)")
+    def recalc_contracts_apply(self, request, queryset):
+        self._recalc_contracts(request, queryset, dry_run=False)
 
 
 @admin.register(BondIssueAttachment)
@@ -84,6 +112,20 @@ class ContractAdmin(admin.ModelAdmin):
     ordering = ("-id",)
 
 
+@admin.register(PdfRenderJob)
+class PdfRenderJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "contract", "kind", "status", "notify", "attempts", "created_at", "finished_at", "last_error")
+    list_filter = ("status", "kind")
+    search_fields = ("contract__id", "contract__client__email", "last_error")
+    raw_id_fields = ("contract",)
+    ordering = ("-id",)
+    actions = ("requeue",)
+
+    @admin.action(description="Erneut einreihen (fehlgeschlagene)")
+    def requeue(self, request, queryset):
+        self.message_user(request, f"{requeue_pdf_jobs(queryset)} Aufträge erneut eingereiht.")
+
+
 @admin.register(TippgeberContract)
 class TippgeberContractAdmin(admin.ModelAdmin):
     list_display = (
@@ -1,50 +1,34 @@
-# FILE: web/flexx/contract_helpers.py  (обновлено — 2026-02-16)
-# PURPOSE: Stückzinsen 30/360 + учёт номинала облигации; банковские дни (выходные+праздники DE) и расчёт суммы договора.
+# FILE: web/flexx/contract_helpers.py  (обновлено — 2026-10-17)
+# PURPOSE: Stückzinsen (Zinsmethode из flexx.day_count, по умолчанию 30/360 US) + учёт номинала облигации; банковские дни (выходные+праздники DE) и расчёт суммы договора.
+#          calc_contract_amounts — прямой расчёт Stückzins на одну дату (без таблицы), результат идентичен табличному.
+#          BankingCalendar — предрасчитанный календарь банковских дней на процесс (country, subdiv): O(1) add_banking_days.
+#          Округление сумм — flexx.money (целые центы / микро-евро, ROUND_HALF_UP).
 
 from __future__ import annotations
 
+from array import array
+from collections.abc import Sequence
 from dataclasses import dataclass
 from datetime import date, timedelta
-from decimal import Decimal, ROUND_HALF_UP
-import calendar
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+import threading
 
 import holidays
+import numpy as np
 
-
-def _add_months(d: date, months: int) -> date:
-    y = d.year + (d.month - 1 + months) // 12
-    m = (d.month - 1 + months) % 12 + 1
-    last_day = calendar.monthrange(y, m)[1]
-    day = min(d.day, last_day)
-    return date(y, m, day)
-
-
-def _is_last_day_of_feb(d: date) -> bool:
-    return d.month == 2 and d.day == calendar.monthrange(d.year, 2)[1]
-
-
-def _day_count_30_360_us(d1: date, d2: date) -> int:
-    y1, m1, dd1 = d1.year, d1.month, d1.day
-    y2, m2, dd2 = d2.year, d2.month, d2.day
-
-    if dd1 == 31:
-        dd1 = 30
-    if _is_last_day_of_feb(d1):
-        dd1 = 30
-
-    if dd2 == 31 and dd1 in (30, 31):
-        dd2 = 30
-    if _is_last_day_of_feb(d2) and (dd1 == 30 or _is_last_day_of_feb(d1)):
-        dd2 = 30
-
-    return 360 * (y2 - y1) + 30 * (m2 - m1) + (dd2 - dd1)
+from flexx.day_count import (
+    DEFAULT_DAY_COUNT,
+    _add_months,
+    get_day_count,
+)
+from flexx.money import div_half_up, from_cents, to_cents
 
 
 def _fmt_decimal_de(x: Decimal, places: int = 6) -> str:
     q = Decimal("1").scaleb(-places)
     v = x.quantize(q, rounding=ROUND_HALF_UP)
-    s = f"{v:.{places}f}"
-    return s.replace(".", ",")
+    return f"{v:.{places}f}".replace(".", ",")
 
 
 @dataclass(frozen=True)
@@ -66,29 +50,38 @@ def build_stueckzinsen_rows_for_issue(
     decimals: int = 6,
     holiday_country: str = "DE",
     holiday_subdiv: str | None = None,
+    day_count: str = DEFAULT_DAY_COUNT,
 ) -> list[StueckzinsRow]:
     """
-    Stückzinsen по 30/360 US.
+    Stückzinsen по Zinsmethode day_count (flexx.day_count, по умолчанию 30/360 US).
     Расчёт:
-        day_count * (rate/100) / 360 * nominal_value
-    Период: issue_date <= d < end_date
+        num * (rate/100) / den * nominal_value,  (num, den) — доля года от issue_date
+    Период: issue_date <= d < end_date; доли года считаются одним пакетом на весь период.
     """
     end_date = _add_months(issue_date, int(term_months))
     if end_date <= issue_date:
         return []
 
-    de_holidays = holidays.country_holidays(holiday_country, subdiv=holiday_subdiv)
+    cal = get_banking_calendar(holiday_country, holiday_subdiv)
     rate = interest_rate_percent / Decimal("100")
-    denom = Decimal("360")
+
+    days = np.datetime64(issue_date, "D") + np.arange((end_date - issue_date).days)
+    nums, dens = get_day_count(day_count).fractions(issue_date, days)
+    denoms: dict[int, Decimal] = {}
 
     rows: list[StueckzinsRow] = []
     d = issue_date
-    while d < end_date:
-        dc = _day_count_30_360_us(issue_date, d)
-        st = (Decimal(dc) * rate / denom) * nominal_value
+    for num, den in zip(nums.tolist(), dens.tolist()):
+        denom = denoms.get(den)
+        if denom is None:
+            denom = denoms[den] = Decimal(den)
+        st = (Decimal(num) * rate / denom) * nominal_value
 
         is_weekend = d.weekday() >= 5
-        h_name = de_holidays.get(d)
+        if cal.covers(d):
+            h_name = cal.holiday_name(d)
+        else:
+            h_name = holiday_name(d, holiday_country=holiday_country, holiday_subdiv=holiday_subdiv)
         is_holiday = h_name is not None
 
         rows.append(
@@ -98,7 +91,7 @@ def build_stueckzinsen_rows_for_issue(
                 stueckzins_de=_fmt_decimal_de(st, places=decimals),
                 is_weekend=is_weekend,
                 is_holiday=is_holiday,
-                holiday_name=str(h_name) if h_name else None,
+                holiday_name=h_name,
             )
         )
         d += timedelta(days=1)
@@ -106,16 +99,118 @@ def build_stueckzinsen_rows_for_issue(
     return rows
 
 
+# Диапазон лет предрасчитанного календаря банковских дней (вне диапазона — пошаговый обход).
+BANKING_CALENDAR_YEAR_FROM = 2000
+BANKING_CALENDAR_YEAR_TO = 2080
+
+
+@lru_cache(maxsize=None)
+def _country_holidays(holiday_country: str, holiday_subdiv: str | None) -> holidays.HolidayBase:
+    return holidays.country_holidays(holiday_country, subdiv=holiday_subdiv)
+
+
+class BankingCalendar:
+    """
+    Банковские дни (пн–пт без праздников) за [year_from-01-01, year_to-12-31].
+    _flags[i]     — 1, если день first+i банковский;
+    _prefix[i]    — число банковских дней среди первых i дней;
+    _banking[k]   — смещение (k+1)-го банковского дня.
+    add_banking_days / banking_days_between — O(1) индексы, без обхода по дням.
+    """
+
+    def __init__(self, holiday_country: str, holiday_subdiv: str | None, year_from: int, year_to: int):
+        self.holiday_country = holiday_country
+        self.holiday_subdiv = holiday_subdiv
+        self.first = date(year_from, 1, 1)
+        self.last = date(year_to, 12, 31)
+        self._base = self.first.toordinal()
+
+        hol = holidays.country_holidays(
+            holiday_country,
+            subdiv=holiday_subdiv,
+            years=range(year_from, year_to + 1),
+        )
+        self._holiday_names: dict[int, str] = {d.toordinal(): str(name) for d, name in hol.items()}
+
+        n = self.last.toordinal() - self._base + 1
+        first_weekday = self.first.weekday()
+        flags = bytearray(n)
+        prefix = array("I", bytes(4 * (n + 1)))
+        banking = array("I")
+        count = 0
+        for i in range(n):
+            if (first_weekday + i) % 7 < 5 and (self._base + i) not in self._holiday_names:
+                flags[i] = 1
+                banking.append(i)
+                count += 1
+            prefix[i + 1] = count
+        self._flags = flags
+        self._prefix = prefix
+        self._banking = banking
+
+    def covers(self, d: date) -> bool:
+        return self.first <= d <= self.last
+
+    def holiday_name(self, d: date) -> str | None:
+        return self._holiday_names.get(d.toordinal())
+
+    def is_banking_day(self, d: date) -> bool:
+        return bool(self._flags[d.toordinal() - self._base])
+
+    def add_banking_days(self, start: date, days: int) -> date | None:
+        """N-й банковский день после start; None — если выходит за диапазон календаря."""
+        k = self._prefix[start.toordinal() - self._base + 1] + days
+        if k > len(self._banking):
+            return None
+        return date.fromordinal(self._base + self._banking[k - 1])
+
+    def banking_days_between(self, start: date, end: date) -> int:
+        """Число банковских дней в (start, end]."""
+        return self._prefix[end.toordinal() - self._base + 1] - self._prefix[start.toordinal() - self._base + 1]
+
+
+_BANKING_CALENDARS: dict[tuple[str, str | None], BankingCalendar] = {}
+_BANKING_CALENDARS_LOCK = threading.Lock()
+
+
+def get_banking_calendar(holiday_country: str = "DE", holiday_subdiv: str | None = None) -> BankingCalendar:
+    """Календарь на процесс, по одному на (country, subdiv)."""
+    key = (holiday_country, holiday_subdiv or None)
+    cal = _BANKING_CALENDARS.get(key)
+    if cal is None:
+        with _BANKING_CALENDARS_LOCK:
+            cal = _BANKING_CALENDARS.get(key)
+            if cal is None:
+                cal = BankingCalendar(key[0], key[1], BANKING_CALENDAR_YEAR_FROM, BANKING_CALENDAR_YEAR_TO)
+                _BANKING_CALENDARS[key] = cal
+    return cal
+
+
+def holiday_name(
+    d: date,
+    *,
+    holiday_country: str = "DE",
+    holiday_subdiv: str | None = None,
+) -> str | None:
+    cal = get_banking_calendar(holiday_country, holiday_subdiv)
+    if cal.covers(d):
+        return cal.holiday_name(d)
+    h_name = _country_holidays(holiday_country, holiday_subdiv or None).get(d)
+    return str(h_name) if h_name else None
+
+
 def is_banking_day(
     d: date,
     *,
     holiday_country: str = "DE",
     holiday_subdiv: str | None = None,
 ) -> bool:
+    cal = get_banking_calendar(holiday_country, holiday_subdiv)
+    if cal.covers(d):
+        return cal.is_banking_day(d)
     if d.weekday() >= 5:
         return False
-    de_holidays = holidays.country_holidays(holiday_country, subdiv=holiday_subdiv)
-    return de_holidays.get(d) is None
+    return _country_holidays(holiday_country, holiday_subdiv or None).get(d) is None
 
 
 def add_banking_days(
@@ -129,19 +224,126 @@ def add_banking_days(
     if days <= 0:
         return start
 
-    de_holidays = holidays.country_holidays(holiday_country, subdiv=holiday_subdiv)
+    cal = get_banking_calendar(holiday_country, holiday_subdiv)
+    if cal.covers(start):
+        d = cal.add_banking_days(start, days)
+        if d is not None:
+            return d
+
     d = start
     added = 0
     while added < days:
         d += timedelta(days=1)
-        if d.weekday() >= 5:
-            continue
-        if de_holidays.get(d) is not None:
-            continue
-        added += 1
+        if is_banking_day(d, holiday_country=holiday_country, holiday_subdiv=holiday_subdiv):
+            added += 1
     return d
 
 
+def banking_days_between(
+    start: date,
+    end: date,
+    *,
+    holiday_country: str = "DE",
+    holiday_subdiv: str | None = None,
+) -> int:
+    """Число банковских дней в (start, end]; при end < start — отрицательное."""
+    if end < start:
+        return -banking_days_between(end, start, holiday_country=holiday_country, holiday_subdiv=holiday_subdiv)
+
+    cal = get_banking_calendar(holiday_country, holiday_subdiv)
+    if cal.covers(start) and cal.covers(end):
+        return cal.banking_days_between(start, end)
+
+    count = 0
+    d = start
+    while d < end:
+        d += timedelta(days=1)
+        if is_banking_day(d, holiday_country=holiday_country, holiday_subdiv=holiday_subdiv):
+            count += 1
+    return count
+
+
+def calc_stueckzins_for_date(
+    *,
+    issue_date: date,
+    term_months: int,
+    interest_rate_percent: Decimal,
+    nominal_value: Decimal,
+    pay_date: date,
+    day_count: str = DEFAULT_DAY_COUNT,
+) -> Decimal:
+    """
+    Stückzins одной облигации на pay_date — та же формула, что и в строке таблицы
+    build_stueckzinsen_rows_for_issue, но без построения всей таблицы.
+    Вне периода issue_date <= d < end_date -> 0 (как отсутствие строки в таблице).
+    """
+    end_date = _add_months(issue_date, int(term_months))
+    if not (issue_date <= pay_date < end_date):
+        return Decimal("0")
+    return _stueckzins_one(issue_date, interest_rate_percent, nominal_value, pay_date, day_count)
+
+
+def calc_stueckzins_capped(
+    *,
+    issue_date: date,
+    term_months: int,
+    interest_rate_percent: Decimal,
+    nominal_value: Decimal,
+    pay_date: date,
+    day_count: str = DEFAULT_DAY_COUNT,
+) -> Decimal:
+    """
+    Как calc_stueckzins_for_date, но после конца срока — Zinsen за весь срок (Verzug: начисление до Stichtag,
+    не дальше Laufzeitende). До конца срока значение то же, что у договора (та же формула, без округления).
+    """
+    end_date = _add_months(issue_date, int(term_months))
+    if pay_date < end_date:
+        return calc_stueckzins_for_date(
+            issue_date=issue_date,
+            term_months=term_months,
+            interest_rate_percent=interest_rate_percent,
+            nominal_value=nominal_value,
+            pay_date=pay_date,
+            day_count=day_count,
+        )
+    return _stueckzins_one(issue_date, interest_rate_percent, nominal_value, end_date, day_count)
+
+
+def _stueckzins_one(issue_date: date, interest_rate_percent: Decimal, nominal_value: Decimal, pay_date: date, day_count: str) -> Decimal:
+    rate = interest_rate_percent / Decimal("100")
+    num, den = get_day_count(day_count).fraction(issue_date, pay_date)
+    return (Decimal(num) * rate / Decimal(den)) * nominal_value
+
+
+def stueckzins_cents(
+    *,
+    year_fraction: tuple[int, int],
+    rate_hundredths: int,
+    price_cents: int,
+    quantity: int,
+) -> int:
+    """
+    num/den * rate/100 * Preis * Anzahl — точно в центах, ROUND_HALF_UP на договор.
+    year_fraction: (num, den) из flexx.day_count; rate_hundredths: Zinssatz в сотых процента (5.25 % -> 525),
+    price_cents: Preis je Anleihe в центах.
+    """
+    num, den = year_fraction
+    return div_half_up(num * rate_hundredths * price_cents * quantity, den * 100 * 100)
+
+
+def _contract_amounts(
+    *,
+    settlement_date: date,
+    nominal_value: Decimal,
+    quantity: int,
+    st_one: Decimal,
+) -> tuple[date, Decimal, Decimal, Decimal]:
+    qty = int(quantity)
+    nominal_cents = to_cents(nominal_value) * qty
+    accrued_cents = to_cents(st_one * qty)
+    return settlement_date, from_cents(nominal_cents), from_cents(accrued_cents), from_cents(nominal_cents + accrued_cents)
+
+
 def calc_contract_amounts_from_stueckzins_table(
     *,
     issue_date: date,
@@ -153,11 +355,14 @@ def calc_contract_amounts_from_stueckzins_table(
     banking_days_plus: int = 10,
     holiday_country: str = "DE",
     holiday_subdiv: str | None = None,
+    day_count: str = DEFAULT_DAY_COUNT,
+    stueckzins_rows: Sequence[StueckzinsRow] | None = None,
 ) -> tuple[date, Decimal, Decimal, Decimal]:
     """
     Возвращает:
       (settlement_date, nominal_amount, accrued_interest, total_amount)
     accrued_interest берётся из Stückzins-Tabelle по settlement_date * quantity.
+    stueckzins_rows — уже построенная таблица эмиссии (иначе строится здесь).
     """
     settlement_date = add_banking_days(
         sign_date,
@@ -166,21 +371,62 @@ def calc_contract_amounts_from_stueckzins_table(
         holiday_subdiv=holiday_subdiv,
     )
 
-    qty = Decimal(int(quantity))
-    nominal_amount = (nominal_value * qty).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    rows = stueckzins_rows
+    if rows is None:
+        rows = build_stueckzinsen_rows_for_issue(
+            issue_date=issue_date,
+            term_months=term_months,
+            interest_rate_percent=interest_rate_percent,
+            nominal_value=nominal_value,
+            decimals=6,
+            holiday_country=holiday_country,
+            holiday_subdiv=holiday_subdiv,
+            day_count=day_count,
+        )
+    st_map = {r.pay_date: r.stueckzins for r in rows}
+    st_one = st_map.get(settlement_date, Decimal("0"))
+    return _contract_amounts(
+        settlement_date=settlement_date,
+        nominal_value=nominal_value,
+        quantity=quantity,
+        st_one=st_one,
+    )
+
 
-    rows = build_stueckzinsen_rows_for_issue(
+def calc_contract_amounts(
+    *,
+    issue_date: date,
+    term_months: int,
+    interest_rate_percent: Decimal,
+    nominal_value: Decimal,
+    sign_date: date,
+    quantity: int,
+    banking_days_plus: int = 10,
+    holiday_country: str = "DE",
+    holiday_subdiv: str | None = None,
+    day_count: str = DEFAULT_DAY_COUNT,
+) -> tuple[date, Decimal, Decimal, Decimal]:
+    """
+    То же, что calc_contract_amounts_from_stueckzins_table, но Stückzins на settlement_date
+    считается напрямую (calc_stueckzins_for_date) — без построения таблицы за весь срок.
+    """
+    settlement_date = add_banking_days(
+        sign_date,
+        banking_days_plus,
+        holiday_country=holiday_country,
+        holiday_subdiv=holiday_subdiv,
+    )
+    st_one = calc_stueckzins_for_date(
         issue_date=issue_date,
         term_months=term_months,
         interest_rate_percent=interest_rate_percent,
         nominal_value=nominal_value,
-        decimals=6,
-        holiday_country=holiday_country,
-        holiday_subdiv=holiday_subdiv,
+        pay_date=settlement_date,
+        day_count=day_count,
+    )
+    return _contract_amounts(
+        settlement_date=settlement_date,
+        nominal_value=nominal_value,
+        quantity=quantity,
+        st_one=st_one,
     )
-    st_map = {r.pay_date: r.stueckzins for r in rows}
-    st_one = st_map.get(settlement_date, Decimal("0"))
-
-    accrued_interest = (st_one * qty).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-    total_amount = (nominal_amount + accrued_interest).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-    return settlement_date, nominal_amount, accrued_interest, total_amount
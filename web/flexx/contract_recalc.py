@@ -0,0 +1,172 @@
+# FILE: web/flexx/contract_recalc.py  (новое — 2026-10-17)
+# PURPOSE: Пересчёт незавершённых договоров эмиссии после изменения Zinssatz/Preis/Laufzeit:
+#          одна Stückzins-Tabelle на эмиссию, .iterator() + bulk_update пачками, dry-run отчёт (diff).
+#          Суммы пишет только Finalisieren (вместе с заданием CREATED), поэтому пересчитываются finalisierte, но ещё
+#          не подписанные договоры: при --apply их contract_pdf перерисовывается новым заданием CREATED (+ письмо клиенту).
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from flexx.contract_helpers import _contract_amounts, add_banking_days
+from flexx.models import BondIssue, Contract, PdfRenderJob
+from flexx.pdf_jobs import enqueue_pdf_job
+from flexx.stueckzins_table import STUECKZINS_TABLE_HOLIDAY_COUNTRY, get_issue_stueckzins_rows
+
+RECALC_BATCH_SIZE = 500
+RECALC_BANKING_DAYS_PLUS = 10  # как в app_panel_client._build_calc_result
+RECALC_FIELDS = ("settlement_date", "nominal_amount", "nominal_amount_plus_percent")
+
+
+@dataclass(frozen=True)
+class ContractRecalcChange:
+    contract_id: int
+    client_id: int
+    contract_date: date
+    bonds_quantity: int
+    old: tuple[date | None, Decimal | None, Decimal | None]
+    new: tuple[date, Decimal, Decimal]
+
+    def line(self) -> str:
+        parts = []
+        for name, old, new in zip(RECALC_FIELDS, self.old, self.new):
+            if old != new:
+                parts.append(f"{name}: {old} -> {new}")
+        return f"Contract#{self.contract_id} client={self.client_id} qty={self.bonds_quantity}: " + "; ".join(parts)
+
+
+@dataclass
+class ContractRecalcReport:
+    issue_id: int
+    dry_run: bool
+    checked: int = 0
+    changes: list[ContractRecalcChange] = field(default_factory=list)
+    rerender_ids: list[int] = field(default_factory=list)  # изменённые договоры с уже созданным PDF
+
+    def summary(self) -> str:
+        mode = "dry-run" if self.dry_run else "applied"
+        return (
+            f"Issue#{self.issue_id} ({mode}): geprüft={self.checked}, "
+            f"geändert={len(self.changes)}, PDF neu={len(self.rerender_ids)}"
+        )
+
+    def lines(self) -> list[str]:
+        lines = [self.summary()] + [c.line() for c in self.changes]
+        if self.rerender_ids:
+            lines.append("Vertrags-PDF wird neu erstellt: " + ", ".join(f"Contract#{i}" for i in self.rerender_ids))
+        return lines
+
+
+def _open_contracts(issue: BondIssue) -> QuerySet[Contract]:
+    """Договоры эмиссии с датой и количеством (= finalisiert), не подписанные клиентом, не полученные подписанными и не оплаченные."""
+    return Contract.objects.filter(
+        issue_id=issue.id,
+        contract_date__isnull=False,
+        bonds_quantity__isnull=False,
+        signed_received_at__isnull=True,
+        paid_at__isnull=True,
+        contract_pdf_signed="",
+        contract_pdf_signed_signed="",
+    )
+
+
+def recalculatable_contracts(issue: BondIssue) -> QuerySet[Contract]:
+    """Finalisierte, но не подписанные и не оплаченные договоры эмиссии (суммы ещё можно исправить)."""
+    return (
+        _open_contracts(issue)
+        .only("id", "client_id", "contract_date", "bonds_quantity", *RECALC_FIELDS)
+        .order_by("id")
+    )
+
+
+def _pending_created_ids(issue: BondIssue) -> set[int]:
+    """Договоры, PDF которых ещё в очереди (PENDING) — воркер и так нарисует его с новыми суммами."""
+    return set(
+        PdfRenderJob.objects.filter(
+            contract__in=_open_contracts(issue),
+            kind=PdfRenderJob.Kind.CREATED,
+            status=PdfRenderJob.Status.PENDING,
+        ).values_list("contract_id", flat=True)
+    )
+
+
+def recalc_issue_contracts(
+    issue: BondIssue,
+    *,
+    dry_run: bool = True,
+    batch_size: int = RECALC_BATCH_SIZE,
+) -> ContractRecalcReport:
+    """
+    Пересчитывает settlement_date / nominal_amount / nominal_amount_plus_percent.
+    Изменённым договорам без ожидающего задания CREATED ставится новое (PDF с новыми суммами, письмо клиенту).
+    Запросы: таблица эмиссии (0–1) + задания в очереди + выборка договоров (по chunk)
+    + bulk_update на пачку изменённых + по заданию на перерисовку.
+    """
+    report = ContractRecalcReport(issue_id=issue.id, dry_run=dry_run)
+    pending_ids = _pending_created_ids(issue)
+
+    st_map = {r.pay_date: r.stueckzins for r in get_issue_stueckzins_rows(issue)}
+    nominal_value = Decimal(str(issue.bond_price)).quantize(Decimal("0.01"))
+    settlement_by_date: dict[date, date] = {}
+
+    def flush(batch: list[Contract]) -> None:
+        if batch and not dry_run:
+            Contract.objects.bulk_update(batch, [*RECALC_FIELDS, "updated_at"])
+            for contract in batch:
+                if contract.id not in pending_ids:
+                    enqueue_pdf_job(contract, PdfRenderJob.Kind.CREATED)
+        batch.clear()
+
+    now = timezone.now()
+    batch: list[Contract] = []
+    with transaction.atomic():
+        for contract in recalculatable_contracts(issue).iterator(chunk_size=batch_size):
+            report.checked += 1
+
+            settlement_date = settlement_by_date.get(contract.contract_date)
+            if settlement_date is None:
+                settlement_date = add_banking_days(
+                    contract.contract_date,
+                    RECALC_BANKING_DAYS_PLUS,
+                    holiday_country=STUECKZINS_TABLE_HOLIDAY_COUNTRY,
+                    holiday_subdiv=issue.holiday_subdiv or None,
+                )
+                settlement_by_date[contract.contract_date] = settlement_date
+
+            _, nominal_amount, _, total_amount = _contract_amounts(
+                settlement_date=settlement_date,
+                nominal_value=nominal_value,
+                quantity=contract.bonds_quantity,
+                st_one=st_map.get(settlement_date, Decimal("0")),
+            )
+            old = (contract.settlement_date, contract.nominal_amount, contract.nominal_amount_plus_percent)
+            new = (settlement_date, nominal_amount, total_amount)
+            if old == new:
+                continue
+
+            report.changes.append(
+                ContractRecalcChange(
+                    contract_id=contract.id,
+                    client_id=contract.client_id,
+                    contract_date=contract.contract_date,
+                    bonds_quantity=contract.bonds_quantity,
+                    old=old,
+                    new=new,
+                )
+            )
+            if contract.id not in pending_ids:
+                report.rerender_ids.append(contract.id)
+            contract.settlement_date, contract.nominal_amount, contract.nominal_amount_plus_percent = new
+            contract.updated_at = now
+            batch.append(contract)
+            if len(batch) >= batch_size:
+                flush(batch)
+        flush(batch)
+
+    return report
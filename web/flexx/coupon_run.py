@@ -0,0 +1,273 @@
+# FILE: web/flexx/coupon_run.py  (новое — 2026-10-17)
+# PURPOSE: Zinslauf: выплаты процентов и погашение по оплаченным договорам на дату выплаты.
+#          Генераторы + .iterator() (память не зависит от числа договоров), экспорт CSV построчно.
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import date
+import csv
+
+from flexx.contract_helpers import (
+    _add_months,
+    add_banking_days,
+    is_banking_day,
+    stueckzins_cents,
+)
+from flexx.day_count import get_day_count
+from flexx.models import BondIssue, Contract
+from flexx.money import format_units_de, to_cents
+from flexx.stueckzins_table import STUECKZINS_TABLE_HOLIDAY_COUNTRY
+
+COUPON_RUN_CHUNK_SIZE = 2000
+
+# Zinsperiode в месяцах; None — Zinsen endfällig (одна выплата в конце срока).
+# Stückzins-Tabelle начисляется от issue_date за весь срок без обнуления, т.е. соответствует None.
+COUPON_PERIOD_MONTHS: int | None = None
+
+# UTF-8 BOM: без него Excel открывает CSV как cp1252 (Umlaute в именах/банках ломаются).
+CSV_BOM = "\ufeff"
+
+COUPON_CSV_HEADER = [
+    "payout_date",
+    "period_start",
+    "period_end",
+    "issue_id",
+    "issue",
+    "isin_wkn",
+    "contract_id",
+    "client_id",
+    "client_name",
+    "client_email",
+    "depot_account_holder",
+    "depot_number",
+    "depot_bank",
+    "depot_blz",
+    "bonds_quantity",
+    "day_count",
+    "interest",
+    "redemption",
+    "total",
+]
+
+
+@dataclass(frozen=True)
+class CouponDate:
+    period_start: date
+    period_end: date  # Zinstermin laut Plan (unbereinigt)
+    payout_date: date  # следующий банковский день, если period_end — не банковский
+    day_count: int  # Zinstage за период по Zinsmethode эмиссии
+    year_fraction: tuple[int, int]  # (num, den) — доля года за период
+    is_final: bool
+
+
+@dataclass(frozen=True)
+class CouponPayment:
+    coupon: CouponDate
+    issue_id: int
+    issue_title: str
+    isin_wkn: str
+    contract_id: int
+    client_id: int
+    client_name: str
+    client_email: str
+    depot_account_holder: str
+    depot_number: str
+    depot_bank: str
+    depot_blz: str
+    bonds_quantity: int
+    interest_cents: int
+    redemption_cents: int
+
+    @property
+    def total_cents(self) -> int:
+        return self.interest_cents + self.redemption_cents
+
+    def csv_row(self) -> list[str]:
+        return [
+            self.coupon.payout_date.isoformat(),
+            self.coupon.period_start.isoformat(),
+            self.coupon.period_end.isoformat(),
+            str(self.issue_id),
+            self.issue_title,
+            self.isin_wkn,
+            str(self.contract_id),
+            str(self.client_id),
+            self.client_name,
+            self.client_email,
+            self.depot_account_holder,
+            self.depot_number,
+            self.depot_bank,
+            self.depot_blz,
+            str(self.bonds_quantity),
+            str(self.coupon.day_count),
+            format_units_de(self.interest_cents, 2),
+            format_units_de(self.redemption_cents, 2),
+            format_units_de(self.total_cents, 2),
+        ]
+
+
+def _payout_date(d: date, holiday_subdiv: str | None) -> date:
+    if is_banking_day(d, holiday_country=STUECKZINS_TABLE_HOLIDAY_COUNTRY, holiday_subdiv=holiday_subdiv):
+        return d
+    return add_banking_days(d, 1, holiday_country=STUECKZINS_TABLE_HOLIDAY_COUNTRY, holiday_subdiv=holiday_subdiv)
+
+
+def issue_coupon_dates(issue: BondIssue, *, period_months: int | None = COUPON_PERIOD_MONTHS) -> list[CouponDate]:
+    """Zinstermine эмиссии: каждые period_months от issue_date + конец срока (последний период может быть короче)."""
+    if not (issue.issue_date and issue.term_months):
+        return []
+    end_date = _add_months(issue.issue_date, int(issue.term_months))
+    subdiv = issue.holiday_subdiv or None
+    convention = get_day_count(issue.day_count_convention)
+
+    ends: list[date] = []
+    if period_months:
+        k = 1
+        while True:
+            d = _add_months(issue.issue_date, k * int(period_months))
+            if d >= end_date:
+                break
+            ends.append(d)
+            k += 1
+    ends.append(end_date)
+
+    out: list[CouponDate] = []
+    start = issue.issue_date
+    for end in ends:
+        out.append(
+            CouponDate(
+                period_start=start,
+                period_end=end,
+                payout_date=_payout_date(end, subdiv),
+                day_count=convention.day_count(start, end),
+                year_fraction=convention.fraction_between(issue.issue_date, start, end),
+                is_final=end == end_date,
+            )
+        )
+        start = end
+    return out
+
+
+# Поля договора + клиента для выплаты (values_list: без создания моделей на 100k строк).
+_PAYMENT_VALUES = (
+    "id",
+    "bonds_quantity",
+    "client_id",
+    "client__first_name",
+    "client__last_name",
+    "client__company",
+    "client__email",
+    "client__bank_depo_account_holder",
+    "client__bank_depo_depotnummer",
+    "client__bank_depo_name",
+    "client__bank_depo_blz",
+)
+
+
+def _paid_contract_rows(issue_id: int, payout_date: date):
+    return (
+        Contract.objects.filter(
+            issue_id=issue_id,
+            paid_at__isnull=False,
+            paid_at__lte=payout_date,
+            bonds_quantity__gt=0,
+        )
+        .order_by("id")
+        .values_list(*_PAYMENT_VALUES)
+    )
+
+
+def _contract_payment(issue: BondIssue, coupon: CouponDate, row: tuple) -> CouponPayment:
+    (
+        contract_id,
+        qty,
+        client_id,
+        first_name,
+        last_name,
+        company,
+        email,
+        depo_holder,
+        depo_number,
+        depo_bank,
+        depo_blz,
+    ) = row
+    rate_hundredths = to_cents(issue.interest_rate)  # 5.25 % -> 525
+    price_cents = to_cents(issue.bond_price)
+    return CouponPayment(
+        coupon=coupon,
+        issue_id=issue.id,
+        issue_title=issue.title,
+        isin_wkn=issue.isin_wkn,
+        contract_id=contract_id,
+        client_id=client_id,
+        client_name=" ".join(x for x in (first_name, last_name) if x) or company,
+        client_email=email,
+        depot_account_holder=depo_holder,
+        depot_number=depo_number,
+        depot_bank=depo_bank,
+        depot_blz=depo_blz,
+        bonds_quantity=int(qty),
+        interest_cents=stueckzins_cents(
+            year_fraction=coupon.year_fraction,
+            rate_hundredths=rate_hundredths,
+            price_cents=price_cents,
+            quantity=int(qty),
+        ),
+        redemption_cents=price_cents * int(qty) if coupon.is_final else 0,
+    )
+
+
+def iter_coupon_payments(
+    payout_date: date,
+    *,
+    period_months: int | None = COUPON_PERIOD_MONTHS,
+    chunk_size: int = COUPON_RUN_CHUNK_SIZE,
+) -> Iterator[CouponPayment]:
+    """
+    Все выплаты с датой payout_date по всем эмиссиям (оплаченные договоры, paid_at <= payout_date).
+    Эмиссий мало — план считается на каждую; договоры читаются потоком .iterator(chunk_size).
+    payout_date сравнивается с Zinstermin, сдвинутым на следующий банковский день.
+    """
+    issues = BondIssue.objects.filter(issue_date__lt=payout_date).order_by("id")
+    for issue in list(issues):
+        for coupon in issue_coupon_dates(issue, period_months=period_months):
+            if coupon.payout_date != payout_date:
+                continue
+            for row in _paid_contract_rows(issue.id, payout_date).iterator(chunk_size=chunk_size):
+                yield _contract_payment(issue, coupon, row)
+
+
+def contract_payment_schedule(
+    contract: Contract,
+    *,
+    period_months: int | None = COUPON_PERIOD_MONTHS,
+) -> list[CouponPayment]:
+    """Полный план выплат одного договора (Zinsen je Termin + Rückzahlung am Laufzeitende)."""
+    if not contract.bonds_quantity:
+        return []
+    issue = contract.issue
+    client = contract.client
+    row = (contract.id, contract.bonds_quantity, client.id, *(getattr(client, f.split("__", 1)[1]) for f in _PAYMENT_VALUES[3:]))
+    return [_contract_payment(issue, coupon, row) for coupon in issue_coupon_dates(issue, period_months=period_months)]
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: write() возвращает строку (для StreamingHttpResponse)."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_csv_lines(header: list[str], rows: Iterable[list[str]]) -> Iterator[str]:
+    """CSV (';' — для Excel DE) построчно: BOM, заголовок, строки."""
+    writer = csv.writer(_Echo(), delimiter=";")
+    yield CSV_BOM
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_coupon_csv_lines(payments: Iterable[CouponPayment]) -> Iterator[str]:
+    return iter_csv_lines(COUPON_CSV_HEADER, (payment.csv_row() for payment in payments))
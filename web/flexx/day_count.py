@@ -0,0 +1,188 @@
+# FILE: web/flexx/day_count.py  (новое — 2026-10-17)
+# PURPOSE: Zinsmethoden (Day-Count-Konventionen) — реестр по коду, выбирается на BondIssue.day_count_convention.
+#          Каждая конвенция: скалярная доля года (num, den) и пакетная версия на массив дат (numpy, без цикла по дням).
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+import calendar
+
+import numpy as np
+
+DAY_COUNT_30_360_US = "30_360_us"
+DAY_COUNT_ACT_360 = "act_360"
+DAY_COUNT_ACT_ACT_ICMA = "act_act_icma"
+DEFAULT_DAY_COUNT = DAY_COUNT_30_360_US
+
+
+def _add_months(d: date, months: int) -> date:
+    y = d.year + (d.month - 1 + months) // 12
+    m = (d.month - 1 + months) % 12 + 1
+    last_day = calendar.monthrange(y, m)[1]
+    day = min(d.day, last_day)
+    return date(y, m, day)
+
+
+def _is_last_day_of_feb(d: date) -> bool:
+    return d.month == 2 and d.day == calendar.monthrange(d.year, 2)[1]
+
+
+def _day_count_30_360_us(d1: date, d2: date) -> int:
+    y1, m1, dd1 = d1.year, d1.month, d1.day
+    y2, m2, dd2 = d2.year, d2.month, d2.day
+
+    if dd1 == 31:
+        dd1 = 30
+    if _is_last_day_of_feb(d1):
+        dd1 = 30
+
+    if dd2 == 31 and dd1 in (30, 31):
+        dd2 = 30
+    if _is_last_day_of_feb(d2) and (dd1 == 30 or _is_last_day_of_feb(d1)):
+        dd2 = 30
+
+    return 360 * (y2 - y1) + 30 * (m2 - m1) + (dd2 - dd1)
+
+
+def _date_parts(days: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(year, month, day, is_last_day_of_feb) для массива datetime64[D]."""
+    months = days.astype("datetime64[M]")
+    years = days.astype("datetime64[Y]").astype(np.int64) + 1970
+    month_num = months.astype(np.int64) % 12 + 1
+    day_num = (days - months).astype(np.int64) + 1
+    last_of_feb = (month_num == 2) & ((days + 1).astype("datetime64[M]") != months)
+    return years, month_num, day_num, last_of_feb
+
+
+def day_count_30_360_us_array(d1: date, days: np.ndarray) -> np.ndarray:
+    """_day_count_30_360_us(d1, d2) для каждого d2 из days (datetime64[D]) -> int64."""
+    y1, m1, dd1 = d1.year, d1.month, d1.day
+    d1_last_of_feb = m1 == 2 and (d1 + timedelta(days=1)).month == 3
+    if dd1 == 31 or d1_last_of_feb:
+        dd1 = 30
+
+    y2, m2, dd2, d2_last_of_feb = _date_parts(days)
+    dd2 = dd2.copy()
+    if dd1 in (30, 31):
+        dd2[dd2 == 31] = 30
+    if dd1 == 30 or d1_last_of_feb:
+        dd2[d2_last_of_feb] = 30
+
+    return 360 * (y2 - y1) + 30 * (m2 - m1) + (dd2 - dd1)
+
+
+def _actual_days_array(start: date, days: np.ndarray) -> np.ndarray:
+    return (days - np.datetime64(start, "D")).astype(np.int64)
+
+
+class DayCountConvention:
+    """
+    Доля года от start (Zinslaufbeginn = issue_date) до d как несокращённая дробь (num, den):
+    Stückzins = num * (rate/100) / den * Preis. Для 30/360 — (day_count, 360), как раньше.
+    """
+
+    code = ""
+    label = ""
+
+    def fraction(self, start: date, d: date) -> tuple[int, int]:
+        raise NotImplementedError
+
+    def fractions(self, start: date, days: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """То же для массива дат (datetime64[D]) -> (num int64, den int64)."""
+        raise NotImplementedError
+
+    def day_count(self, start: date, d: date) -> int:
+        """Zinstage для отображения (Zinslauf-CSV)."""
+        return (d - start).days
+
+    def fraction_between(self, start: date, d1: date, d2: date) -> tuple[int, int]:
+        """Доля года за период [d1, d2) при Zinslaufbeginn start (для Zinstermine)."""
+        n1, den1 = self.fraction(start, d1)
+        n2, den2 = self.fraction(start, d2)
+        if den1 == den2:
+            return n2 - n1, den1
+        return n2 * den1 - n1 * den2, den1 * den2
+
+
+class Thirty360US(DayCountConvention):
+    code = DAY_COUNT_30_360_US
+    label = "30/360 (US)"
+
+    def fraction(self, start: date, d: date) -> tuple[int, int]:
+        return _day_count_30_360_us(start, d), 360
+
+    def fractions(self, start: date, days: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        nums = day_count_30_360_us_array(start, days)
+        return nums, np.full(nums.shape, 360, dtype=np.int64)
+
+    def day_count(self, start: date, d: date) -> int:
+        return _day_count_30_360_us(start, d)
+
+
+class Act360(DayCountConvention):
+    code = DAY_COUNT_ACT_360
+    label = "ACT/360"
+
+    def fraction(self, start: date, d: date) -> tuple[int, int]:
+        return (d - start).days, 360
+
+    def fractions(self, start: date, days: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        nums = _actual_days_array(start, days)
+        return nums, np.full(nums.shape, 360, dtype=np.int64)
+
+
+class ActActICMA(DayCountConvention):
+    """
+    ACT/ACT (ICMA) mit jährlichen Referenzperioden ab start (Zinsen endfällig / jährlich):
+    k volle Perioden + Ist-Tage in der laufenden Periode / Ist-Tage dieser Periode.
+    """
+
+    code = DAY_COUNT_ACT_ACT_ICMA
+    label = "ACT/ACT (ICMA)"
+
+    def fraction(self, start: date, d: date) -> tuple[int, int]:
+        k = max(0, d.year - start.year)
+        while k > 0 and _add_months(start, 12 * k) > d:
+            k -= 1
+        p0 = _add_months(start, 12 * k)
+        p1 = _add_months(start, 12 * (k + 1))
+        length = (p1 - p0).days
+        return k * length + (d - p0).days, length
+
+    def fractions(self, start: date, days: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if days.size == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        last_year = int(days.max().astype("datetime64[Y]").astype(np.int64)) + 1970
+        anchors = np.array(
+            [_add_months(start, 12 * k) for k in range(max(0, last_year - start.year) + 2)],
+            dtype="datetime64[D]",
+        )
+        k = np.clip(np.searchsorted(anchors, days, side="right") - 1, 0, anchors.size - 2)
+        lengths = (anchors[k + 1] - anchors[k]).astype(np.int64)
+        nums = k * lengths + (days - anchors[k]).astype(np.int64)
+        return nums, lengths
+
+
+_DAY_COUNTS: dict[str, DayCountConvention] = {}
+
+
+def register_day_count(convention: DayCountConvention) -> DayCountConvention:
+    _DAY_COUNTS[convention.code] = convention
+    return convention
+
+
+for _convention in (Thirty360US(), Act360(), ActActICMA()):
+    register_day_count(_convention)
+
+
+def get_day_count(code: str | None) -> DayCountConvention:
+    """Конвенция по коду; пустой код -> 30/360 US (эмиссии до появления поля)."""
+    try:
+        return _DAY_COUNTS[code or DEFAULT_DAY_COUNT]
+    except KeyError:
+        raise ValueError(f"unknown day count convention: {code!r}") from None
+
+
+def day_count_choices() -> list[tuple[str, str]]:
+    return [(c.code, c.label) for c in _DAY_COUNTS.values()]
@@ -0,0 +1,156 @@
+# FILE: web/flexx/issue_scenarios.py  (новое — 2026-10-17)
+# PURPOSE: Сценарии новой эмиссии (Zinssatz × Laufzeit × Preis): Stückzins-Kurven и Kosten одной numpy-сеткой.
+#          Zinsmethode — пакетные доли года из flexx.day_count (30/360 US по умолчанию, значения = таблица).
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+
+from flexx.contract_helpers import _add_months
+from flexx.day_count import DEFAULT_DAY_COUNT, get_day_count
+
+# Ограничения сетки для админки (20 × 10 × 3 — типичный запрос).
+SCENARIO_MAX_RATES = 50
+SCENARIO_MAX_TERMS = 40
+SCENARIO_MAX_PRICES = 10
+SCENARIO_MAX_TERM_MONTHS = 240
+
+
+@dataclass(frozen=True)
+class IssueScenarioGrid:
+    """
+    Оси: rates (R) × terms (T) × prices (P); days — дневная сетка от issue_date до конца самого длинного срока.
+    stueckzins[r, p, d]  — Stückzins одной облигации на days[d] (без маски срока);
+    days_in_term[t]      — сколько дней сетки входит в срок t (issue_date <= d < end_date);
+    остальные поля — формы (R, T, P).
+    """
+
+    issue_date: date
+    issue_volume: Decimal
+    day_count: str
+    rates: np.ndarray
+    terms: np.ndarray
+    prices: np.ndarray
+    end_dates: list[date]
+    days: np.ndarray
+    year_fractions: np.ndarray
+    days_in_term: np.ndarray
+    stueckzins: np.ndarray
+    bonds_count: np.ndarray
+    nominal_total: np.ndarray
+    interest_total: np.ndarray
+    interest_per_year: np.ndarray
+    total_cost: np.ndarray
+    stueckzins_last: np.ndarray
+
+    def curve(self, r: int, t: int, p: int) -> np.ndarray:
+        """Stückzins-Kurve сценария (одна облигация, по дням срока)."""
+        return self.stueckzins[r, p, : self.days_in_term[t]]
+
+    def monthly_curve(self, r: int, t: int, p: int) -> list[tuple[date, float]]:
+        """Kurve по датам-годовщинам месяцев (для JSON/графика)."""
+        out: list[tuple[date, float]] = []
+        for k in range(int(self.terms[t])):
+            d = _add_months(self.issue_date, k)
+            out.append((d, float(self.stueckzins[r, p, (d - self.issue_date).days])))
+        return out
+
+    def rows(self) -> list[dict[str, object]]:
+        """Плоский список сценариев (rate, term, price) с Kennzahlen — для таблицы."""
+        out: list[dict[str, object]] = []
+        for r, rate in enumerate(self.rates):
+            for t, term in enumerate(self.terms):
+                for p, price in enumerate(self.prices):
+                    out.append(
+                        {
+                            "index": (r, t, p),
+                            "rate": float(rate),
+                            "term_months": int(term),
+                            "price": float(price),
+                            "end_date": self.end_dates[t],
+                            "bonds_count": int(self.bonds_count[r, t, p]),
+                            "nominal_total": float(self.nominal_total[r, t, p]),
+                            "interest_total": float(self.interest_total[r, t, p]),
+                            "interest_per_year": float(self.interest_per_year[r, t, p]),
+                            "total_cost": float(self.total_cost[r, t, p]),
+                            "stueckzins_last": float(self.stueckzins_last[r, t, p]),
+                        }
+                    )
+        return out
+
+
+def build_issue_scenarios(
+    *,
+    issue_date: date,
+    rates_percent: Sequence[Decimal],
+    terms_months: Sequence[int],
+    bond_prices: Sequence[Decimal],
+    issue_volume: Decimal,
+    day_count: str = DEFAULT_DAY_COUNT,
+) -> IssueScenarioGrid:
+    """
+    Вся сетка за один проход numpy:
+      доля года (issue_date, d) по Zinsmethode считается один раз для всех дней,
+      Stückzins = outer(rate/100 * price, num/den)  (та же формула, что в таблице),
+      Kosten по срокам — broadcasting (R, 1, 1) × (1, T, 1) × (1, 1, P).
+    Float-арифметика: инструмент для сравнения сценариев, не для сумм договора.
+    """
+    rates = np.asarray([float(x) for x in rates_percent], dtype=np.float64)
+    terms = np.asarray([int(x) for x in terms_months], dtype=np.int64)
+    prices = np.asarray([float(x) for x in bond_prices], dtype=np.float64)
+    if not (rates.size and terms.size and prices.size):
+        raise ValueError("empty scenario axis")
+    if (terms <= 0).any() or (prices <= 0).any():
+        raise ValueError("term and price must be positive")
+
+    end_dates = [_add_months(issue_date, int(t)) for t in terms]
+    days_in_term = np.asarray([(e - issue_date).days for e in end_dates], dtype=np.int64)
+
+    start = np.datetime64(issue_date, "D")
+    days = start + np.arange(int(days_in_term.max()) + 1)  # + день конца срока (для полного купона)
+    nums, dens = get_day_count(day_count).fractions(issue_date, days)
+    year_fractions = nums / dens
+
+    # (R, P) коэффициенты × (D,) доля года -> (R, P, D)
+    per_year = (rates[:, None] / 100.0) * prices[None, :]
+    stueckzins = per_year[:, :, None] * year_fractions[None, None, :]
+
+    volume = float(issue_volume)
+    bonds_count = np.floor(volume / prices)  # (P,)
+    nominal_total = bonds_count * prices  # (P,)
+    yf_end = year_fractions[days_in_term]  # (T,) доля года за весь срок
+
+    rate_fraction = rates[:, None, None] / 100.0
+    interest_total = rate_fraction * yf_end[None, :, None] * nominal_total[None, None, :]
+    interest_per_year = interest_total / (terms[None, :, None] / 12.0)
+    nominal_rtp = np.broadcast_to(nominal_total[None, None, :], interest_total.shape)
+    bonds_rtp = np.broadcast_to(bonds_count[None, None, :], interest_total.shape)
+    total_cost = nominal_rtp + interest_total
+
+    # Stückzins на последний день срока (end_date - 1): (R, P) по T -> (R, T, P)
+    stueckzins_last = np.transpose(stueckzins[:, :, days_in_term - 1], (0, 2, 1))
+
+    return IssueScenarioGrid(
+        issue_date=issue_date,
+        issue_volume=issue_volume,
+        day_count=day_count,
+        rates=rates,
+        terms=terms,
+        prices=prices,
+        end_dates=end_dates,
+        days=days,
+        year_fractions=year_fractions,
+        days_in_term=days_in_term,
+        stueckzins=stueckzins,
+        bonds_count=bonds_rtp,
+        nominal_total=nominal_rtp,
+        interest_total=interest_total,
+        interest_per_year=interest_per_year,
+        total_cost=total_cost,
+        stueckzins_last=stueckzins_last,
+    )
@@ -0,0 +1,45 @@
+# FILE: web/flexx/management/commands/coupon_run.py  (новое — 2026-10-17)
+# PURPOSE: manage.py coupon_run --date YYYY-MM-DD [--output file.csv] — Zinslauf (Zinsen + Rückzahlung) как CSV, потоково.
+
+from __future__ import annotations
+
+from datetime import date
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flexx.coupon_run import COUPON_PERIOD_MONTHS, iter_coupon_csv_lines, iter_coupon_payments
+
+
+class Command(BaseCommand):
+    help = "Export all interest/redemption payments due on a payout date (paid contracts) as CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", required=True, help="payout date, YYYY-MM-DD")
+        parser.add_argument("--output", default="-", help="CSV file path ('-' = stdout)")
+        parser.add_argument(
+            "--period-months",
+            type=int,
+            default=COUPON_PERIOD_MONTHS,
+            help="interest period in months (default: interest paid at maturity)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            payout_date = date.fromisoformat(options["date"])
+        except ValueError:
+            raise CommandError("--date must be YYYY-MM-DD")
+
+        payments = iter_coupon_payments(payout_date, period_months=options["period_months"] or None)
+        count = -2  # без BOM и заголовка
+        if options["output"] == "-":
+            out = sys.stdout
+            for line in iter_coupon_csv_lines(payments):
+                out.write(line)
+                count += 1
+        else:
+            with open(options["output"], "w", encoding="utf-8", newline="") as out:
+                for line in iter_coupon_csv_lines(payments):
+                    out.write(line)
+                    count += 1
+        self.stderr.write(f"{payout_date.isoformat()}: {count} payments")
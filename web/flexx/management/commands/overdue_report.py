@@ -0,0 +1,40 @@
+# FILE: web/flexx/management/commands/overdue_report.py  (новое — 2026-10-17)
+# PURPOSE: manage.py overdue_report [--as-of YYYY-MM-DD] [--output file.csv] — Verzug-Report (weitere Stückzinsen) как CSV.
+
+from __future__ import annotations
+
+from datetime import date
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from flexx.overdue_report import iter_overdue_csv_lines
+
+
+class Command(BaseCommand):
+    help = "Report unpaid contracts past their settlement date with additional accrued interest up to a date (CSV)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--as-of", default="", help="accrual date, YYYY-MM-DD (default: today)")
+        parser.add_argument("--output", default="-", help="CSV file path ('-' = stdout)")
+
+    def handle(self, *args, **options):
+        as_of = timezone.localdate()
+        if options["as_of"]:
+            try:
+                as_of = date.fromisoformat(options["as_of"])
+            except ValueError:
+                raise CommandError("--as-of must be YYYY-MM-DD")
+
+        count = -2  # без BOM и заголовка
+        if options["output"] == "-":
+            for line in iter_overdue_csv_lines(as_of):
+                sys.stdout.write(line)
+                count += 1
+        else:
+            with open(options["output"], "w", encoding="utf-8", newline="") as out:
+                for line in iter_overdue_csv_lines(as_of):
+                    out.write(line)
+                    count += 1
+        self.stderr.write(f"{as_of.isoformat()}: {count} overdue contracts")
@@ -0,0 +1,106 @@
+# FILE: web/flexx/management/commands/pdf_size_report.py  (новое — 2026-10-17)
+# PURPOSE: manage.py pdf_size_report [--contract ID ...] [--tippgeber-contract ID ...] [--limit 20] — размер PDF
+#          (Vertrag / signiert / bezahlt / Servicepartner) в профилях standard и compact, в памяти, без записи файлов.
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from flexx.models import Contract, TippgeberContract
+from flexx.pdf_contract import (
+    ClientSignedContractPdfCreator,
+    FullySignedContractPdfCreator,
+    _read_file_field_bytes,
+    build_contract_pdf,
+)
+from flexx.pdf_output import PDF_PROFILE_COMPACT, PDF_PROFILE_STANDARD, PDF_PROFILES
+from flexx.pdf_tippgeber_contract import build_tippgeber_contract_text_pdf, tippgeber_signature_line_text
+
+
+def _contract_sizes(contract: Contract, profile: str) -> dict[str, int]:
+    sizes: dict[str, int] = {}
+    created = build_contract_pdf(contract.id, profile=profile).pdf_bytes
+    sizes["contract"] = len(created)
+    if not contract.signature:
+        return sizes
+    signer = ClientSignedContractPdfCreator(contract.id)
+    signer.profile = profile
+    signed = signer.stamp(created, buyer=True)
+    if signed is None:
+        return sizes
+    sizes["signed"] = len(signed)
+    try:
+        countersigner = FullySignedContractPdfCreator(contract.id)
+    except ValueError:  # keine FleXXLager-Signatur
+        return sizes
+    countersigner.profile = profile
+    paid = countersigner.stamp(signed, company=True)
+    if paid is not None:
+        sizes["paid"] = len(paid)
+    return sizes
+
+
+def _tippgeber_size(contract: TippgeberContract, profile: str) -> int | None:
+    signature_png = _read_file_field_bytes(contract.signature_file)
+    if not signature_png:
+        return None
+    sign_date = timezone.localdate(contract.signed_at) if contract.signed_at else timezone.localdate()
+    return len(
+        build_tippgeber_contract_text_pdf(
+            issue=contract.issue,
+            tippgeber=contract.tippgeber,
+            tippgeber_signature_png=signature_png,
+            tippgeber_signature_line_text=tippgeber_signature_line_text(contract.tippgeber, sign_date),
+            sign_date=sign_date,
+            profile=profile,
+        ).pdf_bytes
+    )
+
+
+class Command(BaseCommand):
+    help = "Compare generated PDF sizes in the standard and compact output profiles (nothing is written)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--contract", action="append", type=int, dest="contract_ids", help="Contract id (repeatable)")
+        parser.add_argument(
+            "--tippgeber-contract", action="append", type=int, dest="tippgeber_ids", help="TippgeberContract id (repeatable)"
+        )
+        parser.add_argument("--limit", type=int, default=20, help="latest N of each when no ids are given")
+
+    def handle(self, *args, **options):
+        contracts = Contract.objects.exclude(contract_pdf="").order_by("-id")
+        tippgeber_contracts = (
+            TippgeberContract.objects.select_related("issue", "tippgeber").exclude(signature_file="").order_by("-id")
+        )
+        if options["contract_ids"] or options["tippgeber_ids"]:
+            contracts = contracts.filter(id__in=options["contract_ids"] or [])
+            tippgeber_contracts = tippgeber_contracts.filter(id__in=options["tippgeber_ids"] or [])
+        else:
+            contracts = contracts[: options["limit"]]
+            tippgeber_contracts = tippgeber_contracts[: options["limit"]]
+
+        totals: dict[str, dict[str, int]] = {}
+        rows: list[tuple[str, int, dict[str, int]]] = []
+        for contract in contracts:
+            per_profile = {profile: _contract_sizes(contract, profile) for profile in PDF_PROFILES}
+            for kind in per_profile[PDF_PROFILE_STANDARD]:
+                rows.append((kind, contract.id, {p: per_profile[p][kind] for p in PDF_PROFILES}))
+        for contract in tippgeber_contracts:
+            sizes = {profile: _tippgeber_size(contract, profile) for profile in PDF_PROFILES}
+            if sizes[PDF_PROFILE_STANDARD] is not None:
+                rows.append(("tippgeber", contract.id, sizes))
+
+        self.stdout.write(f"{'kind':<10} {'id':>7} {'standard':>10} {'compact':>10} {'saved':>7}")
+        for kind, object_id, sizes in rows:
+            standard, compact = sizes[PDF_PROFILE_STANDARD], sizes[PDF_PROFILE_COMPACT]
+            total = totals.setdefault(kind, {PDF_PROFILE_STANDARD: 0, PDF_PROFILE_COMPACT: 0, "count": 0})
+            total[PDF_PROFILE_STANDARD] += standard
+            total[PDF_PROFILE_COMPACT] += compact
+            total["count"] += 1
+            self.stdout.write(f"{kind:<10} {object_id:>7} {standard:>10} {compact:>10} {1 - compact / standard:>7.0%}")
+        for kind, total in totals.items():
+            standard, compact = total[PDF_PROFILE_STANDARD], total[PDF_PROFILE_COMPACT]
+            self.stdout.write(
+                f"{kind + ' Σ':<10} {total['count']:>7} {standard:>10} {compact:>10} {1 - compact / standard:>7.0%}"
+            )
@@ -0,0 +1,52 @@
+# FILE: web/flexx/management/commands/pdf_worker.py  (новое — 2026-10-17)
+# PURPOSE: manage.py pdf_worker [--once] [--sleep 2] — воркер очереди PdfRenderJob (PDF договора + письма вне запроса).
+
+from __future__ import annotations
+
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from flexx.pdf_contract import warm_company_signature
+from flexx.pdf_jobs import claim_next_pdf_job, requeue_stale_pdf_jobs, run_pdf_job
+
+
+class Command(BaseCommand):
+    help = "Render queued contract PDFs and send the related emails."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="process the current queue and exit")
+        parser.add_argument("--sleep", type=float, default=2.0, help="seconds between polls when the queue is empty")
+
+    def handle(self, *args, **options):
+        stopping = False
+
+        def _stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+
+        warm_company_signature()
+        processed = 0
+        requeued = requeue_stale_pdf_jobs()
+        if requeued:
+            self.stderr.write(f"requeued {requeued} stale jobs")
+
+        while not stopping:
+            close_old_connections()
+            job = claim_next_pdf_job()
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+                requeue_stale_pdf_jobs()
+                continue
+            job = run_pdf_job(job)
+            processed += 1
+            self.stderr.write(f"{job}")
+
+        self.stderr.write(f"{processed} jobs processed")
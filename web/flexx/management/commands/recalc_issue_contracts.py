@@ -0,0 +1,45 @@
+# FILE: web/flexx/management/commands/recalc_issue_contracts.py  (новое — 2026-10-17)
+# PURPOSE: manage.py recalc_issue_contracts <issue_id ...> [--all] [--apply] — пересчёт незавершённых договоров (по умолчанию dry-run).
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flexx.contract_recalc import RECALC_BATCH_SIZE, recalc_issue_contracts
+from flexx.models import BondIssue
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculate settlement date / nominal / total of unsigned contracts of bond issues and re-render their "
+        "contract PDF (dry-run by default)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("issue_ids", nargs="*", type=int)
+        parser.add_argument("--all", action="store_true", help="all issues")
+        parser.add_argument("--apply", action="store_true", help="write changes (default: dry-run diff only)")
+        parser.add_argument("--batch-size", type=int, default=RECALC_BATCH_SIZE)
+        parser.add_argument("--summary", action="store_true", help="print only one summary line per issue")
+
+    def handle(self, *args, **options):
+        issue_ids = options["issue_ids"]
+        if not issue_ids and not options["all"]:
+            raise CommandError("issue_ids or --all required")
+
+        issues = BondIssue.objects.order_by("id")
+        if not options["all"]:
+            issues = issues.filter(id__in=issue_ids)
+            missing = set(issue_ids) - set(issues.values_list("id", flat=True))
+            if missing:
+                raise CommandError(f"BondIssue not found: {sorted(missing)}")
+
+        for issue in issues:
+            report = recalc_issue_contracts(
+                issue,
+                dry_run=not options["apply"],
+                batch_size=max(1, options["batch_size"]),
+            )
+            lines = [report.summary()] if options["summary"] else report.lines()
+            for line in lines:
+                self.stdout.write(line)
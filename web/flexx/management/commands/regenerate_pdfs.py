@@ -0,0 +1,81 @@
+# FILE: web/flexx/management/commands/regenerate_pdfs.py  (новое — 2026-10-17)
+# PURPOSE: manage.py regenerate_pdfs [--kind contract|paid|tippgeber ...] [--issue ID ...] [--status created|signed|paid]
+#          [--from/--to YYYY-MM-DD] [--workers N] [--resume] [--force] [--dry-run] — перегенерация сохранённых PDF
+#          пулом процессов; документы с неизменным отпечатком входа пропускаются (unchanged), --force — рендерить все.
+
+from __future__ import annotations
+
+from datetime import date
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flexx.pdf_regenerate import (
+    REGENERATE_KINDS,
+    REGENERATE_STATUSES,
+    regenerate_documents,
+    select_documents,
+)
+
+
+def _parse_date(value: str, option: str) -> date | None:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"{option} must be YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = "Regenerate stored contract / paid / Tippgeber PDFs in parallel (resumable, atomic file replacement)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kind", action="append", choices=REGENERATE_KINDS, help="document kind (repeatable, default: all)")
+        parser.add_argument("--issue", action="append", type=int, dest="issue_ids", help="BondIssue id (repeatable)")
+        parser.add_argument("--status", choices=REGENERATE_STATUSES, help="contract status (not applied to tippgeber)")
+        parser.add_argument("--from", dest="date_from", default="", help="contract date / Tippgeber signed date from")
+        parser.add_argument("--to", dest="date_to", default="", help="contract date / Tippgeber signed date to")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes (default: CPU cores)")
+        parser.add_argument("--state-file", default="regenerate_pdfs.state", help="progress file for --resume")
+        parser.add_argument("--resume", action="store_true", help="skip documents already done in --state-file")
+        parser.add_argument("--force", action="store_true", help="render even if the input fingerprint is unchanged")
+        parser.add_argument("--dry-run", action="store_true", help="only count the selected documents")
+        parser.add_argument("--progress-every", type=float, default=5.0, help="seconds between progress lines")
+
+    def handle(self, *args, **options):
+        items = select_documents(
+            options["kind"] or REGENERATE_KINDS,
+            issue_ids=options["issue_ids"],
+            status=options["status"],
+            date_from=_parse_date(options["date_from"], "--from"),
+            date_to=_parse_date(options["date_to"], "--to"),
+        )
+        counts = {kind: sum(1 for k, _ in items if k == kind) for kind in REGENERATE_KINDS}
+        self.stderr.write("selected: " + ", ".join(f"{kind}={count}" for kind, count in counts.items()))
+        if options["dry_run"] or not items:
+            return
+
+        last_progress = time.monotonic()
+
+        def on_result(result, summary):
+            nonlocal last_progress
+            if not result.ok:
+                self.stderr.write(f"FAILED {result.key}: {result.error}")
+            now = time.monotonic()
+            if now - last_progress >= options["progress_every"]:
+                last_progress = now
+                self.stderr.write(summary.progress_line())
+
+        summary = regenerate_documents(
+            items,
+            workers=max(1, options["workers"]),
+            state_path=options["state_file"],
+            resume=options["resume"],
+            force=options["force"],
+            on_result=on_result,
+        )
+        self.stderr.write(summary.progress_line())
+        if summary.failed:
+            raise CommandError(f"{len(summary.failed)} documents failed, rerun with --resume to retry them")
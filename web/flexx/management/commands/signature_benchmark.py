@@ -0,0 +1,106 @@
+# FILE: web/flexx/management/commands/signature_benchmark.py  (новое — 2026-10-17)
+# PURPOSE: manage.py signature_benchmark [--sizes 600x200,2000x600] [--repeat 3] — очистка подписи: прежний цикл
+#          по пикселям vs numpy/гистограмма (время на размер + проверка, что результат побайтно совпадает).
+
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+import numpy as np
+from PIL import Image
+
+from flexx.pdf_contract import _convert_white_to_transparent, _count_visible_alpha_pixels
+
+
+def _convert_white_to_transparent_loop(rgba_image: Image.Image) -> Image.Image:
+    """Прежняя реализация (до 2026-10-17) — эталон для сравнения."""
+    converted = rgba_image.copy()
+    px = converted.load()
+    w, h = converted.size
+    for y in range(h):
+        for x in range(w):
+            r, g, b, a = px[x, y]
+            if a == 0:
+                continue
+
+            light = (int(r) + int(g) + int(b)) / 3.0
+            next_alpha = 0
+            if light >= 245:
+                next_alpha = 0
+            elif light >= 210:
+                t = (245 - light) / 35.0
+                next_alpha = int(round(255 * t * 0.55))
+            else:
+                darkness = 1.0 - (light / 255.0)
+                next_alpha = int(round(max(110, min(255, 255 * darkness * 1.7))))
+
+            if next_alpha <= 2:
+                px[x, y] = (r, g, b, 0)
+            else:
+                px[x, y] = (r, g, b, min(int(a), next_alpha))
+    return converted
+
+
+def _count_visible_alpha_pixels_loop(rgba_image: Image.Image, alpha_threshold: int = 8) -> int:
+    alpha = rgba_image.getchannel("A")
+    return sum(1 for a in alpha.getdata() if int(a) > alpha_threshold)
+
+
+def _sample_signature(width: int, height: int) -> Image.Image:
+    """Скан подписи: почти белый шумный фон + тёмные штрихи + антиалиасинг по краям."""
+    rng = np.random.default_rng(width * 7919 + height)
+    pixels = np.empty((height, width, 4), dtype=np.uint8)
+    pixels[..., :3] = rng.integers(200, 256, size=(height, width, 3), dtype=np.uint8)
+    pixels[..., 3] = 255
+    ys = (height / 2 + np.sin(np.linspace(0, 12, width)) * height / 4).astype(int)
+    for dy in range(-3, 4):
+        rows = np.clip(ys + dy, 0, height - 1)
+        pixels[rows, np.arange(width), :3] = 40 + abs(dy) * 45
+    return Image.fromarray(pixels)
+
+
+def _best_of(repeat: int, func, *args):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+class Command(BaseCommand):
+    help = "Benchmark signature image cleanup (per-pixel loop vs vectorized) and verify identical output."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="300x100,600x200,1200x400,2000x600", help="comma-separated WxH list")
+        parser.add_argument("--repeat", type=int, default=3, help="runs per size, best time is reported")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [tuple(int(v) for v in item.lower().split("x")) for item in options["sizes"].split(",") if item]
+        except ValueError:
+            raise CommandError("--sizes must look like 600x200,2000x600")
+        repeat = max(1, options["repeat"])
+
+        self.stdout.write(f"{'size':>11} {'loop ms':>9} {'numpy ms':>9} {'speedup':>8}")
+        for width, height in sizes:
+            image = _sample_signature(width, height)
+
+            loop_convert, loop_image = _best_of(repeat, _convert_white_to_transparent_loop, image)
+            fast_convert, fast_image = _best_of(repeat, _convert_white_to_transparent, image)
+            if loop_image.tobytes() != fast_image.tobytes():
+                raise CommandError(f"{width}x{height}: _convert_white_to_transparent output differs")
+
+            loop_count, loop_visible = _best_of(repeat, _count_visible_alpha_pixels_loop, fast_image)
+            fast_count, fast_visible = _best_of(repeat, _count_visible_alpha_pixels, fast_image)
+            if loop_visible != fast_visible:
+                raise CommandError(f"{width}x{height}: _count_visible_alpha_pixels {fast_visible} != {loop_visible}")
+
+            loop_ms = (loop_convert + loop_count) * 1000
+            fast_ms = (fast_convert + fast_count) * 1000
+            self.stdout.write(
+                f"{width:>5}x{height:<5} {loop_ms:>9.1f} {fast_ms:>9.2f} {loop_ms / max(fast_ms, 1e-6):>7.0f}x"
+            )
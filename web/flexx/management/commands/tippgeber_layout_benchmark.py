@@ -0,0 +1,192 @@
+# FILE: web/flexx/management/commands/tippgeber_layout_benchmark.py  (новое — 2026-10-17)
+# PURPOSE: manage.py tippgeber_layout_benchmark [--paragraphs 200] [--repeat 3] — макет Servicepartner-Vertrag:
+#          прежний движок (посимвольный токенизатор, stringWidth на каждый символ / фрагмент) vs кэш ширин глифов;
+#          время макета и PDF на длинном тексте + проверка, что макет и PDF побайтно совпадают.
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from flexx import pdf_tippgeber_contract as tippgeber_pdf
+
+
+def _text_width_stringwidth(text: str, is_bold: bool) -> float:
+    return stringWidth(text, tippgeber_pdf._font_name(is_bold), tippgeber_pdf._FONT_SIZE)
+
+
+def _split_long_piece_stringwidth(piece: str, *, max_width: float, is_bold: bool):
+    """Прежняя реализация (до 2026-10-17): stringWidth растущего буфера на каждый символ — эталон для сравнения."""
+    font_name = tippgeber_pdf._font_name(is_bold)
+    out: list[str] = []
+    buf = ""
+    for ch in piece:
+        next_buf = buf + ch
+        if buf and stringWidth(next_buf, font_name, tippgeber_pdf._FONT_SIZE) > max_width:
+            out.append(buf)
+            buf = ch
+        else:
+            buf = next_buf
+    if buf:
+        out.append(buf)
+    return iter([(part, _text_width_stringwidth(part, is_bold)) for part in out or [piece]])
+
+
+def _tokenize_text_with_bold_loop(text: str) -> list[tuple[str, str, bool, bool, bool]]:
+    """Прежний токенизатор (до 2026-10-17): посимвольный цикл — эталон для сравнения."""
+    tokens: list[tuple[str, str, bool, bool, bool]] = []
+    bold_open = False
+    underline_open = False
+    raw_open = False
+    plain_buf: list[str] = []
+
+    def flush_plain() -> None:
+        if plain_buf:
+            tokens.append(("text", "".join(plain_buf), bold_open, underline_open, raw_open))
+            plain_buf.clear()
+
+    i = 0
+    while i < len(text):
+        if text.startswith("****", i):
+            flush_plain()
+            raw_open = not raw_open
+            i += 4
+            continue
+        if raw_open:
+            if text.startswith("**", i):
+                flush_plain()
+                bold_open = not bold_open
+                i += 2
+                continue
+            ch = text[i]
+            if ch == "\n":
+                flush_plain()
+                tokens.append(("newline", "\n", bold_open, underline_open, raw_open))
+            elif ch == "\t":
+                flush_plain()
+                tokens.append(("tab", "\t", bold_open, underline_open, raw_open))
+            else:
+                plain_buf.append(ch)
+            i += 1
+            continue
+        page_break_match = tippgeber_pdf._PAGE_BREAK_RE.match(text, i)
+        if page_break_match:
+            flush_plain()
+            tokens.append(("page_break", "", bold_open, underline_open, raw_open))
+            i = page_break_match.end()
+            continue
+        if text.startswith("__", i):
+            flush_plain()
+            underline_open = not underline_open
+            i += 2
+            continue
+        if text.startswith("**", i):
+            flush_plain()
+            bold_open = not bold_open
+            i += 2
+            continue
+        ch = text[i]
+        if ch == "\n":
+            flush_plain()
+            tokens.append(("newline", "\n", bold_open, underline_open, raw_open))
+        elif ch == "\t":
+            flush_plain()
+            tokens.append(("tab", "\t", bold_open, underline_open, raw_open))
+        else:
+            plain_buf.append(ch)
+        i += 1
+    flush_plain()
+    return tokens
+
+
+@contextmanager
+def _previous_engine():
+    """Подменяет в модуле токенизатор и измерение ширины на прежние (только на время замера)."""
+    names = ("_tokenize_text_with_bold", "_text_width", "_split_long_piece")
+    saved = [getattr(tippgeber_pdf, name) for name in names]
+    previous = (_tokenize_text_with_bold_loop, _text_width_stringwidth, _split_long_piece_stringwidth)
+    for name, func in zip(names, previous):
+        setattr(tippgeber_pdf, name, func)
+    try:
+        yield
+    finally:
+        for name, func in zip(names, saved):
+            setattr(tippgeber_pdf, name, func)
+
+
+def _sample_contract_text(paragraphs: int) -> str:
+    """
+    Длинный Vertrag (плейсхолдеры уже подставлены): заголовки, списки, **fett**, __unterstrichen__,
+    raw-блоки с длинными неразрывными строками.
+    """
+    parts = ["!!**Servicepartner-Vertrag**\nzwischen FleXXLager und\nMax Muster\n\tMusterweg 1, 12345 Köln!!", ""]
+    for n in range(paragraphs):
+        # каждый абзац уникален — иначе кэш строк в _layout_text пропускает перенос
+        body = (
+            f"Der Servicepartner vermittelt Interessenten für die Anleihe DE000A1B2C3 und erhält dafür {n + 2}% "
+            f"Vergütung gemäß **Anlage {n + 1}**. Die Vergütung wird __innerhalb von {n % 30 + 1} Tagen__ nach "
+            "Zahlungseingang fällig (€, „netto“). "
+        )
+        parts.append(f"{n % 9 + 1}) §{n + 1} Regelung")
+        parts.append(body * 3)
+        parts.append("a) " + body)
+        parts.append("- Hinweis " + body)
+        parts.append("%%%")
+        if n % 10 == 0:
+            parts.append("****Konto:\tDE89370400440532013000" + "X" * (200 + n) + "\n**Referenz:**\t" + "https://flexxlager.de/" + "a" * (300 + n) + "****")
+            parts.append("Verweis " + "ABCDEFGHIJ" * 40 + f" Ende {n}")
+        if n % 50 == 49:
+            parts.append("{BR}")
+    parts.append(tippgeber_pdf._SIGNATURE_TABLE_MARKER)
+    return "\n".join(parts)
+
+
+def _best_of(repeat: int, func, *args):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+class Command(BaseCommand):
+    help = "Benchmark Tippgeber contract layout (previous vs glyph-width cache) and verify identical output."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--paragraphs", type=int, default=200, help="sections in the generated contract text")
+        parser.add_argument("--repeat", type=int, default=3, help="runs per variant, best time is reported")
+
+    def handle(self, *args, **options):
+        repeat = max(1, options["repeat"])
+        renderer = tippgeber_pdf.TippgeberContractTextRenderer()
+        text = _sample_contract_text(max(1, options["paragraphs"]))
+
+        # без кэша строк: меряется сам перенос, а не повторное использование
+        with _previous_engine():
+            old_layout_s, old_layout = _best_of(repeat, tippgeber_pdf._layout_text, text)
+        new_layout_s, new_layout = _best_of(repeat, tippgeber_pdf._layout_text, text)
+        if old_layout != new_layout:
+            raise CommandError("layout differs from the previous engine")
+
+        # метаданные PDF детерминированы (pdf_canvas) — PDF сравнимы побайтно
+        render_s, new_pdf = _best_of(repeat, renderer.render, new_layout)
+        old_pdf = renderer.render(old_layout)
+        if old_pdf.pdf_bytes != new_pdf.pdf_bytes:
+            raise CommandError("PDF output differs from the previous engine")
+
+        lines = sum(1 for op in new_layout if op[0] == "line")
+        old_total = (old_layout_s + render_s) * 1000
+        new_total = (new_layout_s + render_s) * 1000
+        self.stdout.write(f"text: {len(text)} chars, {lines} lines, PDF {len(new_pdf.pdf_bytes)} bytes (identical)")
+        self.stdout.write(f"{'':<8} {'previous ms':>12} {'current ms':>12} {'speedup':>8}")
+        self.stdout.write(
+            f"{'layout':<8} {old_layout_s * 1000:>12.1f} {new_layout_s * 1000:>12.1f} "
+            f"{old_layout_s / max(new_layout_s, 1e-9):>7.1f}x"
+        )
+        self.stdout.write(f"{'total':<8} {old_total:>12.1f} {new_total:>12.1f} {old_total / max(new_total, 1e-9):>7.1f}x")
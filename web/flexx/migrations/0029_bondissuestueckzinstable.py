@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flexx', '0028_contract_tippgeber_paid_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BondIssueStueckzinsTable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveSmallIntegerField(default=1)),
+                ('table_key', models.CharField(max_length=64)),
+                ('rows', models.JSONField(blank=True, default=list)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+                ('issue', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stueckzins_table', to='flexx.bondissue')),
+            ],
+            options={
+                'db_table': 'bond_issue_stueckzins_tables',
+            },
+        ),
+    ]
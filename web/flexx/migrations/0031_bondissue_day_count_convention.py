@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flexx', '0030_bondissue_holiday_subdiv'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bondissue',
+            name='day_count_convention',
+            field=models.CharField(choices=[('30_360_us', '30/360 (US)'), ('act_360', 'ACT/360'), ('act_act_icma', 'ACT/ACT (ICMA)')], default='30_360_us', max_length=16),
+        ),
+    ]
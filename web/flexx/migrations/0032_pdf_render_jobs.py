@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flexx', '0031_bondissue_day_count_convention'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfRenderJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('created', 'Vertrag erstellt'), ('signed', 'Vom Kunden unterzeichnet'), ('paid', 'Bezahlt (gegengezeichnet)')], max_length=16)),
+                ('status', models.CharField(choices=[('pending', 'Wartend'), ('running', 'In Arbeit'), ('done', 'Erledigt'), ('failed', 'Fehlgeschlagen')], db_index=True, default='pending', max_length=16)),
+                ('notify', models.BooleanField(default=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('contract', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pdf_render_jobs', to='flexx.contract')),
+            ],
+            options={
+                'db_table': 'pdf_render_jobs',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['contract', 'kind'], name='pdf_render__contrac_fe427f_idx')],
+            },
+        ),
+    ]
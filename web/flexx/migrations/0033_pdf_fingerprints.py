@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flexx', '0032_pdf_render_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contract',
+            name='pdf_fingerprints',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='tippgebercontract',
+            name='pdf_fingerprints',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flexx', '0033_pdf_fingerprints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pdfrenderjob',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Wartend'), ('running', 'In Arbeit'), ('done', 'Erledigt'), ('mail_failed', 'PDF erstellt, E-Mail fehlgeschlagen'), ('failed', 'Fehlgeschlagen')], db_index=True, default='pending', max_length=16),
+        ),
+    ]
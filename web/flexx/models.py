@@ -1,7 +1,8 @@
-# FILE: web/flexx/models.py  (обновлено — 2026-02-16)
-# PURPOSE: Добавлено поле minimal_bonds_quantity в BondIssue.
-#          Contract содержит settlement_date, bonds_quantity,
-#          nominal_amount, nominal_amount_plus_percent.
+# FILE: web/flexx/models.py  (обновлено — 2026-10-17)
+# PURPOSE: BondIssue.holiday_subdiv — Bundesland для праздников (банковские дни, Stückzins-Tabelle);
+#          BondIssue.day_count_convention — Zinsmethode (flexx.day_count: 30/360 US, ACT/360, ACT/ACT ICMA);
+#          BondIssueStueckzinsTable пересобирается в BondIssue.save() при изменении issue_date/term/rate/price/subdiv/Zinsmethode.
+#          PdfRenderJob — очередь фоновой генерации PDF договора + E-Mail (flexx.pdf_jobs, manage.py pdf_worker).
 
 from __future__ import annotations
 
@@ -59,6 +60,31 @@ def flexxlager_signature_upload_to(instance: "FlexxlagerSignature", filename: st
 
 
 class BondIssue(models.Model):
+    class HolidaySubdiv(models.TextChoices):
+        NONE = "", "Bundesweit"
+        BW = "BW", "Baden-Württemberg"
+        BY = "BY", "Bayern"
+        BE = "BE", "Berlin"
+        BB = "BB", "Brandenburg"
+        HB = "HB", "Bremen"
+        HH = "HH", "Hamburg"
+        HE = "HE", "Hessen"
+        MV = "MV", "Mecklenburg-Vorpommern"
+        NI = "NI", "Niedersachsen"
+        NW = "NW", "Nordrhein-Westfalen"
+        RP = "RP", "Rheinland-Pfalz"
+        SL = "SL", "Saarland"
+        SN = "SN", "Sachsen"
+        ST = "ST", "Sachsen-Anhalt"
+        SH = "SH", "Schleswig-Holstein"
+        TH = "TH", "Thüringen"
+
+    class DayCountConvention(models.TextChoices):
+        # коды = flexx.day_count (реестр реализаций)
+        THIRTY_360_US = "30_360_us", "30/360 (US)"
+        ACT_360 = "act_360", "ACT/360"
+        ACT_ACT_ICMA = "act_act_icma", "ACT/ACT (ICMA)"
+
     title = models.CharField(max_length=255)  # Name der Emission
     issue_date = models.DateField()  # Emissionsdatum
     isin_wkn = models.CharField(max_length=255, blank=True)  # ISIN / WKN
@@ -73,6 +99,17 @@ class BondIssue(models.Model):
         default=1
     )  # Минимальное количество облигаций
     documents_sent_other = models.PositiveIntegerField(default=0)
+    holiday_subdiv = models.CharField(
+        max_length=2,
+        blank=True,
+        default="",
+        choices=HolidaySubdiv.choices,
+    )  # Bundesland für Feiertage (Bankarbeitstage / Stückzins-Tabelle)
+    day_count_convention = models.CharField(
+        max_length=16,
+        default=DayCountConvention.THIRTY_360_US,
+        choices=DayCountConvention.choices,
+    )  # Zinsmethode (Stückzins-Tabelle, Zinslauf)
 
     contract = models.JSONField(default=dict, blank=True)  # key->text (Textarea)
     active = models.BooleanField(default=True)
@@ -87,6 +124,32 @@ class BondIssue(models.Model):
     def __str__(self) -> str:
         return f"{self.issue_date:%d.%m.%Y}: {self.title}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from flexx.stueckzins_table import STUECKZINS_TABLE_SOURCE_FIELDS, ensure_issue_stueckzins_table
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or STUECKZINS_TABLE_SOURCE_FIELDS.intersection(update_fields):
+            ensure_issue_stueckzins_table(self)
+
+
+class BondIssueStueckzinsTable(models.Model):
+    issue = models.OneToOneField(
+        BondIssue,
+        on_delete=models.CASCADE,
+        related_name="stueckzins_table",
+    )
+    version = models.PositiveSmallIntegerField(default=1)
+    table_key = models.CharField(max_length=64)  # sha1(version, issue_date, term, rate, price, holidays)
+    rows = models.JSONField(default=list, blank=True)  # [[iso_date, stueckzins, stueckzins_de, weekend, holiday, name]]
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "bond_issue_stueckzins_tables"
+
+    def __str__(self) -> str:
+        return f"StueckzinsTable issue={self.issue_id} v{self.version}"
+
 
 class BondIssueAttachment(models.Model):
     issue = models.ForeignKey(
@@ -140,6 +203,8 @@ class TippgeberContract(models.Model):
     signature_file = models.FileField(upload_to=tippgeber_contract_signature_upload_to, blank=True)
     signed_contract_pdf = models.FileField(upload_to=tippgeber_contract_pdf_upload_to, blank=True)
     signed_at = models.DateTimeField(null=True, blank=True)
+    # {поле PDF: {"fingerprint": ..., "sha256": ...}} — см. flexx/pdf_fingerprint.py
+    pdf_fingerprints = models.JSONField(default=dict, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -180,6 +245,8 @@ class Contract(models.Model):
     signature = models.ImageField(upload_to=contract_signature_upload_to, blank=True)
     contract_pdf_signed = models.FileField(upload_to=contract_pdf_signed_upload_to, blank=True)
     contract_pdf_signed_signed = models.FileField(upload_to=contract_pdf_signed_upload_to, blank=True)
+    # {поле PDF: {"fingerprint": ..., "sha256": ...}} — см. flexx/pdf_fingerprint.py
+    pdf_fingerprints = models.JSONField(default=dict, blank=True)
 
     signed_received_at = models.DateField(null=True, blank=True)
     paid_at = models.DateField(null=True, blank=True)
@@ -196,6 +263,41 @@ class Contract(models.Model):
         return f"Contract#{self.id} issue={self.issue_id} client={self.client_id}"
 
 
+class PdfRenderJob(models.Model):
+    """Задание воркеру: PDF договора после смены статуса (erstellt / unterzeichnet / bezahlt) + письмо."""
+
+    class Kind(models.TextChoices):
+        CREATED = "created", "Vertrag erstellt"
+        SIGNED = "signed", "Vom Kunden unterzeichnet"
+        PAID = "paid", "Bezahlt (gegengezeichnet)"
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Wartend"
+        RUNNING = "running", "In Arbeit"
+        DONE = "done", "Erledigt"
+        MAIL_FAILED = "mail_failed", "PDF erstellt, E-Mail fehlgeschlagen"
+        FAILED = "failed", "Fehlgeschlagen"
+
+    contract = models.ForeignKey(Contract, on_delete=models.CASCADE, related_name="pdf_render_jobs")
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING, db_index=True)
+    notify = models.BooleanField(default=True)  # E-Mail an den Kunden nach dem PDF
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "pdf_render_jobs"
+        ordering = ["id"]
+        indexes = [models.Index(fields=["contract", "kind"])]
+
+    def __str__(self) -> str:
+        return f"PdfRenderJob#{self.id} {self.kind} contract={self.contract_id} {self.status}"
+
+
 class FlexxlagerSignature(models.Model):
     id = models.PositiveSmallIntegerField(primary_key=True, default=1, editable=False)
     signature = models.ImageField(upload_to=flexxlager_signature_upload_to)
@@ -0,0 +1,87 @@
+# FILE: web/flexx/money.py  (новое — 2026-10-17)
+# PURPOSE: Деньги в целых единицах (центы; to_units — любая точность) с ROUND_HALF_UP — одна реализация округления
+#          для Stückzinsen, сумм договора и Tippgeber-Provision (+19% MwSt).
+
+from __future__ import annotations
+
+from decimal import Decimal
+from functools import lru_cache
+
+CENT_PLACES = 2
+VAT_PERCENT = 19  # MwSt auf Tippgeber-Provision
+
+
+def div_half_up(num: int, den: int) -> int:
+    """num / den, округление ROUND_HALF_UP (половина — от нуля), как Decimal.quantize."""
+    if den <= 0:
+        raise ValueError("den must be positive")
+    q, r = divmod(abs(num), den)
+    if 2 * r >= den:
+        q += 1
+    return -q if num < 0 else q
+
+
+def to_units(value, places: int) -> int:
+    """Decimal/str/int/float -> целое число единиц 10^-places (ROUND_HALF_UP)."""
+    if isinstance(value, int):
+        return value * 10**places
+    d = value if isinstance(value, Decimal) else Decimal(str(value))
+    num, den = d.as_integer_ratio()  # точная дробь, den — делитель 10^k
+    scale = 10**places
+    if scale % den == 0:
+        return num * (scale // den)
+    return div_half_up(num * scale, den)
+
+
+def from_units(units: int, places: int) -> Decimal:
+    return Decimal(units).scaleb(-places)
+
+
+def to_cents(value) -> int:
+    return to_units(value, CENT_PLACES)
+
+
+def from_cents(cents: int) -> Decimal:
+    return from_units(cents, CENT_PLACES)
+
+
+def format_units_de(units: int, places: int) -> str:
+    """12345678, 6 -> "12,345678" (без разделителя тысяч, как f"{v:.6f}" с запятой)."""
+    sign = "-" if units < 0 else ""
+    whole, frac = divmod(abs(units), 10**places)
+    if places <= 0:
+        return f"{sign}{whole}"
+    return f"{sign}{whole},{frac:0{places}d}"
+
+
+def format_cents_de(cents: int) -> str:
+    """123456789 -> "1.234.567,89" (как babel "#,##0.00" de_DE, без Decimal)."""
+    sign = "-" if cents < 0 else ""
+    whole, frac = divmod(abs(cents), 100)
+    return f"{sign}{whole:,}".replace(",", ".") + f",{frac:02d}"
+
+
+@lru_cache(maxsize=256)
+def _percent_fraction(rate_percent: str) -> tuple[int, int]:
+    """"5.25" -> (525, 10000): rate_percent / 100 как точная дробь."""
+    d = Decimal(rate_percent)
+    sign, digits, exponent = d.as_tuple()
+    num = int("".join(map(str, digits)) or "0")
+    if sign:
+        num = -num
+    if exponent >= 0:
+        return num * 10**exponent, 100
+    return num, 100 * 10 ** (-exponent)
+
+
+def percent_of_cents(cents: int, rate_percent) -> int:
+    """cents * rate_percent / 100, ROUND_HALF_UP до цента (точно, без потери разрядов)."""
+    num, den = _percent_fraction(str(rate_percent or 0))
+    return div_half_up(cents * num, den)
+
+
+def tippgeber_provision_cents(nominal_amount, rate_percent) -> tuple[int, int, int]:
+    """(Provision, MwSt 19%, Gesamt) в центах от Nominalbetrag."""
+    provision = percent_of_cents(to_cents(nominal_amount), rate_percent)
+    vat = div_half_up(provision * VAT_PERCENT, 100)
+    return provision, vat, provision + vat
@@ -0,0 +1,199 @@
+# FILE: web/flexx/overdue_report.py  (новое — 2026-10-17)
+# PURPOSE: Verzug: договоры с прошедшим settlement_date без paid_at — дополнительные Stückzinsen
+#          от Zahlungsdatum до as_of (Zinsmethode и формула сумм договора), банковские дни просрочки. Один проход по выборке.
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+
+from flexx.contract_helpers import banking_days_between, calc_stueckzins_capped
+from flexx.coupon_run import iter_csv_lines
+from flexx.day_count import get_day_count
+from flexx.models import Contract
+from flexx.money import format_units_de, to_cents
+from flexx.stueckzins_table import STUECKZINS_TABLE_HOLIDAY_COUNTRY, _quantize_2
+
+OVERDUE_CHUNK_SIZE = 2000
+
+OVERDUE_CSV_HEADER = [
+    "as_of",
+    "contract_id",
+    "issue_id",
+    "issue",
+    "client_id",
+    "client_name",
+    "client_email",
+    "contract_date",
+    "settlement_date",
+    "days_overdue",
+    "banking_days_overdue",
+    "bonds_quantity",
+    "amount_due",
+    "accrued_interest_contract",
+    "accrued_interest_as_of",
+    "additional_interest",
+    "new_total",
+]
+
+_OVERDUE_VALUES = (
+    "id",
+    "contract_date",
+    "settlement_date",
+    "bonds_quantity",
+    "nominal_amount",
+    "nominal_amount_plus_percent",
+    "issue_id",
+    "issue__title",
+    "issue__issue_date",
+    "issue__term_months",
+    "issue__interest_rate",
+    "issue__bond_price",
+    "issue__holiday_subdiv",
+    "issue__day_count_convention",
+    "client_id",
+    "client__first_name",
+    "client__last_name",
+    "client__company",
+    "client__email",
+)
+
+
+@dataclass(frozen=True)
+class OverdueContract:
+    as_of: date
+    contract_id: int
+    issue_id: int
+    issue_title: str
+    client_id: int
+    client_name: str
+    client_email: str
+    contract_date: date | None
+    settlement_date: date
+    days_overdue: int
+    banking_days_overdue: int
+    bonds_quantity: int
+    nominal_cents: int
+    accrued_contract_cents: int  # по договору (Gesamtbetrag - Nominalbetrag)
+    accrued_as_of_cents: int  # Stückzinsen на as_of (не позже конца срока)
+
+    @property
+    def additional_cents(self) -> int:
+        return max(0, self.accrued_as_of_cents - self.accrued_contract_cents)
+
+    @property
+    def amount_due_cents(self) -> int:
+        return self.nominal_cents + self.accrued_contract_cents
+
+    @property
+    def new_total_cents(self) -> int:
+        return self.amount_due_cents + self.additional_cents
+
+    def csv_row(self) -> list[str]:
+        return [
+            self.as_of.isoformat(),
+            str(self.contract_id),
+            str(self.issue_id),
+            self.issue_title,
+            str(self.client_id),
+            self.client_name,
+            self.client_email,
+            self.contract_date.isoformat() if self.contract_date else "",
+            self.settlement_date.isoformat(),
+            str(self.days_overdue),
+            str(self.banking_days_overdue),
+            str(self.bonds_quantity),
+            format_units_de(self.amount_due_cents, 2),
+            format_units_de(self.accrued_contract_cents, 2),
+            format_units_de(self.accrued_as_of_cents, 2),
+            format_units_de(self.additional_cents, 2),
+            format_units_de(self.new_total_cents, 2),
+        ]
+
+
+def overdue_contracts_queryset(as_of: date):
+    return (
+        Contract.objects.filter(
+            settlement_date__lt=as_of,
+            paid_at__isnull=True,
+            bonds_quantity__gt=0,
+            nominal_amount__isnull=False,
+            nominal_amount_plus_percent__isnull=False,
+        )
+        .order_by("settlement_date", "id")
+        .values_list(*_OVERDUE_VALUES)
+    )
+
+
+def iter_overdue_contracts(as_of: date, *, chunk_size: int = OVERDUE_CHUNK_SIZE) -> Iterator[OverdueContract]:
+    """
+    Один запрос (договор + эмиссия + клиент), поток .iterator().
+    Stückzins je Anleihe на as_of (не дальше Laufzeitende) — та же формула, что у сумм договора
+    (calc_stueckzins_capped), значение по эмиссии кэшируется; * Anzahl -> центы с одним округлением, как в договоре:
+    при as_of с той же долей года, что и settlement_date, additional_interest ровно 0.
+    """
+    st_one_by_issue: dict[int, Decimal] = {}
+
+    for (
+        contract_id,
+        contract_date,
+        settlement_date,
+        qty,
+        nominal_amount,
+        total_amount,
+        issue_id,
+        issue_title,
+        issue_date,
+        term_months,
+        interest_rate,
+        bond_price,
+        holiday_subdiv,
+        day_count_convention,
+        client_id,
+        first_name,
+        last_name,
+        company,
+        email,
+    ) in overdue_contracts_queryset(as_of).iterator(chunk_size=chunk_size):
+        st_one = st_one_by_issue.get(issue_id)
+        if st_one is None:
+            st_one = calc_stueckzins_capped(
+                issue_date=issue_date,
+                term_months=int(term_months),
+                interest_rate_percent=_quantize_2(interest_rate),
+                nominal_value=_quantize_2(bond_price),
+                pay_date=as_of,
+                day_count=get_day_count(day_count_convention).code,
+            )
+            st_one_by_issue[issue_id] = st_one
+
+        nominal_cents = to_cents(nominal_amount)
+        qty = int(qty)
+        yield OverdueContract(
+            as_of=as_of,
+            contract_id=contract_id,
+            issue_id=issue_id,
+            issue_title=issue_title,
+            client_id=client_id,
+            client_name=" ".join(x for x in (first_name, last_name) if x) or company,
+            client_email=email,
+            contract_date=contract_date,
+            settlement_date=settlement_date,
+            days_overdue=(as_of - settlement_date).days,
+            banking_days_overdue=banking_days_between(
+                settlement_date,
+                as_of,
+                holiday_country=STUECKZINS_TABLE_HOLIDAY_COUNTRY,
+                holiday_subdiv=holiday_subdiv or None,
+            ),
+            bonds_quantity=qty,
+            nominal_cents=nominal_cents,
+            accrued_contract_cents=to_cents(total_amount) - nominal_cents,
+            accrued_as_of_cents=to_cents(st_one * qty),
+        )
+
+
+def iter_overdue_csv_lines(as_of: date) -> Iterator[str]:
+    return iter_csv_lines(OVERDUE_CSV_HEADER, (row.csv_row() for row in iter_overdue_contracts(as_of)))
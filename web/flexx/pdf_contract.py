@@ -1,11 +1,30 @@
+# FILE: web/flexx/pdf_contract.py  (обновлено — 2026-10-17)
+# PURPOSE: PDF договора (ReportLab). Разметка абзацев (wrap) кэшируется на процесс по (text, font, size, alignment, width):
+#          measure-then-draw и повторные договоры эмиссии (text_zwischen_*, ergaenzung_*, Stückzinsen) не парсят текст заново.
+#          Страницы 3+ (Ergänzung + Stückzinstabelle) зависят только от эмиссии — рендерятся один раз на версию эмиссии,
+#          к договору дописываются готовым PDF-фрагментом (pikepdf).
+#          Подписи: позиции (anchors) пишутся в /FlexxAnchors сохранённого PDF; signed / paid — наложение подписи
+#          (+ Ort, Datum подписания) на уже сохранённый contract_pdf / contract_pdf_signed (без повторного рендера), без anchors — полный рендер.
+#          Подпись FleXXLager (singleton) готовится один раз на процесс (get_company_signature, ключ — имя файла + mtime).
+#          Профиль вывода (settings.PDF_OUTPUT_PROFILE, flexx/pdf_output.py): compact — подписи в разрешении печати,
+#          дедупликация картинок, object streams + linearize.
+#          Очистка подписи (белый фон -> alpha, подсчёт видимых пикселей) — numpy / PIL-гистограмма вместо цикла по пикселям.
+#          Отпечаток входа (input_fingerprint: поля договора / клиента / эмиссии, подписи, дата, профиль) — в результате
+#          сборки; previous_fingerprint совпал -> рендер пропускается (сохранённый файл актуален).
+
 from __future__ import annotations
 
-from datetime import timedelta
+from collections import OrderedDict
+import copy
+from datetime import date, timedelta
+import hashlib
+import json
 import math
 from io import BytesIO
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from decimal import Decimal
 import re
+import threading
 from typing import Any
 
 from babel.dates import format_date
@@ -13,14 +32,42 @@ from reportlab.lib.enums import TA_JUSTIFY
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import ParagraphStyle
 from reportlab.lib.utils import ImageReader
-from reportlab.pdfgen import canvas as rl_canvas
 from reportlab.pdfgen.canvas import Canvas
 from reportlab.platypus import Paragraph
 from django.utils import timezone
 from PIL import Image
+import numpy as np
+import pikepdf
 
-from flexx.contract_helpers import build_stueckzinsen_rows_for_issue
 from flexx.models import Contract, FlexxlagerSignature
+from flexx.pdf_fingerprint import bytes_sha256, file_sha256, input_fingerprint
+from flexx.pdf_output import (
+    PDF_PROFILE_COMPACT,
+    pdf_canvas,
+    pdf_date,
+    pdf_output_profile,
+    save_pdf,
+    signature_for_print,
+)
+from flexx.stueckzins_table import get_issue_stueckzins_rows, stueckzins_table_key
+
+# (paragraph_text, font_name, font_size, alignment, width) -> (Paragraph после wrap, height); LRU на процесс.
+_PARAGRAPH_LAYOUT_CACHE: OrderedDict[tuple, tuple[Paragraph, float]] = OrderedDict()
+_PARAGRAPH_LAYOUT_CACHE_MAX = 8192
+_PARAGRAPH_LAYOUT_LOCK = threading.Lock()
+_PARAGRAPH_STYLES: dict[tuple[str, float, int], ParagraphStyle] = {}
+
+# Ключ docinfo с позициями подписей (JSON) — по нему signed/paid накладываются на сохранённый PDF.
+PDF_ANCHORS_KEY = "/FlexxAnchors"
+
+# Менять при изменении вёрстки страниц 3+ — фрагменты эмиссий перерисуются.
+ISSUE_PAGES_RENDER_VERSION = 1
+# Менять при изменении вёрстки договора / наложения подписей — отпечатки сохранённых PDF устареют.
+CONTRACT_PDF_RENDER_VERSION = 2
+# issue_id -> (issue_pages_key, PDF-фрагмент страниц 3+); LRU на процесс.
+_ISSUE_PAGES_CACHE: OrderedDict[int, tuple[str, bytes]] = OrderedDict()
+_ISSUE_PAGES_CACHE_MAX = 32
+_ISSUE_PAGES_LOCK = threading.Lock()
 
 
 def _format_text(value) -> str:
@@ -32,44 +79,69 @@ def _format_text(value) -> str:
     return txt
 
 
+def _read_file_field_bytes(file_field) -> bytes | None:
+    if not file_field:
+        return None
+    try:
+        file_field.open("rb")
+        return file_field.read()
+    except Exception:
+        return None
+    finally:
+        try:
+            file_field.close()
+        except Exception:
+            pass
+
+
+def _paragraph_style(font_name: str, font_size: float, alignment: int) -> ParagraphStyle:
+    key = (font_name, float(font_size), alignment)
+    style = _PARAGRAPH_STYLES.get(key)
+    if style is None:
+        style = ParagraphStyle(
+            name="contract-text",
+            fontName=font_name,
+            fontSize=font_size,
+            leading=font_size * 1.2,
+            alignment=alignment,
+        )
+        _PARAGRAPH_STYLES[key] = style
+    return style
+
+
 def _has_real_transparency(rgba_image: Image.Image) -> bool:
     alpha = rgba_image.getchannel("A")
     min_alpha, _ = alpha.getextrema()
     return min_alpha < 250
 
 
-def _convert_white_to_transparent(rgba_image: Image.Image) -> Image.Image:
-    converted = rgba_image.copy()
-    px = converted.load()
-    w, h = converted.size
-    for y in range(h):
-        for x in range(w):
-            r, g, b, a = px[x, y]
-            if a == 0:
-                continue
+def _white_to_alpha_limit(channel_sum: int) -> int:
+    """Максимальная alpha пикселя по r + g + b (белый фон -> прозрачный, штрих остаётся плотным)."""
+    light = channel_sum / 3.0
+    if light >= 245:
+        return 0
+    if light >= 210:
+        t = (245 - light) / 35.0
+        next_alpha = int(round(255 * t * 0.55))
+    else:
+        darkness = 1.0 - (light / 255.0)
+        next_alpha = int(round(max(110, min(255, 255 * darkness * 1.7))))
+    return 0 if next_alpha <= 2 else next_alpha
 
-            light = (int(r) + int(g) + int(b)) / 3.0
-            next_alpha = 0
-            if light >= 245:
-                next_alpha = 0
-            elif light >= 210:
-                t = (245 - light) / 35.0
-                next_alpha = int(round(255 * t * 0.55))
-            else:
-                darkness = 1.0 - (light / 255.0)
-                next_alpha = int(round(max(110, min(255, 255 * darkness * 1.7))))
 
-            if next_alpha <= 2:
-                px[x, y] = (r, g, b, 0)
-            else:
-                px[x, y] = (r, g, b, min(int(a), next_alpha))
-    return converted
+# r + g + b (0..765) -> предел alpha; считается один раз, применяется ко всему массиву.
+_WHITE_ALPHA_LUT = np.array([_white_to_alpha_limit(s) for s in range(3 * 255 + 1)], dtype=np.uint8)
+
+
+def _convert_white_to_transparent(rgba_image: Image.Image) -> Image.Image:
+    pixels = np.array(rgba_image.convert("RGBA"), dtype=np.uint8)
+    channel_sum = pixels[..., :3].sum(axis=2, dtype=np.uint16)
+    np.minimum(pixels[..., 3], _WHITE_ALPHA_LUT[channel_sum], out=pixels[..., 3])
+    return Image.fromarray(pixels)
 
 
 def _count_visible_alpha_pixels(rgba_image: Image.Image, alpha_threshold: int = 8) -> int:
-    alpha = rgba_image.getchannel("A")
-    data = alpha.getdata()
-    return sum(1 for a in data if int(a) > alpha_threshold)
+    return sum(rgba_image.getchannel("A").histogram()[alpha_threshold + 1:])
 
 
 def _trim_visible_rgba(
@@ -79,7 +151,7 @@ def _trim_visible_rgba(
     padding: int = 2,
 ) -> Image.Image | None:
     alpha = rgba_image.getchannel("A")
-    bbox = alpha.point(lambda a: 255 if int(a) > alpha_threshold else 0).getbbox()
+    bbox = alpha.point([255 if a > alpha_threshold else 0 for a in range(256)]).getbbox()
     if not bbox:
         return None
     left, top, right, bottom = bbox
@@ -108,10 +180,73 @@ def _prepare_signature_image(raw_bytes: bytes) -> Image.Image | None:
 
     return _trim_visible_rgba(rgba, alpha_threshold=12, padding=2)
 
+
+# ---------------- FleXXLager-Signatur (singleton) — кэш процесса ----------------
+
+
+@dataclass(frozen=True)
+class CompanySignature:
+    key: tuple[str, float]
+    png: bytes
+    sha256: str
+    image: Image.Image | None  # договор: белый фон -> alpha, обрезано (_prepare_signature_image)
+    rgba: Image.Image  # Tippgeber-Vertrag: как загружено
+
+
+_COMPANY_SIGNATURE: CompanySignature | None = None
+
+
+def _company_signature_key(file_field) -> tuple[str, float]:
+    try:
+        mtime = file_field.storage.get_modified_time(file_field.name).timestamp()
+    except (OSError, NotImplementedError):
+        mtime = 0.0
+    return file_field.name, mtime
+
+
+def get_company_signature() -> CompanySignature | None:
+    """
+    Подготовленная подпись FleXXLager: файл читается и декодируется один раз на процесс,
+    заново — только если сменилось имя файла или его mtime (новая загрузка в Django-Admin).
+    """
+    global _COMPANY_SIGNATURE
+    record = FlexxlagerSignature.objects.first()
+    if not record or not record.signature:
+        return None
+    key = _company_signature_key(record.signature)
+    cached = _COMPANY_SIGNATURE
+    if cached is not None and cached.key == key:
+        return cached
+
+    png = _read_file_field_bytes(record.signature)
+    if not png:
+        return None
+    try:
+        with Image.open(BytesIO(png)) as img:
+            rgba = img.convert("RGBA")
+    except Exception:
+        return None
+    # объекты неизменяемы после создания — потоки gunicorn читают их без блокировки
+    cached = CompanySignature(
+        key=key, png=png, sha256=bytes_sha256(png), image=_prepare_signature_image(png), rgba=rgba
+    )
+    _COMPANY_SIGNATURE = cached
+    return cached
+
+
+def warm_company_signature() -> bool:
+    """Старт воркера (первый запрос wsgi / pdf_worker): подпись в кэш до первого запроса; ошибки БД/storage не мешают старту."""
+    try:
+        return get_company_signature() is not None
+    except Exception:
+        return False
+
+
 @dataclass(frozen=True)
 class ContractPdfBuildResult:
     pdf_bytes: bytes
     filename: str
+    fingerprint: str = ""
 
 
 class ContractPdfCreator:
@@ -143,6 +278,11 @@ class ContractPdfCreator:
         self.client = self.contract.client
         self.content: dict = {}
         self.y: float = 0.0
+        # позиции для наложения подписей: {"buyer": {...}, "company": {...}}, page — индекс страницы с 0
+        self.anchors: dict[str, dict[str, float]] = {}
+        # дата у подписи (Ort, Datum); regenerate_pdfs подставляет исходную дату документа
+        self.render_date: date = timezone.localdate()
+        self.profile: str = pdf_output_profile()
 
     @property
     def content_width(self) -> float:
@@ -154,23 +294,36 @@ class ContractPdfCreator:
     def _cursor_gap(self, gap: float) -> None:
         self.y -= gap
 
-    def _build_paragraph(
+    def _layout_paragraph(
         self,
         text: str,
         font_size: float,
+        width: float,
         *,
         font_name: str | None = None,
         alignment: int = TA_JUSTIFY,
-    ) -> Paragraph:
+    ) -> tuple[Paragraph, float]:
+        """
+        (Paragraph после wrap(width), height) из кэша разметки — строки уже разбиты, drawOn без повторного wrap.
+        Возвращается поверхностная копия: drawOn пишет self.canv, потоки не делят один объект.
+        """
         paragraph_text = _format_text(text).replace("\t", "&nbsp;&nbsp;&nbsp;&nbsp;").replace("\n", "<br/>")
-        style = ParagraphStyle(
-            name="contract-text",
-            fontName=font_name or self.FONT_FAMILY,
-            fontSize=font_size,
-            leading=font_size * 1.2,
-            alignment=alignment,
-        )
-        return Paragraph(paragraph_text, style)
+        font_name = font_name or self.FONT_FAMILY
+        key = (paragraph_text, font_name, float(font_size), alignment, float(width))
+        with _PARAGRAPH_LAYOUT_LOCK:
+            cached = _PARAGRAPH_LAYOUT_CACHE.get(key)
+            if cached is not None:
+                _PARAGRAPH_LAYOUT_CACHE.move_to_end(key)
+        if cached is None:
+            paragraph = Paragraph(paragraph_text, _paragraph_style(font_name, font_size, alignment))
+            _, h = paragraph.wrap(width, self.PAGE_SIZE[1])
+            cached = (paragraph, h)
+            with _PARAGRAPH_LAYOUT_LOCK:
+                _PARAGRAPH_LAYOUT_CACHE[key] = cached
+                if len(_PARAGRAPH_LAYOUT_CACHE) > _PARAGRAPH_LAYOUT_CACHE_MAX:
+                    _PARAGRAPH_LAYOUT_CACHE.popitem(last=False)
+        paragraph, h = cached
+        return copy.copy(paragraph), h
 
     def _split_paragraphs(self, text: str) -> list[str]:
         normalized = _format_text(text)
@@ -187,8 +340,7 @@ class ContractPdfCreator:
         for idx, part in enumerate(parts):
             if idx > 0:
                 y -= self.PARAGRAPH_TOP_GAP
-            paragraph = self._build_paragraph(part, size)
-            _, h = paragraph.wrap(width, self.PAGE_SIZE[1])
+            paragraph, h = self._layout_paragraph(part, size, width)
             paragraph.drawOn(c, x, y - h)
             y -= h
         self.y = y
@@ -214,8 +366,7 @@ class ContractPdfCreator:
                 marker = m.group(1)
                 line_text = m.group(2)
 
-            paragraph = self._build_paragraph(line_text, size)
-            _, h = paragraph.wrap(max(width, 1), self.PAGE_SIZE[1])
+            paragraph, h = self._layout_paragraph(line_text, size, max(width, 1))
 
             if marker:
                 c.setFont(self.FONT_FAMILY, size)
@@ -242,11 +393,8 @@ class ContractPdfCreator:
         padding = 6.0
         parts = self._split_paragraphs(text)
         inner_width = max(width - (padding * 2), 1)
-        paragraph_heights: list[float] = []
-        for part in parts:
-            paragraph = self._build_paragraph(part, size)
-            _, h = paragraph.wrap(inner_width, self.PAGE_SIZE[1])
-            paragraph_heights.append(h)
+        paragraphs = [self._layout_paragraph(part, size, inner_width) for part in parts]
+        paragraph_heights = [h for _, h in paragraphs]
         total_text_h = sum(paragraph_heights)
         if len(paragraph_heights) > 1:
             total_text_h += self.PARAGRAPH_TOP_GAP * (len(paragraph_heights) - 1)
@@ -257,11 +405,9 @@ class ContractPdfCreator:
         c.rect(x, y_bottom, width, box_height)
 
         draw_y = y - padding
-        for idx, part in enumerate(parts):
+        for idx, (paragraph, h) in enumerate(paragraphs):
             if idx > 0:
                 draw_y -= self.PARAGRAPH_TOP_GAP
-            paragraph = self._build_paragraph(part, size)
-            _, h = paragraph.wrap(inner_width, self.PAGE_SIZE[1])
             paragraph.drawOn(c, x + padding, draw_y - h)
             draw_y -= h
         self.y = y_bottom
@@ -273,8 +419,7 @@ class ContractPdfCreator:
             return 0.0
         total = 0.0
         for idx, part in enumerate(parts):
-            paragraph = self._build_paragraph(part, font_size)
-            _, h = paragraph.wrap(max(width, 1), self.PAGE_SIZE[1])
+            _, h = self._layout_paragraph(part, font_size, max(width, 1))
             total += h
             if idx > 0:
                 total += self.PARAGRAPH_TOP_GAP
@@ -311,8 +456,7 @@ class ContractPdfCreator:
     ) -> None:
         if not _format_text(text).strip():
             return
-        paragraph = self._build_paragraph(text, font_size, font_name=font_name, alignment=alignment)
-        _, h = paragraph.wrap(max(width, 1), self.PAGE_SIZE[1])
+        paragraph, h = self._layout_paragraph(text, font_size, max(width, 1), font_name=font_name, alignment=alignment)
         paragraph.drawOn(c, x, y_top - top_pad - h)
 
     def draw_table(
@@ -364,23 +508,23 @@ class ContractPdfCreator:
                 content_w = max(cell_w - 8, 1)
                 label_h = 0.0
                 if label.strip():
-                    label_p = self._build_paragraph(
+                    _, label_h = self._layout_paragraph(
                         label,
                         label_font_size,
+                        content_w,
                         font_name=self.FONT_FAMILY_BOLD if label_bold else self.FONT_FAMILY,
                         alignment=label_align,
                     )
-                    _, label_h = label_p.wrap(content_w, self.PAGE_SIZE[1])
 
                 value_h = 0.0
                 if value.strip():
-                    value_p = self._build_paragraph(
+                    _, value_h = self._layout_paragraph(
                         value,
                         value_size,
+                        content_w,
                         font_name=self.FONT_FAMILY_BOLD if value_bold else self.FONT_FAMILY,
                         alignment=value_align,
                     )
-                    _, value_h = value_p.wrap(content_w, self.PAGE_SIZE[1])
 
                 needed_h = max(label_top_pad + label_h, value_top_pad + value_h) + row_bottom_pad
                 row_needed_h = max(row_needed_h, needed_h)
@@ -477,11 +621,11 @@ class ContractPdfCreator:
         x_text = x_currency + currency_w + gap
         text_w = max(inner_w - (x_text - inner_x), 1)
 
-        row_heights: list[float] = []
-        for row in rows:
-            p = self._build_paragraph(_format_text(row.get("text", "")), size)
-            _, h = p.wrap(max(text_w - (padding * 2), 1), self.PAGE_SIZE[1])
-            row_heights.append(max(h, size * 1.2))
+        row_paragraphs = [
+            self._layout_paragraph(_format_text(row.get("text", "")), size, max(text_w - (padding * 2), 1))
+            for row in rows
+        ]
+        row_heights = [max(h, size * 1.2) for _, h in row_paragraphs]
 
         baselines: list[float] = []
         baseline_cursor = y - calc_padding_top
@@ -527,9 +671,7 @@ class ContractPdfCreator:
                 c.setLineWidth(0.7)
                 c.line(x_value + 2, line_y, x_currency + currency_w - 2, line_y)
 
-            p = self._build_paragraph(_format_text(row.get("text", "")), size)
-            p.wrap(max(text_w - (padding * 2), 1), self.PAGE_SIZE[1])
-            p.drawOn(c, x_text, draw_y - h)
+            row_paragraphs[idx][0].drawOn(c, x_text, draw_y - h)
             draw_y -= h
 
         self.y = y_bottom
@@ -572,23 +714,18 @@ class ContractPdfCreator:
 
     @staticmethod
     def _load_signature_from_field(file_field) -> Image.Image | None:
-        if not file_field:
-            return None
-        try:
-            file_field.open("rb")
-            raw = file_field.read()
-        except Exception:
-            return None
-        finally:
-            try:
-                file_field.close()
-            except Exception:
-                pass
-        return _prepare_signature_image(raw)
+        raw = _read_file_field_bytes(file_field)
+        return _prepare_signature_image(raw) if raw else None
 
     def _get_company_footer_city_date_text(self) -> str:
         return ""
 
+    def _get_buyer_city_date_text(self) -> str:
+        # дата подписи клиента: render_date подписанного PDF (в неподписанном строка пустая)
+        city = (self.client.city or "").strip()
+        today = format_date(self.render_date, format="dd.MM.yyyy", locale="de_DE")
+        return ", ".join([v for v in [city, today] if v])
+
     def _get_company_footer_sign_name_text(self) -> str:
         return "(FleXXLager GmbH & Co. KG)"
 
@@ -612,6 +749,8 @@ class ContractPdfCreator:
         draw_h = img_h * scale
         draw_x = area_x if align_left else area_x + ((area_w - draw_w) / 2.0)
         draw_y = area_y + ((area_h - draw_h) / 2.0) + self.SIGNATURE_SHIFT_Y
+        if self.profile == PDF_PROFILE_COMPACT:
+            signature_image = signature_for_print(signature_image, draw_w, draw_h)
         c.drawImage(
             ImageReader(signature_image),
             draw_x,
@@ -621,6 +760,17 @@ class ContractPdfCreator:
             mask="auto",
         )
 
+    def _draw_signature_area(self, c: Canvas, signature_image: Image.Image, area: dict[str, float]) -> None:
+        self._draw_signature_image(
+            c,
+            signature_image,
+            area_x=area["area_x"],
+            area_y=area["area_y"],
+            area_w=area["area_w"],
+            area_h=area["area_h"],
+            align_left=True,
+        )
+
     def draw_buyer_signature_block(
         self,
         c: Canvas,
@@ -639,9 +789,9 @@ class ContractPdfCreator:
         c.line(left_x1, line_y, left_x2, line_y)
         c.line(right_x1, line_y, right_x2, line_y)
 
-        city = (self.client.city or "").strip()
-        today = format_date(timezone.localdate(), format="dd.MM.yyyy", locale="de_DE")
-        city_date_text = ", ".join([v for v in [city, today] if v])
+        buyer_signature_image = self._get_buyer_signature_image()
+        # Ort, Datum — только вместе с подписью (при подписании — наложением, stamp), иначе дата финализации
+        city_date_text = self._get_buyer_city_date_text() if buyer_signature_image is not None else ""
         full_name = f"{(self.client.first_name or '').strip()} {(self.client.last_name or '').strip()}".strip()
         sign_name_text = f"({full_name})" if full_name else ""
         top_text_y = line_y + 3.0
@@ -652,17 +802,18 @@ class ContractPdfCreator:
             sign_name_w = c.stringWidth(sign_name_text, self.FONT_FAMILY, self.FONT_SIZE_TEXT)
             c.drawString(max(right_x2 - sign_name_w, right_x1), top_text_y, sign_name_text)
 
-        buyer_signature_image = self._get_buyer_signature_image()
+        area = {
+            "page": c.getPageNumber() - 1,
+            "area_x": right_x1 + 8.0,
+            "area_y": line_y - 35.0,
+            "area_w": max((right_x2 - right_x1) - 16.0, 1.0),
+            "area_h": 48.0,
+            "text_x": left_x1,
+            "text_y": top_text_y,
+        }
+        self.anchors["buyer"] = area
         if buyer_signature_image is not None:
-            self._draw_signature_image(
-                c,
-                buyer_signature_image,
-                area_x=right_x1 + 8.0,
-                area_y=line_y - 35.0,
-                area_w=max((right_x2 - right_x1) - 16.0, 1.0),
-                area_h=48.0,
-                align_left=True,
-            )
+            self._draw_signature_area(c, buyer_signature_image, area)
 
         c.setFont(self.FONT_FAMILY, self.FONT_SIZE_SMALL)
         c.drawString(left_x1, label_y, "Ort, Datum")
@@ -743,17 +894,19 @@ class ContractPdfCreator:
             sign_name_w = c.stringWidth(sign_name_text, self.FONT_FAMILY, self.FONT_SIZE_TEXT)
             c.drawString(max(right_x2 - sign_name_w, right_x1), top_text_y, sign_name_text)
 
+        area = {
+            "page": c.getPageNumber() - 1,
+            "area_x": right_x1 + 8.0,
+            "area_y": line_y - 35.0,
+            "area_w": max((right_x2 - right_x1) - 16.0, 1.0),
+            "area_h": 48.0,
+            "text_x": left_x1,
+            "text_y": top_text_y,
+        }
+        self.anchors["company"] = area
         company_signature_image = self._get_company_signature_image()
         if company_signature_image is not None:
-            self._draw_signature_image(
-                c,
-                company_signature_image,
-                area_x=right_x1 + 8.0,
-                area_y=line_y - 35.0,
-                area_w=max((right_x2 - right_x1) - 16.0, 1.0),
-                area_h=48.0,
-                align_left=True,
-            )
+            self._draw_signature_area(c, company_signature_image, area)
 
         c.setFont(self.FONT_FAMILY, self.FONT_SIZE_SMALL)
         c.drawString(left_x1, label_y, "Ort, Datum")
@@ -813,15 +966,7 @@ class ContractPdfCreator:
             self.y = y
             return self.y
 
-        rows = build_stueckzinsen_rows_for_issue(
-            issue_date=self.issue.issue_date,
-            term_months=self.issue.term_months,
-            interest_rate_percent=Decimal(self.issue.interest_rate),
-            nominal_value=Decimal(self.issue.bond_price),
-            decimals=6,
-            holiday_country="DE",
-            holiday_subdiv=None,
-        )
+        rows = get_issue_stueckzins_rows(self.issue)
         period_start = self.issue.issue_date
         try:
             period_end = period_start.replace(year=period_start.year + 1) - timedelta(days=1)
@@ -841,15 +986,14 @@ class ContractPdfCreator:
         num_h_max = 0.0
         date_h_max = 0.0
         for r in period_rows:
-            p_num = self._build_paragraph(r.stueckzins_de, self.FONT_SIZE_SMALL)
-            _, h_num = p_num.wrap(num_w, self.PAGE_SIZE[1])
+            _, h_num = self._layout_paragraph(r.stueckzins_de, self.FONT_SIZE_SMALL, num_w)
             num_h_max = max(num_h_max, h_num)
 
-            p_date = self._build_paragraph(
+            _, h_date = self._layout_paragraph(
                 format_date(r.pay_date, format="d. LLL yy", locale="de_DE"),
                 self.FONT_SIZE_SMALL,
+                date_w,
             )
-            _, h_date = p_date.wrap(date_w, self.PAGE_SIZE[1])
             date_h_max = max(date_h_max, h_date)
 
         row_h = max(content_top_pad + num_h_max, content_top_pad + date_h_max) + content_bottom_pad
@@ -1025,10 +1169,8 @@ class ContractPdfCreator:
             "text_block_8": _format_text(issue_contract.get("ergaenzung_beispiel")),
         }
 
-    def build(self) -> ContractPdfBuildResult:
-        self.load_content()
-        buffer = BytesIO()
-        c = rl_canvas.Canvas(buffer, pagesize=self.PAGE_SIZE)
+    def draw_contract_pages(self, c: Canvas) -> None:
+        """Страницы 1–2: данные покупателя, расчёт, подписи — на каждый договор."""
         self._cursor_reset()
 
         self.draw_text(c, self.content.get("header_1", ""), font_size=self.FONT_SIZE_HEADER_1)
@@ -1119,7 +1261,8 @@ class ContractPdfCreator:
         self.draw_company_acceptance_block(c, gap_between_lines=40.0)
         self.draw_bottom_company_footer(c)
 
-        c.showPage()
+    def draw_issue_pages(self, c: Canvas) -> None:
+        """Страницы 3+: Ergänzung + Stückzinstabelle — только от эмиссии (кэшируются, см. issue_pages_pdf)."""
         self._cursor_reset()
         self.draw_text(c, self.content.get("header_3", ""), font_size=self.FONT_SIZE_HEADER_2)
         self._cursor_gap(self.BLOCK_GAP_MD)
@@ -1139,16 +1282,159 @@ class ContractPdfCreator:
         self._cursor_gap(self.BLOCK_GAP_LG + 5.0)
         self.draw_framed_text(c, framed_text)
 
+    def issue_pages_key(self) -> str:
+        raw = json.dumps(
+            [
+                ISSUE_PAGES_RENDER_VERSION,
+                stueckzins_table_key(self.issue),
+                str(self.issue.bond_price),
+                self.content.get("header_3", ""),
+                self.content.get("text_block_7", ""),
+                self.content.get("text_block_8", ""),
+            ],
+            ensure_ascii=False,
+        )
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def issue_pages_pdf(self) -> bytes:
+        """PDF страниц 3+ из кэша процесса; рендер только при новой эмиссии / изменённом ключе."""
+        key = self.issue_pages_key()
+        with _ISSUE_PAGES_LOCK:
+            cached = _ISSUE_PAGES_CACHE.get(self.issue.id)
+            if cached is not None and cached[0] == key:
+                _ISSUE_PAGES_CACHE.move_to_end(self.issue.id)
+                return cached[1]
+
+        buffer = BytesIO()
+        c = pdf_canvas(buffer, pagesize=self.PAGE_SIZE)  # без даты: фрагмент общий для всех дат рендера
+        self.draw_issue_pages(c)
+        c.save()
+        pdf_bytes = buffer.getvalue()
+        with _ISSUE_PAGES_LOCK:
+            _ISSUE_PAGES_CACHE[self.issue.id] = (key, pdf_bytes)
+            _ISSUE_PAGES_CACHE.move_to_end(self.issue.id)
+            if len(_ISSUE_PAGES_CACHE) > _ISSUE_PAGES_CACHE_MAX:
+                _ISSUE_PAGES_CACHE.popitem(last=False)
+        return pdf_bytes
+
+    def input_parts(self) -> list:
+        """Всё, от чего зависит PDF: вёрстка, профиль, дата, содержимое (клиент / эмиссия / суммы), страницы 3+."""
+        self.load_content()
+        return [
+            CONTRACT_PDF_RENDER_VERSION,
+            type(self).__name__,
+            self.profile,
+            self.render_date.isoformat(),
+            self.contract.id,
+            [self.contract.bonds_quantity, self.contract.nominal_amount, self.contract.nominal_amount_plus_percent],
+            self.content,
+            self.issue_pages_key(),
+        ]
+
+    def input_fingerprint(self) -> str:
+        return input_fingerprint(self.input_parts())
+
+    def build(self) -> ContractPdfBuildResult:
+        self.load_content()
+        buffer = BytesIO()
+        c = pdf_canvas(buffer, pagesize=self.PAGE_SIZE, render_date=self.render_date)
+        self.draw_contract_pages(c)
         c.save()
         return ContractPdfBuildResult(
-            pdf_bytes=buffer.getvalue(),
+            pdf_bytes=_concat_pdfs(
+                buffer.getvalue(),
+                self.issue_pages_pdf(),
+                anchors=self.anchors,
+                profile=self.profile,
+            ),
             filename=f"FleXXLager-Vertrag-IN{self.contract.id}.pdf",
         )
 
+    def stamp(self, pdf_bytes: bytes, *, buyer: bool = False, company: bool = False) -> bytes | None:
+        """
+        Накладывает подпись покупателя и/или FleXXLager (+ Ort, Datum) на готовый PDF по его /FlexxAnchors.
+        None — в PDF нет anchors (старый файл), нужен полный рендер.
+        """
+        with pikepdf.open(BytesIO(pdf_bytes)) as pdf:
+            try:
+                anchors = json.loads(str(pdf.docinfo.get(PDF_ANCHORS_KEY, "")))
+            except ValueError:
+                return None
+            stamps: list[tuple[dict[str, float], Image.Image, str]] = []
+            if buyer:
+                # без text_x (PDF до 2026-10-17) в файле уже дата финализации — только полный рендер
+                if "text_x" not in anchors.get("buyer", {}) or self._get_buyer_signature_image() is None:
+                    return None
+                stamps.append((anchors["buyer"], self._get_buyer_signature_image(), self._get_buyer_city_date_text()))
+            if company:
+                if "company" not in anchors or self._get_company_signature_image() is None:
+                    return None
+                stamps.append(
+                    (anchors["company"], self._get_company_signature_image(), self._get_company_footer_city_date_text())
+                )
+
+            pages = sorted({int(area["page"]) for area, _, _ in stamps})
+            buffer = BytesIO()
+            c = pdf_canvas(buffer, pagesize=self.PAGE_SIZE)
+            for page in pages:
+                for area, image, city_date_text in stamps:
+                    if int(area["page"]) != page:
+                        continue
+                    if city_date_text:
+                        c.setFont(self.FONT_FAMILY, self.FONT_SIZE_TEXT)
+                        c.drawString(area["text_x"], area["text_y"], city_date_text)
+                    self._draw_signature_area(c, image, area)
+                c.showPage()
+            c.save()
+
+            with pikepdf.open(BytesIO(buffer.getvalue())) as overlay:
+                for overlay_page, page in zip(overlay.pages, pages):
+                    pdf.pages[page].add_overlay(overlay_page)
+                pdf.docinfo["/ModDate"] = pdf_date(self.render_date)
+                return save_pdf(pdf, profile=self.profile)
+
 
-def build_contract_pdf(contract_id: int) -> ContractPdfBuildResult:
-    creator = ContractPdfCreator(contract_id)
-    return creator.build()
+def _concat_pdfs(*parts: bytes, anchors: dict | None = None, profile: str | None = None) -> bytes:
+    with pikepdf.open(BytesIO(parts[0])) as pdf:
+        for part in parts[1:]:
+            with pikepdf.open(BytesIO(part)) as tail:
+                pdf.pages.extend(tail.pages)
+        if anchors:
+            pdf.docinfo[PDF_ANCHORS_KEY] = json.dumps(anchors, sort_keys=True)
+        return save_pdf(pdf, profile=profile)
+
+
+def _build_with(
+    creator: ContractPdfCreator,
+    *,
+    render_date: date | None,
+    profile: str | None,
+    previous_fingerprint: str | None = None,
+) -> ContractPdfBuildResult | None:
+    """None — отпечаток входа равен previous_fingerprint: сохранённый PDF актуален, рендер не нужен."""
+    if render_date is not None:
+        creator.render_date = render_date
+    if profile is not None:
+        creator.profile = pdf_output_profile(profile)
+    fingerprint = creator.input_fingerprint()
+    if previous_fingerprint is not None and fingerprint == previous_fingerprint:
+        return None
+    return replace(creator.build(), fingerprint=fingerprint)
+
+
+def build_contract_pdf(
+    contract_id: int,
+    *,
+    render_date: date | None = None,
+    profile: str | None = None,
+    previous_fingerprint: str | None = None,
+) -> ContractPdfBuildResult | None:
+    return _build_with(
+        ContractPdfCreator(contract_id),
+        render_date=render_date,
+        profile=profile,
+        previous_fingerprint=previous_fingerprint,
+    )
 
 
 class ClientSignedContractPdfCreator(ContractPdfCreator):
@@ -1165,10 +1451,18 @@ class ClientSignedContractPdfCreator(ContractPdfCreator):
     def _get_company_signature_image(self) -> Image.Image | None:
         return self._company_signature_image
 
+    def input_parts(self) -> list:
+        # наложение на сохранённый contract_pdf: его байты и подпись клиента — тоже вход
+        return [*super().input_parts(), file_sha256(self.contract.contract_pdf), file_sha256(self.contract.signature)]
+
     def build(self) -> ContractPdfBuildResult:
-        result = super().build()
+        # подпись на сохранённый contract_pdf — ровно тот текст, который видел клиент
+        base = _read_file_field_bytes(self.contract.contract_pdf)
+        pdf_bytes = self.stamp(base, buyer=True) if base else None
+        if pdf_bytes is None:
+            pdf_bytes = super().build().pdf_bytes
         return ContractPdfBuildResult(
-            pdf_bytes=result.pdf_bytes,
+            pdf_bytes=pdf_bytes,
             filename=f"FleXXLager-Vertrag-IN{self.contract.id}-signed.pdf",
         )
 
@@ -1176,28 +1470,57 @@ class ClientSignedContractPdfCreator(ContractPdfCreator):
 class FullySignedContractPdfCreator(ClientSignedContractPdfCreator):
     def __init__(self, contract_id: int):
         super().__init__(contract_id)
-        flexxlager_signature = FlexxlagerSignature.objects.first()
-        if flexxlager_signature and flexxlager_signature.signature:
-            self._company_signature_image = self._load_signature_from_field(flexxlager_signature.signature)
+        company_signature = get_company_signature()
+        self._company_signature_image = company_signature.image if company_signature else None
         if self._company_signature_image is None:
             raise ValueError("FleXXLager-Signatur fehlt.")
 
     def _get_company_footer_city_date_text(self) -> str:
-        return f"Siegen, {format_date(timezone.localdate(), format='dd.MM.yyyy', locale='de_DE')}"
+        return f"Siegen, {format_date(self.render_date, format='dd.MM.yyyy', locale='de_DE')}"
+
+    def input_parts(self) -> list:
+        company_signature = get_company_signature()
+        return [
+            *super().input_parts(),
+            file_sha256(self.contract.contract_pdf_signed),
+            company_signature.sha256 if company_signature else "",
+        ]
 
     def build(self) -> ContractPdfBuildResult:
-        result = super().build()
+        base = _read_file_field_bytes(self.contract.contract_pdf_signed)
+        pdf_bytes = self.stamp(base, company=True) if base else None
+        if pdf_bytes is None:
+            pdf_bytes = ContractPdfCreator.build(self).pdf_bytes
         return ContractPdfBuildResult(
-            pdf_bytes=result.pdf_bytes,
+            pdf_bytes=pdf_bytes,
             filename=f"FleXXLager-Vertrag-IN{self.contract.id}-paid.pdf",
         )
 
 
-def build_contract_pdf_signed(contract_id: int) -> ContractPdfBuildResult:
-    creator = FullySignedContractPdfCreator(contract_id)
-    return creator.build()
-
-
-def build_contract_pdf_client_signed(contract_id: int) -> ContractPdfBuildResult:
-    creator = ClientSignedContractPdfCreator(contract_id)
-    return creator.build()
+def build_contract_pdf_signed(
+    contract_id: int,
+    *,
+    render_date: date | None = None,
+    profile: str | None = None,
+    previous_fingerprint: str | None = None,
+) -> ContractPdfBuildResult | None:
+    return _build_with(
+        FullySignedContractPdfCreator(contract_id),
+        render_date=render_date,
+        profile=profile,
+        previous_fingerprint=previous_fingerprint,
+    )
+
+
+def build_contract_pdf_client_signed(
+    contract_id: int,
+    *,
+    profile: str | None = None,
+    previous_fingerprint: str | None = None,
+) -> ContractPdfBuildResult | None:
+    return _build_with(
+        ClientSignedContractPdfCreator(contract_id),
+        render_date=None,
+        profile=profile,
+        previous_fingerprint=previous_fingerprint,
+    )
@@ -0,0 +1,54 @@
+# FILE: web/flexx/pdf_fingerprint.py  (новое — 2026-10-17)
+# PURPOSE: Отпечаток входных данных сохранённых PDF (Contract / TippgeberContract.pdf_fingerprints):
+#          {поле файла: {"fingerprint": sha256 входа рендера, "sha256": sha256 записанного PDF}}.
+#          Тот же отпечаток, файл на месте и его sha256 совпадает -> рендер не нужен (регенерация, повтор задания).
+#          Сравнимо только при детерминированных метаданных PDF (дата / ID — pdf_output.pdf_canvas, save_pdf).
+
+from __future__ import annotations
+
+import hashlib
+import json
+
+_READ_CHUNK = 1024 * 1024
+
+
+def input_fingerprint(parts) -> str:
+    """sha256 JSON-представления входных данных (Decimal / date — через str)."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def bytes_sha256(content: bytes | None) -> str:
+    return hashlib.sha256(content).hexdigest() if content else ""
+
+
+def file_sha256(file_field) -> str:
+    """sha256 файла FileField по частям; "" — файла нет / не читается."""
+    if not file_field:
+        return ""
+    digest = hashlib.sha256()
+    try:
+        with file_field.storage.open(file_field.name, "rb") as stored:
+            for chunk in iter(lambda: stored.read(_READ_CHUNK), b""):
+                digest.update(chunk)
+    except OSError:
+        return ""
+    return digest.hexdigest()
+
+
+def stored_pdf_fingerprint(obj, field_name: str) -> str | None:
+    """Отпечаток сохранённого PDF, если файл на месте и не менялся после записи (sha256); иначе None — рендерить."""
+    entry = (obj.pdf_fingerprints or {}).get(field_name) or {}
+    if not entry.get("fingerprint") or not entry.get("sha256"):
+        return None
+    if file_sha256(getattr(obj, field_name)) != entry["sha256"]:
+        return None
+    return entry["fingerprint"]
+
+
+def record_pdf_fingerprint(obj, field_name: str, fingerprint: str, pdf_bytes: bytes) -> None:
+    """Запись в obj.pdf_fingerprints (без save — сохраняет вызывающий вместе с полем файла)."""
+    obj.pdf_fingerprints = {
+        **(obj.pdf_fingerprints or {}),
+        field_name: {"fingerprint": fingerprint, "sha256": bytes_sha256(pdf_bytes)},
+    }
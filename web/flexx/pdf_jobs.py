@@ -0,0 +1,354 @@
+# FILE: web/flexx/pdf_jobs.py  (новое — 2026-10-17)
+# PURPOSE: Фоновая генерация PDF договора: view только меняет статус и ставит PdfRenderJob,
+#          воркер (manage.py pdf_worker) рендерит PDF (ReportLab) и отправляет письма (SMTP) вне запроса.
+#          settings.PDF_RENDER_ASYNC = False — задание выполняется сразу после commit в том же процессе (как раньше).
+#          Повтор задания с неизменным входом (отпечаток в Contract.pdf_fingerprints) файл не перерисовывает.
+
+from __future__ import annotations
+
+from datetime import timedelta
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+
+from flexx.emailer import (
+    send_client_contract_created_email,
+    send_client_contract_created_notify_email,
+    send_client_contract_signed_email,
+    send_client_contract_signed_notify_email,
+    send_contract_paid_received_email,
+)
+from flexx.models import Contract, PdfRenderJob
+from flexx.pdf_contract import (
+    ContractPdfBuildResult,
+    build_contract_pdf,
+    build_contract_pdf_client_signed,
+    build_contract_pdf_signed,
+)
+from flexx.pdf_fingerprint import record_pdf_fingerprint, stored_pdf_fingerprint
+
+logger = logging.getLogger(__name__)
+
+PDF_JOB_MAX_ATTEMPTS = 3
+PDF_JOB_OPEN_STATUSES = frozenset({PdfRenderJob.Status.PENDING, PdfRenderJob.Status.RUNNING})
+# RUNNING дольше этого — воркер умер посреди задания, задание снова в очередь.
+PDF_JOB_STALE_AFTER = timedelta(minutes=10)
+
+# Kind -> поле Contract, которое заполняет задание.
+PDF_JOB_TARGET_FIELDS = {
+    PdfRenderJob.Kind.CREATED: "contract_pdf",
+    PdfRenderJob.Kind.SIGNED: "contract_pdf_signed",
+    PdfRenderJob.Kind.PAID: "contract_pdf_signed_signed",
+}
+
+def read_file_field_bytes(file_field) -> bytes | None:
+    if not file_field:
+        return None
+    try:
+        file_field.open("rb")
+        return file_field.read()
+    except Exception:
+        return None
+    finally:
+        try:
+            file_field.close()
+        except Exception:
+            pass
+
+
+def build_client_contract_email_payload(
+    contract: Contract,
+    *,
+    primary_pdf_field_name: str,
+) -> tuple[list[tuple[str, bytes, str]], str, bool]:
+    attachments: list[tuple[str, bytes, str]] = []
+    file_lines: list[str] = []
+    has_contract_pdf = False
+
+    primary_pdf_field = getattr(contract, primary_pdf_field_name)
+    contract_pdf_bytes = read_file_field_bytes(primary_pdf_field)
+    contract_pdf_name = os.path.basename(primary_pdf_field.name) if primary_pdf_field else ""
+    if contract_pdf_bytes and contract_pdf_name:
+        attachments.append((contract_pdf_name, contract_pdf_bytes, "application/pdf"))
+        has_contract_pdf = True
+
+    issue_attachments = sorted(
+        list(contract.issue.attachments.all()),
+        key=lambda a: (((a.description or "").strip().lower()), a.id),
+    )
+    for attachment in issue_attachments:
+        filename = os.path.basename(attachment.file.name or "")
+        if not filename.lower().endswith(".pdf"):
+            continue
+        raw_bytes = read_file_field_bytes(attachment.file)
+        if not raw_bytes:
+            continue
+        description = (attachment.description or "").strip() or filename
+        file_lines.append(f"* {description}")
+        attachments.append((filename, raw_bytes, "application/pdf"))
+
+    return attachments, "\n".join(file_lines), has_contract_pdf
+
+
+# ---------------- очередь ----------------
+
+
+def enqueue_pdf_job(contract: Contract, kind: str, *, notify: bool = True) -> PdfRenderJob:
+    """Ставит задание; без PDF_RENDER_ASYNC выполняет его сразу после commit текущей транзакции."""
+    job = PdfRenderJob.objects.create(contract=contract, kind=kind, notify=notify)
+    if not getattr(settings, "PDF_RENDER_ASYNC", False):
+        transaction.on_commit(lambda: run_pdf_job(job, retry=False))
+    return job
+
+
+def claim_next_pdf_job() -> PdfRenderJob | None:
+    """Берёт самое старое PENDING-задание (SKIP LOCKED — несколько воркеров не берут одно и то же)."""
+    with transaction.atomic():
+        job = (
+            PdfRenderJob.objects.select_for_update(skip_locked=True)
+            .filter(status=PdfRenderJob.Status.PENDING)
+            .order_by("id")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = PdfRenderJob.Status.RUNNING
+        job.started_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=["status", "started_at", "attempts"])
+    return job
+
+
+def requeue_stale_pdf_jobs() -> int:
+    return PdfRenderJob.objects.filter(
+        status=PdfRenderJob.Status.RUNNING,
+        started_at__lt=timezone.now() - PDF_JOB_STALE_AFTER,
+    ).update(status=PdfRenderJob.Status.PENDING)
+
+
+def requeue_pdf_jobs(queryset) -> int:
+    """Ручной повтор (Django-Admin): FAILED -> PENDING, счётчик попыток с нуля."""
+    return queryset.filter(status=PdfRenderJob.Status.FAILED).update(
+        status=PdfRenderJob.Status.PENDING,
+        attempts=0,
+        last_error="",
+        finished_at=None,
+    )
+
+
+def run_pdf_job(job: PdfRenderJob, *, retry: bool = True) -> PdfRenderJob:
+    """
+    Выполняет задание. Ошибка PDF: до PDF_JOB_MAX_ATTEMPTS попыток снова PENDING, затем FAILED.
+    Ошибки писем не повторяются (иначе дубли) — last_error + MAIL_FAILED (PDF готов, админ видит в списке договоров).
+    """
+    if job.status != PdfRenderJob.Status.RUNNING:
+        job.status = PdfRenderJob.Status.RUNNING
+        job.started_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=["status", "started_at", "attempts"])
+
+    try:
+        contract = (
+            Contract.objects.select_related("issue", "client")
+            .prefetch_related("issue__attachments")
+            .get(id=job.contract_id)
+        )
+        mail_errors = _PDF_JOB_HANDLERS[job.kind](job, contract)
+    except Exception as exc:
+        logger.exception("PDF_JOB_ERROR job=%s kind=%s contract=%s", job.id, job.kind, job.contract_id)
+        job.last_error = f"{type(exc).__name__}: {exc}"
+        if retry and job.attempts < PDF_JOB_MAX_ATTEMPTS:
+            job.status = PdfRenderJob.Status.PENDING
+        else:
+            job.status = PdfRenderJob.Status.FAILED
+    else:
+        job.last_error = "\n".join(mail_errors)
+        job.status = PdfRenderJob.Status.MAIL_FAILED if mail_errors else PdfRenderJob.Status.DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "last_error", "finished_at"])
+    return job
+
+
+def run_pending_pdf_jobs(limit: int | None = None) -> int:
+    done = 0
+    while limit is None or done < limit:
+        job = claim_next_pdf_job()
+        if job is None:
+            break
+        run_pdf_job(job)
+        done += 1
+    return done
+
+
+# ---------------- состояние для UI ----------------
+
+
+def pdf_job_states(contract_ids) -> dict[int, dict[str, str]]:
+    """contract_id -> {kind: status} последнего незавершённого задания каждого вида (DONE не попадают)."""
+    latest: dict[int, dict[str, str]] = {}
+    for contract_id, kind, status in (
+        PdfRenderJob.objects.filter(contract_id__in=list(contract_ids))
+        .order_by("id")
+        .values_list("contract_id", "kind", "status")
+    ):
+        latest.setdefault(contract_id, {})[kind] = status
+    return {
+        contract_id: {kind: status for kind, status in kinds.items() if status != PdfRenderJob.Status.DONE}
+        for contract_id, kinds in latest.items()
+    }
+
+
+def annotate_pdf_jobs(contracts) -> None:
+    """
+    contract.pdf_jobs = {kind: status} (одним запросом на список) — для шаблонов и проверок статуса;
+    contract.pdf_jobs_open / pdf_jobs_failed — множества kind (для шаблонов: «wird vorbereitet» / ошибка).
+    """
+    contracts = list(contracts)
+    states = pdf_job_states(c.id for c in contracts)
+    for c in contracts:
+        c.pdf_jobs = states.get(c.id, {})
+        c.pdf_jobs_open = {kind for kind, status in c.pdf_jobs.items() if status in PDF_JOB_OPEN_STATUSES}
+        c.pdf_jobs_failed = {kind for kind, status in c.pdf_jobs.items() if status == PdfRenderJob.Status.FAILED}
+
+
+def pdf_job_open(contract: Contract, kind: str) -> bool:
+    """Задание в очереди или в работе — документ «wird vorbereitet»."""
+    return getattr(contract, "pdf_jobs", {}).get(kind) in PDF_JOB_OPEN_STATUSES
+
+
+def pdf_job_failed(contract: Contract, kind: str) -> bool:
+    """PDF не создан (FAILED): действие клиента (Finalisieren / Unterzeichnen) можно повторить."""
+    return getattr(contract, "pdf_jobs", {}).get(kind) == PdfRenderJob.Status.FAILED
+
+
+# ---------------- обработчики ----------------
+
+
+def _render_into(contract: Contract, field_name: str, builder) -> ContractPdfBuildResult:
+    field = getattr(contract, field_name)
+    previous = stored_pdf_fingerprint(contract, field_name)
+    result = builder(contract.id, previous_fingerprint=previous)
+    if result is None:
+        # вход не изменился — сохранённый файл и есть результат
+        return ContractPdfBuildResult(
+            pdf_bytes=read_file_field_bytes(field) or b"",
+            filename=os.path.basename(field.name),
+            fingerprint=previous,
+        )
+    if field:
+        field.delete(save=False)
+    field.save(result.filename, ContentFile(result.pdf_bytes), save=False)
+    record_pdf_fingerprint(contract, field_name, result.fingerprint, result.pdf_bytes)
+    contract.save(update_fields=[field_name, "pdf_fingerprints", "updated_at"])
+    return result
+
+
+def _send(errors: list[str], label: str, send, **kwargs) -> None:
+    try:
+        send(**kwargs)
+    except Exception as exc:
+        errors.append(f"{label}: {exc}")
+
+
+def _handle_created(job: PdfRenderJob, contract: Contract) -> list[str]:
+    # и после пересчёта сумм (flexx.contract_recalc): при неизменном входе отпечаток пропускает рендер
+    _render_into(contract, "contract_pdf", build_contract_pdf)
+    errors: list[str] = []
+    if not job.notify:
+        return errors
+    attachments, file_decrs, has_contract_pdf = build_client_contract_email_payload(
+        contract,
+        primary_pdf_field_name="contract_pdf",
+    )
+    if has_contract_pdf:
+        _send(
+            errors,
+            "client",
+            send_client_contract_created_email,
+            to_email=contract.client.email,
+            first_name=contract.client.first_name or "",
+            last_name=contract.client.last_name or "",
+            file_decrs=file_decrs,
+            attachments=attachments,
+        )
+    _send(
+        errors,
+        "notify",
+        send_client_contract_created_notify_email,
+        client_email=contract.client.email,
+        first_name=contract.client.first_name or "",
+        last_name=contract.client.last_name or "",
+        contract_id=contract.id,
+        issue_title=str(contract.issue),
+    )
+    return errors
+
+
+def _handle_signed(job: PdfRenderJob, contract: Contract) -> list[str]:
+    if not contract.contract_pdf_signed:
+        _render_into(contract, "contract_pdf_signed", build_contract_pdf_client_signed)
+    errors: list[str] = []
+    if not job.notify:
+        return errors
+    attachments, file_decrs, has_signed_pdf = build_client_contract_email_payload(
+        contract,
+        primary_pdf_field_name="contract_pdf_signed",
+    )
+    if has_signed_pdf:
+        _send(
+            errors,
+            "client",
+            send_client_contract_signed_email,
+            to_email=contract.client.email,
+            first_name=contract.client.first_name or "",
+            last_name=contract.client.last_name or "",
+            file_decrs=file_decrs,
+            attachments=attachments,
+        )
+    _send(
+        errors,
+        "notify",
+        send_client_contract_signed_notify_email,
+        client_email=contract.client.email,
+        first_name=contract.client.first_name or "",
+        last_name=contract.client.last_name or "",
+        contract_id=contract.id,
+        issue_title=str(contract.issue),
+    )
+    return errors
+
+
+def _handle_paid(job: PdfRenderJob, contract: Contract) -> list[str]:
+    if not contract.paid_at:
+        return []  # Zahlung inzwischen aufgehoben
+    attachments: list[tuple[str, bytes, str]] = []
+    if contract.contract_pdf_signed:
+        result = _render_into(contract, "contract_pdf_signed_signed", build_contract_pdf_signed)
+        attachments.append((result.filename, result.pdf_bytes, "application/pdf"))
+    errors: list[str] = []
+    if job.notify:
+        _send(
+            errors,
+            "client",
+            send_contract_paid_received_email,
+            to_email=contract.client.email,
+            first_name=contract.client.first_name or "",
+            last_name=contract.client.last_name or "",
+            contract_id=contract.id,
+            issue_title=contract.issue.title,
+            paid_date=contract.paid_at,
+            has_countersigned_contract=bool(attachments),
+            attachments=attachments,
+        )
+    return errors
+
+
+_PDF_JOB_HANDLERS = {
+    PdfRenderJob.Kind.CREATED: _handle_created,
+    PdfRenderJob.Kind.SIGNED: _handle_signed,
+    PdfRenderJob.Kind.PAID: _handle_paid,
+}
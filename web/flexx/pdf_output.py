@@ -0,0 +1,137 @@
+# FILE: web/flexx/pdf_output.py  (новое — 2026-10-17)
+# PURPOSE: Профиль вывода PDF (settings.PDF_OUTPUT_PROFILE): "standard" — как раньше; "compact" — подписи в разрешении
+#          печати (PDF_SIGNATURE_DPI) без «мусорного» RGB под прозрачными пикселями, одинаковые картинки — один XObject,
+#          object streams + linearize (первая страница открывается до загрузки всего файла; письмо / IMAP / скачивание).
+#          Метаданные детерминированы: CreationDate / ModDate — день рендера, /ID — от содержимого (pdf_canvas, save_pdf);
+#          тот же вход -> те же байты (отпечатки, flexx/pdf_fingerprint.py).
+
+from __future__ import annotations
+
+from datetime import date
+import hashlib
+import math
+from io import BytesIO
+
+from django.conf import settings
+import numpy as np
+import pikepdf
+from PIL import Image
+from reportlab.pdfgen import canvas as rl_canvas
+
+PDF_PROFILE_STANDARD = "standard"
+PDF_PROFILE_COMPACT = "compact"
+PDF_PROFILES = (PDF_PROFILE_STANDARD, PDF_PROFILE_COMPACT)
+
+PDF_SIGNATURE_DPI = 300
+
+
+def pdf_output_profile(profile: str | None = None) -> str:
+    profile = profile or getattr(settings, "PDF_OUTPUT_PROFILE", PDF_PROFILE_STANDARD)
+    if profile not in PDF_PROFILES:
+        raise ValueError(f"unknown PDF output profile: {profile}")
+    return profile
+
+
+def pdf_date(day: date) -> str:
+    """Дата PDF без времени рендера (D:YYYYMMDD000000+00'00')."""
+    return f"D:{day:%Y%m%d}000000+00'00'"
+
+
+def pdf_canvas(buffer, *, pagesize, render_date: date | None = None, document_id: str = "") -> rl_canvas.Canvas:
+    """
+    Canvas без текущего времени в выводе (ReportLab invariant): CreationDate / ModDate — render_date
+    (None — фиксированная дата ReportLab), /ID — из document_id. Тот же вход -> те же байты.
+    """
+    c = rl_canvas.Canvas(buffer, pagesize=pagesize, invariant=1)
+    if render_date is not None:
+        c.setDateFormatter(lambda *_: pdf_date(render_date))
+    if document_id:
+        c._doc.updateSignature(document_id)  # публичного API для /ID у ReportLab нет
+    return c
+
+
+def signature_for_print(image: Image.Image, draw_w: float, draw_h: float) -> Image.Image:
+    """
+    Подпись под размер на странице (pt) при PDF_SIGNATURE_DPI; больше не уменьшает.
+    RGB полностью прозрачных пикселей обнуляется — не видно, но Flate сжимает в разы лучше.
+    """
+    max_w = max(1, math.ceil(draw_w / 72.0 * PDF_SIGNATURE_DPI))
+    max_h = max(1, math.ceil(draw_h / 72.0 * PDF_SIGNATURE_DPI))
+    rgba = image if image.mode == "RGBA" else image.convert("RGBA")
+    if rgba.width > max_w or rgba.height > max_h:
+        scale = min(max_w / rgba.width, max_h / rgba.height)
+        size = (max(1, round(rgba.width * scale)), max(1, round(rgba.height * scale)))
+        rgba = rgba.resize(size, Image.LANCZOS)
+    pixels = np.array(rgba, dtype=np.uint8)
+    pixels[pixels[..., 3] == 0, :3] = 0
+    return Image.fromarray(pixels)
+
+
+def _iter_resources(pdf: pikepdf.Pdf):
+    """Resources страниц и вложенных Form XObject (наложения подписи после add_overlay)."""
+    pending = [page.obj.get("/Resources") for page in pdf.pages]
+    seen: set[tuple[int, int]] = set()
+    while pending:
+        resources = pending.pop()
+        if not isinstance(resources, pikepdf.Dictionary) or "/XObject" not in resources:
+            continue
+        if resources.is_indirect:
+            if resources.objgen in seen:
+                continue
+            seen.add(resources.objgen)
+        yield resources
+        for xobj in resources.XObject.values():
+            if xobj.get("/Subtype") == "/Form":
+                pending.append(xobj.get("/Resources"))
+
+
+def _image_key(image: pikepdf.Stream) -> str:
+    digest = hashlib.sha1()
+    for name in ("/Width", "/Height", "/BitsPerComponent", "/ColorSpace", "/Filter", "/DecodeParms", "/Decode"):
+        digest.update(repr(image.get(name)).encode())
+    digest.update(image.read_raw_bytes())
+    smask = image.get("/SMask")
+    if isinstance(smask, pikepdf.Stream):
+        digest.update(b"smask" + _image_key(smask).encode())
+    return digest.hexdigest()
+
+
+def dedupe_images(pdf: pikepdf.Pdf) -> int:
+    """Одинаковые Image XObject -> одна ссылка (неиспользуемые копии qpdf при save не пишет)."""
+    first: dict[str, pikepdf.Object] = {}
+    replaced = 0
+    for resources in _iter_resources(pdf):
+        xobjects = resources.XObject
+        for name in list(xobjects.keys()):
+            xobj = xobjects[name]
+            if xobj.get("/Subtype") != "/Image":
+                continue
+            original = first.setdefault(_image_key(xobj), xobj)
+            if original.objgen != xobj.objgen:
+                xobjects[name] = original
+                replaced += 1
+    return replaced
+
+
+def save_pdf(pdf: pikepdf.Pdf, *, profile: str | None = None) -> bytes:
+    out = BytesIO()
+    if pdf_output_profile(profile) == PDF_PROFILE_COMPACT:
+        dedupe_images(pdf)
+        pdf.save(
+            out,
+            deterministic_id=True,
+            compress_streams=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+            linearize=len(pdf.pages) > 0,  # qpdf не линеаризует документ без страниц (пустой текст договора)
+        )
+    else:
+        pdf.save(out, deterministic_id=True)
+    return out.getvalue()
+
+
+def finalize_pdf_bytes(pdf_bytes: bytes, *, profile: str | None = None) -> bytes:
+    """Вывод ReportLab без pikepdf-шага (Tippgeber-Vertrag): в compact — тот же save_pdf, иначе как есть."""
+    if pdf_output_profile(profile) != PDF_PROFILE_COMPACT:
+        return pdf_bytes
+    with pikepdf.open(BytesIO(pdf_bytes)) as pdf:
+        return save_pdf(pdf, profile=PDF_PROFILE_COMPACT)
@@ -0,0 +1,91 @@
+# FILE: web/flexx/pdf_preview_cache.py  (новое — 2026-10-17)
+# PURPOSE: Кэш PDF-превью на диске (settings.PDF_PREVIEW_CACHE_DIR, не под /media — nginx его не отдаёт):
+#          файл <отпечаток>.pdf, отпечаток = хэш всех входных данных рендера -> он же ETag. Общий для воркеров gunicorn;
+#          запись атомарно (tmp + os.replace), старые файлы (вчерашняя дата в отпечатке и т.п.) удаляются по возрасту.
+
+from __future__ import annotations
+
+from contextlib import suppress
+import os
+from pathlib import Path
+import tempfile
+import threading
+import time
+from typing import Callable
+
+from django.conf import settings
+
+PDF_PREVIEW_CACHE_MAX_AGE = 2 * 24 * 3600  # сек; дата входит в отпечаток — старше двух дней не нужен никому
+_PRUNE_INTERVAL = 3600
+
+_PREVIEW_LOCKS: dict[str, threading.Lock] = {}
+_PREVIEW_LOCKS_GUARD = threading.Lock()
+_LAST_PRUNE = 0.0
+
+
+def preview_cache_dir() -> Path:
+    return Path(settings.PDF_PREVIEW_CACHE_DIR)
+
+
+def _preview_lock(fingerprint: str) -> threading.Lock:
+    with _PREVIEW_LOCKS_GUARD:
+        lock = _PREVIEW_LOCKS.get(fingerprint)
+        if lock is None:
+            lock = _PREVIEW_LOCKS[fingerprint] = threading.Lock()
+        return lock
+
+
+def prune_preview_cache(max_age: float = PDF_PREVIEW_CACHE_MAX_AGE) -> int:
+    """
+    Удалить файлы превью старше max_age секунд; открытые на чтение ответы это не ломает.
+    Блокировки удалённых отпечатков убираются, только если сейчас не захвачены (идущий рендер не теряет свою).
+    """
+    removed: list[str] = []
+    cutoff = time.time() - max_age
+    with suppress(FileNotFoundError):
+        with os.scandir(preview_cache_dir()) as entries:
+            for entry in entries:
+                with suppress(FileNotFoundError):
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+                        removed.append(entry.name.removesuffix(".pdf"))
+    with _PREVIEW_LOCKS_GUARD:
+        for fingerprint in removed:
+            lock = _PREVIEW_LOCKS.get(fingerprint)
+            if lock is not None and not lock.locked():
+                del _PREVIEW_LOCKS[fingerprint]
+    return len(removed)
+
+
+def _write_atomic(path: Path, content: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".preview-", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
+
+
+def cached_preview_path(fingerprint: str, build: Callable[[], bytes]) -> Path:
+    """
+    Путь к готовому PDF для отпечатка; build() — только если файла ещё нет.
+    Параллельные запросы одного отпечатка в процессе ждут один рендер; между процессами — в худшем случае
+    два одинаковых рендера, os.replace оставляет целый файл.
+    """
+    global _LAST_PRUNE
+    path = preview_cache_dir() / f"{fingerprint}.pdf"
+    if path.is_file():
+        return path
+    with _preview_lock(fingerprint):
+        if path.is_file():
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(path, build())
+    now = time.monotonic()
+    if now - _LAST_PRUNE >= _PRUNE_INTERVAL:
+        _LAST_PRUNE = now
+        prune_preview_cache()
+    return path
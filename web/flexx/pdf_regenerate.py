@@ -0,0 +1,342 @@
+# FILE: web/flexx/pdf_regenerate.py  (новое — 2026-10-17)
+# PURPOSE: Массовая перегенерация сохранённых PDF (после изменения текста эмиссии / подписи FleXXLager):
+#          contract_pdf, contract_pdf_signed_signed, TippgeberContract.signed_contract_pdf.
+#          Пул процессов (по ядрам), state-файл для продолжения после обрыва, замена файла атомарно (tmp + os.replace)
+#          под тем же именем — ссылки в БД не меняются, читатель никогда не видит полузаписанный PDF.
+#          Отпечаток входа (pdf_fingerprints) не изменился и файл цел -> документ пропускается (force — рендерить всё).
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import suppress
+from dataclasses import dataclass, field
+from datetime import date
+import os
+import tempfile
+import time
+from typing import Callable, Iterable
+
+from django.db import connections
+from django.utils import timezone
+
+from flexx.models import Contract, PdfRenderJob, TippgeberContract
+from flexx.pdf_contract import _read_file_field_bytes, build_contract_pdf, build_contract_pdf_signed
+from flexx.pdf_fingerprint import record_pdf_fingerprint, stored_pdf_fingerprint
+from flexx.pdf_tippgeber_contract import (
+    build_tippgeber_contract_text_pdf,
+    tippgeber_contract_fingerprint,
+    tippgeber_signature_line_text,
+)
+
+REGENERATE_KIND_CONTRACT = "contract"  # Contract.contract_pdf
+REGENERATE_KIND_PAID = "paid"  # Contract.contract_pdf_signed_signed
+REGENERATE_KIND_TIPPGEBER = "tippgeber"  # TippgeberContract.signed_contract_pdf
+REGENERATE_KINDS = (REGENERATE_KIND_CONTRACT, REGENERATE_KIND_PAID, REGENERATE_KIND_TIPPGEBER)
+
+# как _contract_status_label в app_panel_admin: Erstellt / Signiert / Bezahlt
+REGENERATE_STATUSES = ("created", "signed", "paid")
+
+
+@dataclass(frozen=True)
+class RegenerateResult:
+    kind: str
+    object_id: int
+    ok: bool
+    seconds: float
+    error: str = ""
+    unchanged: bool = False  # отпечаток входа совпал — файл не перерисовывался
+
+    @property
+    def key(self) -> str:
+        return regenerate_state_key(self.kind, self.object_id)
+
+
+@dataclass
+class RegenerateSummary:
+    total: int = 0
+    skipped: int = 0
+    done: int = 0
+    unchanged: int = 0
+    failed: list[RegenerateResult] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def processed(self) -> int:
+        return self.done + len(self.failed)
+
+    def progress_line(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        rate = self.processed / elapsed
+        left = self.total - self.processed
+        eta = f"{int(left / rate) // 60}m{int(left / rate) % 60:02d}s" if rate > 0 else "-"
+        percent = 100.0 * self.processed / self.total if self.total else 100.0
+        return (
+            f"{self.processed}/{self.total} ({percent:.1f}%) {rate:.1f}/s ETA {eta} "
+            f"failed={len(self.failed)} skipped={self.skipped} unchanged={self.unchanged}"
+        )
+
+
+def regenerate_state_key(kind: str, object_id: int) -> str:
+    return f"{kind}:{object_id}"
+
+
+# ---------------- выборка ----------------
+
+
+def _contract_queryset(
+    *,
+    issue_ids: list[int] | None,
+    status: str | None,
+    date_from: date | None,
+    date_to: date | None,
+):
+    qs = Contract.objects.all()
+    if issue_ids:
+        qs = qs.filter(issue_id__in=issue_ids)
+    if status == "paid":
+        qs = qs.filter(paid_at__isnull=False)
+    elif status == "signed":
+        qs = qs.filter(paid_at__isnull=True, signed_received_at__isnull=False)
+    elif status == "created":
+        qs = qs.filter(paid_at__isnull=True, signed_received_at__isnull=True)
+    if date_from:
+        qs = qs.filter(contract_date__gte=date_from)
+    if date_to:
+        qs = qs.filter(contract_date__lte=date_to)
+    return qs
+
+
+def select_documents(
+    kinds: Iterable[str],
+    *,
+    issue_ids: list[int] | None = None,
+    status: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+) -> list[tuple[str, int]]:
+    """
+    [(kind, id)] — только уже сохранённые файлы (перегенерация, не первичное создание).
+    status и даты: Contract — по статусу / contract_date; TippgeberContract — только даты (signed_at).
+    """
+    kinds = set(kinds)
+    items: list[tuple[str, int]] = []
+    contracts = _contract_queryset(issue_ids=issue_ids, status=status, date_from=date_from, date_to=date_to)
+    if REGENERATE_KIND_CONTRACT in kinds:
+        ids = contracts.exclude(contract_pdf="").order_by("id").values_list("id", flat=True)
+        items.extend((REGENERATE_KIND_CONTRACT, i) for i in ids)
+    if REGENERATE_KIND_PAID in kinds:
+        ids = (
+            contracts.exclude(contract_pdf_signed_signed="")
+            .exclude(contract_pdf_signed="")
+            .filter(paid_at__isnull=False)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        items.extend((REGENERATE_KIND_PAID, i) for i in ids)
+    if REGENERATE_KIND_TIPPGEBER in kinds:
+        qs = TippgeberContract.objects.exclude(signed_contract_pdf="").exclude(signature_file="")
+        if issue_ids:
+            qs = qs.filter(issue_id__in=issue_ids)
+        if date_from:
+            qs = qs.filter(signed_at__date__gte=date_from)
+        if date_to:
+            qs = qs.filter(signed_at__date__lte=date_to)
+        items.extend((REGENERATE_KIND_TIPPGEBER, i) for i in qs.order_by("id").values_list("id", flat=True))
+    return items
+
+
+# ---------------- один документ (в процессе пула) ----------------
+
+
+def replace_stored_file(file_field, content: bytes) -> None:
+    """Атомарная замена файла на диске под тем же именем: tmp в той же папке -> fsync -> os.replace."""
+    path = file_field.storage.path(file_field.name)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".regen-", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(content)
+            out.flush()
+            os.fsync(out.fileno())
+        os.chmod(tmp_path, file_field.storage.file_permissions_mode or 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
+
+
+def _contract_created_date(contract: Contract) -> date:
+    # дата, с которой PDF был создан: последнее задание CREATED, иначе Vertragsdatum
+    finished_at = (
+        PdfRenderJob.objects.filter(
+            contract=contract,
+            kind=PdfRenderJob.Kind.CREATED,
+            status=PdfRenderJob.Status.DONE,
+        )
+        .order_by("-id")
+        .values_list("finished_at", flat=True)
+        .first()
+    )
+    if finished_at:
+        return timezone.localdate(finished_at)
+    return contract.contract_date or timezone.localdate()
+
+
+def _store_regenerated(obj, field_name: str, result) -> None:
+    replace_stored_file(getattr(obj, field_name), result.pdf_bytes)
+    record_pdf_fingerprint(obj, field_name, result.fingerprint, result.pdf_bytes)
+    obj.save(update_fields=["pdf_fingerprints"])
+
+
+def _regenerate_contract(object_id: int, force: bool) -> bool:
+    contract = Contract.objects.get(id=object_id)
+    result = build_contract_pdf(
+        contract.id,
+        render_date=_contract_created_date(contract),
+        previous_fingerprint=None if force else stored_pdf_fingerprint(contract, "contract_pdf"),
+    )
+    if result is None:
+        return False
+    _store_regenerated(contract, "contract_pdf", result)
+    return True
+
+
+def _regenerate_paid(object_id: int, force: bool) -> bool:
+    contract = Contract.objects.get(id=object_id)
+    # подпись FleXXLager накладывается на contract_pdf_signed (текст, подписанный клиентом, не меняется)
+    result = build_contract_pdf_signed(
+        contract.id,
+        render_date=contract.paid_at,
+        previous_fingerprint=None if force else stored_pdf_fingerprint(contract, "contract_pdf_signed_signed"),
+    )
+    if result is None:
+        return False
+    _store_regenerated(contract, "contract_pdf_signed_signed", result)
+    return True
+
+
+def _regenerate_tippgeber(object_id: int, force: bool) -> bool:
+    contract = TippgeberContract.objects.select_related("issue", "tippgeber").get(id=object_id)
+    signature_png = _read_file_field_bytes(contract.signature_file)
+    if not signature_png:
+        raise ValueError("Tippgeber-Signatur fehlt.")
+    sign_date = timezone.localdate(contract.signed_at) if contract.signed_at else timezone.localdate()
+    if not force:
+        fingerprint = tippgeber_contract_fingerprint(
+            issue=contract.issue,
+            tippgeber=contract.tippgeber,
+            sign_date=sign_date,
+            tippgeber_signature_png=signature_png,
+        )
+        if fingerprint == stored_pdf_fingerprint(contract, "signed_contract_pdf"):
+            return False
+    result = build_tippgeber_contract_text_pdf(
+        issue=contract.issue,
+        tippgeber=contract.tippgeber,
+        tippgeber_signature_png=signature_png,
+        tippgeber_signature_line_text=tippgeber_signature_line_text(contract.tippgeber, sign_date),
+        sign_date=sign_date,
+    )
+    _store_regenerated(contract, "signed_contract_pdf", result)
+    return True
+
+
+# (id, force) -> False, если вход не изменился и файл не перерисовывался
+_REGENERATORS: dict[str, Callable[[int, bool], bool]] = {
+    REGENERATE_KIND_CONTRACT: _regenerate_contract,
+    REGENERATE_KIND_PAID: _regenerate_paid,
+    REGENERATE_KIND_TIPPGEBER: _regenerate_tippgeber,
+}
+
+
+def regenerate_document(kind: str, object_id: int, force: bool = False) -> RegenerateResult:
+    started = time.perf_counter()
+    try:
+        written = _REGENERATORS[kind](object_id, force)
+    except Exception as exc:
+        return RegenerateResult(kind, object_id, False, time.perf_counter() - started, f"{type(exc).__name__}: {exc}")
+    return RegenerateResult(kind, object_id, True, time.perf_counter() - started, unchanged=not written)
+
+
+def _init_pool_worker() -> None:
+    import django
+    from django.apps import apps
+
+    if not apps.ready:  # spawn / forkserver
+        django.setup()
+
+
+# ---------------- прогон ----------------
+
+
+def read_regenerate_state(path: str) -> set[str]:
+    """Ключи успешно перегенерированных документов из state-файла («kind:id ok»)."""
+    done: set[str] = set()
+    with suppress(FileNotFoundError):
+        with open(path, encoding="utf-8") as state:
+            for line in state:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1] == "ok":
+                    done.add(parts[0])
+    return done
+
+
+def regenerate_documents(
+    items: list[tuple[str, int]],
+    *,
+    workers: int,
+    state_path: str | None = None,
+    resume: bool = False,
+    force: bool = False,
+    on_result: Callable[[RegenerateResult, RegenerateSummary], None] | None = None,
+) -> RegenerateSummary:
+    """
+    workers <= 1 — в текущем процессе; иначе ProcessPoolExecutor.
+    Каждый результат сразу дописывается в state-файл: после обрыва resume=True пропускает готовые.
+    """
+    summary = RegenerateSummary(total=len(items))
+    if resume and state_path:
+        done = read_regenerate_state(state_path)
+        todo = [item for item in items if regenerate_state_key(*item) not in done]
+        summary.skipped = len(items) - len(todo)
+        summary.total = len(todo)
+        items = todo
+
+    state = open(state_path, "a" if resume else "w", encoding="utf-8") if state_path else None
+    try:
+
+        def _record(result: RegenerateResult) -> None:
+            if result.ok:
+                summary.done += 1
+                summary.unchanged += result.unchanged
+            else:
+                summary.failed.append(result)
+            if state is not None:
+                state.write(f"{result.key} {'ok' if result.ok else 'failed'} {result.seconds:.3f}\n")
+                state.flush()
+            if on_result is not None:
+                on_result(result, summary)
+
+        if workers <= 1 or len(items) <= 1:
+            for kind, object_id in items:
+                _record(regenerate_document(kind, object_id, force))
+            return summary
+
+        # дочерние процессы открывают свои соединения; унаследованный сокет БД родителя не используется
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker)
+        try:
+            futures = [pool.submit(regenerate_document, kind, object_id, force) for kind, object_id in items]
+            for future in as_completed(futures):
+                _record(future.result())
+        except BaseException:
+            # Ctrl-C / SIGTERM: очередь не дорабатывать, готовое уже в state-файле
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+        pool.shutdown(wait=True)
+        return summary
+    finally:
+        if state is not None:
+            state.close()
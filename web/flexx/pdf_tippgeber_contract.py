@@ -1,23 +1,37 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+import hashlib
 from io import BytesIO
 import re
+from typing import Iterator
 
 from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfbase.pdfmetrics import getFont, unicode2T1
 from reportlab.lib.utils import ImageReader
-from reportlab.pdfgen import canvas as rl_canvas
+from reportlab.pdfgen.canvas import Canvas
 from PIL import Image
 from django.utils import timezone
 
-from flexx.models import FlexxlagerSignature, TippgeberContractText
+from flexx.models import TippgeberContractText
+from flexx.pdf_contract import get_company_signature
+from flexx.pdf_fingerprint import bytes_sha256, input_fingerprint
+from flexx.pdf_output import (
+    PDF_PROFILE_COMPACT,
+    finalize_pdf_bytes,
+    pdf_canvas,
+    pdf_output_profile,
+    signature_for_print,
+)
 
 
 @dataclass(frozen=True)
 class TippgeberContractTextPdfBuildResult:
     pdf_bytes: bytes
     filename: str
+    fingerprint: str = ""
 
 
 _CENTER_BLOCK_RE = re.compile(r"!!([\s\S]*?)!!")
@@ -27,10 +41,21 @@ _LETTERED_POINT_RE = re.compile(r"^\s*([A-Za-z]\))\s*")
 _BULLET_POINT_RE = re.compile(r"^\s*([•\-])\s+")
 _RESET_LIST_RE = re.compile(r"^\s*%%%\s*")
 _PAGE_BREAK_RE = re.compile(r"\{\s*BR\s*\}")
-_TIPPGEBER_PLACEHOLDER_RE = re.compile(r"\{\s*Tippgeber\s*\}")
-_ISIN_WKN_PLACEHOLDER_RE = re.compile(r"\{\s*WKN\s*/\s*ISIN\s*\}")
-_SIGNATURE_PLACEHOLDER_RE = re.compile(r"\{\s*Unterschrift\s*\}")
+# {Tippgeber} / {WKN / ISIN} / {Unterschrift}: имя плейсхолдера = match.lastgroup
+_PLACEHOLDER_RE = re.compile(
+    r"\{\s*(?:(?P<tippgeber>Tippgeber)|(?P<isin_wkn>WKN\s*/\s*ISIN)|(?P<signature>Unterschrift))\s*\}"
+)
+_PLACEHOLDER_VALUE_SPLIT_RE = re.compile(r"(\n|\t)")
 _SIGNATURE_TABLE_MARKER = "<<FLEXX_SIGNATURE_TABLE>>"
+# символы, с которых не начинается разметка (**, __, ****, {BR}, плейсхолдеры, \n, \t) — токенизатор берёт их куском
+_PLAIN_RUN_RE = re.compile(r"[^*_{\n\t]+")
+_RAW_PLAIN_RUN_RE = re.compile(r"[^*{\n\t]+")
+
+# Потоки на прогон подписания: ReportLab держит GIL, параллелятся zlib (картинки, потоки страниц) и pikepdf.
+TIPPGEBER_RENDER_WORKERS = 4
+
+# Менять при изменении вёрстки / разметки Servicepartner-Vertrag — отпечатки превью (кэш на диске, ETag) станут другими.
+TIPPGEBER_CONTRACT_RENDER_VERSION = 2
 
 
 def _normalize_text(value: str | None) -> str:
@@ -48,21 +73,6 @@ def _build_address_single_line(tippgeber) -> str:
     return street or zip_city
 
 
-def _read_file_field_bytes(file_field) -> bytes | None:
-    if not file_field:
-        return None
-    try:
-        file_field.open("rb")
-        return file_field.read()
-    except Exception:
-        return None
-    finally:
-        try:
-            file_field.close()
-        except Exception:
-            pass
-
-
 def _build_tippgeber_block(tippgeber) -> str:
     if tippgeber is None:
         return ""
@@ -89,15 +99,6 @@ def _build_tippgeber_block(tippgeber) -> str:
     return "\n".join(lines)
 
 
-def _apply_placeholders(text: str, *, issue=None, tippgeber=None) -> str:
-    out = text
-    out = _TIPPGEBER_PLACEHOLDER_RE.sub(_build_tippgeber_block(tippgeber), out)
-    issue_isin_wkn = (getattr(issue, "isin_wkn", "") or "").strip() if issue is not None else ""
-    out = _ISIN_WKN_PLACEHOLDER_RE.sub(issue_isin_wkn, out)
-    out = _SIGNATURE_PLACEHOLDER_RE.sub(_SIGNATURE_TABLE_MARKER, out)
-    return out
-
-
 def _split_center_blocks(text: str) -> list[tuple[bool, str]]:
     chunks: list[tuple[bool, str]] = []
     pos = 0
@@ -114,17 +115,39 @@ def _split_center_blocks(text: str) -> list[tuple[bool, str]]:
     return chunks
 
 
-def _tokenize_text_with_bold(text: str) -> list[tuple[str, str, bool, bool, bool]]:
+def _tokenize_text_with_bold(text: str, *, with_placeholders: bool = False) -> list[tuple[str, str, bool, bool, bool]]:
+    """
+    with_placeholders — текст с плейсхолдерами становится токеном ("template", ((плейсхолдер?, текст | имя), ...), ...):
+    значение подставляется в тот же кусок текста при рендере (_expand_placeholders).
+    """
     tokens: list[tuple[str, str, bool, bool, bool]] = []
     bold_open = False
     underline_open = False
     raw_open = False
     plain_buf: list[str] = []
+    template_parts: list[tuple[bool, str]] = []
 
     def flush_plain() -> None:
-        if plain_buf:
+        if template_parts:
+            if plain_buf:
+                template_parts.append((False, "".join(plain_buf)))
+            tokens.append(("template", tuple(template_parts), bold_open, underline_open, raw_open))
+            template_parts.clear()
+        elif plain_buf:
             tokens.append(("text", "".join(plain_buf), bold_open, underline_open, raw_open))
+        plain_buf.clear()
+
+    def take_placeholder() -> bool:
+        nonlocal i
+        placeholder_match = _PLACEHOLDER_RE.match(text, i) if with_placeholders else None
+        if not placeholder_match:
+            return False
+        if plain_buf:
+            template_parts.append((False, "".join(plain_buf)))
             plain_buf.clear()
+        template_parts.append((True, placeholder_match.lastgroup))
+        i = placeholder_match.end()
+        return True
 
     i = 0
     while i < len(text):
@@ -134,6 +157,13 @@ def _tokenize_text_with_bold(text: str) -> list[tuple[str, str, bool, bool, bool
             i += 4
             continue
         if raw_open:
+            plain_match = _RAW_PLAIN_RUN_RE.match(text, i)
+            if plain_match:
+                plain_buf.append(plain_match.group())
+                i = plain_match.end()
+                continue
+            if take_placeholder():
+                continue
             if text.startswith("**", i):
                 flush_plain()
                 bold_open = not bold_open
@@ -150,12 +180,19 @@ def _tokenize_text_with_bold(text: str) -> list[tuple[str, str, bool, bool, bool
                 plain_buf.append(ch)
             i += 1
             continue
+        plain_match = _PLAIN_RUN_RE.match(text, i)
+        if plain_match:
+            plain_buf.append(plain_match.group())
+            i = plain_match.end()
+            continue
         page_break_match = _PAGE_BREAK_RE.match(text, i)
         if page_break_match:
             flush_plain()
             tokens.append(("page_break", "", bold_open, underline_open, raw_open))
             i = page_break_match.end()
             continue
+        if take_placeholder():
+            continue
         if text.startswith("__", i):
             flush_plain()
             underline_open = not underline_open
@@ -180,6 +217,91 @@ def _tokenize_text_with_bold(text: str) -> list[tuple[str, str, bool, bool, bool
     return tokens
 
 
+def _expand_placeholders(
+    tokens: tuple[tuple[str, str, bool, bool, bool], ...],
+    values: dict[str, str],
+) -> tuple[tuple[str, str, bool, bool, bool], ...]:
+    """
+    "template" -> текст со значениями; переводы строк и табуляции в значениях — как в разметке, остальное (**, __,
+    {BR}) — буквально. Те же токены, что давала прежняя подстановка в строку до разбора.
+    """
+    out: list[tuple[str, str, bool, bool, bool]] = []
+    for token in tokens:
+        if token[0] != "template":
+            out.append(token)
+            continue
+        flags = token[2:]
+        text = "".join(values.get(value, "") if is_placeholder else value for is_placeholder, value in token[1])
+        for piece in _PLACEHOLDER_VALUE_SPLIT_RE.split(text):
+            if piece == "\n":
+                out.append(("newline", "\n", *flags))
+            elif piece == "\t":
+                out.append(("tab", "\t", *flags))
+            elif piece:
+                out.append(("text", piece, *flags))
+    return tuple(out)
+
+
+@dataclass(frozen=True)
+class ParsedContractText:
+    """
+    Разобранная разметка TippgeberContractText: (центрировано, токены) по блокам !!...!!, плейсхолдеры — токенами.
+    line_cache — переносы исходных строк (_break_source_line) для всех рендеров этой версии текста: заново
+    считаются только строки со значениями плейсхолдеров.
+    """
+
+    chunks: tuple[tuple[bool, tuple[tuple[str, str, bool, bool, bool], ...]], ...]
+    placeholders: frozenset[str]
+    version: str = ""  # contract_text_version
+    line_cache: dict = field(default_factory=dict, compare=False, repr=False)
+
+    def expand(self, values: dict[str, str]) -> tuple[tuple[bool, tuple[tuple[str, str, bool, bool, bool], ...]], ...]:
+        return tuple((centered, _expand_placeholders(tokens, values)) for centered, tokens in self.chunks)
+
+    def shared_line_cache(self) -> dict:
+        # строки с данными разных Servicepartner копятся — ограничение по размеру
+        if len(self.line_cache) > _SHARED_LINE_CACHE_MAX:
+            self.line_cache.clear()
+        return self.line_cache
+
+
+# sha1(текст) -> разбор; текст меняется редко, несколько версий на процесс (сброс при переполнении)
+_PARSED_CONTRACT_TEXTS: dict[str, ParsedContractText] = {}
+_PARSED_CONTRACT_TEXTS_MAX = 8
+_SHARED_LINE_CACHE_MAX = 20000
+
+
+def contract_text_version(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _load_contract_text() -> str:
+    return TippgeberContractText.objects.filter(id=1).values_list("text", flat=True).first() or ""
+
+
+def parse_contract_text(text: str) -> ParsedContractText:
+    key = contract_text_version(text)
+    parsed = _PARSED_CONTRACT_TEXTS.get(key)
+    if parsed is None:
+        chunks = tuple(
+            (centered, tuple(_tokenize_text_with_bold(chunk_text, with_placeholders=True)))
+            for centered, chunk_text in _split_center_blocks(_normalize_text(text))
+        )
+        placeholders = frozenset(
+            value
+            for _, tokens in chunks
+            for token in tokens
+            if token[0] == "template"
+            for is_placeholder, value in token[1]
+            if is_placeholder
+        )
+        parsed = ParsedContractText(chunks=chunks, placeholders=placeholders, version=key)
+        if len(_PARSED_CONTRACT_TEXTS) >= _PARSED_CONTRACT_TEXTS_MAX:
+            _PARSED_CONTRACT_TEXTS.clear()
+        _PARSED_CONTRACT_TEXTS[key] = parsed
+    return parsed
+
+
 def _font_name(is_bold: bool) -> str:
     return "Helvetica-Bold" if is_bold else "Helvetica"
 
@@ -188,21 +310,6 @@ def _split_token_text(token_text: str) -> list[str]:
     return _WORD_OR_SPACE_RE.findall(token_text)
 
 
-def _split_long_piece(piece: str, *, max_width: float, font_name: str, font_size: float) -> list[str]:
-    out: list[str] = []
-    buf = ""
-    for ch in piece:
-        next_buf = buf + ch
-        if buf and stringWidth(next_buf, font_name, font_size) > max_width:
-            out.append(buf)
-            buf = ch
-        else:
-            buf = next_buf
-    if buf:
-        out.append(buf)
-    return out or [piece]
-
-
 def _split_inline_bold_markers(text: str, base_bold: bool) -> list[tuple[str, bool]]:
     if "**" not in text:
         return [(text, base_bold)]
@@ -273,8 +380,306 @@ def _strip_leading_whitespace_entries(entries: list[tuple[str, str, bool, bool,
     return out
 
 
+# ---------------- разметка (layout) ----------------
+# Разметка — чистая функция текста: строки с абсолютными x + отступы/разрывы страниц без координаты y.
+# Пагинация (y, showPage) — при отрисовке, она дешёвая. Переносы строк считаются один раз на исходную строку
+# в пределах прогона (TippgeberContractTextRenderer): эмиссии отличаются только строками с {WKN / ISIN}.
+
+_PAGE_WIDTH, _PAGE_HEIGHT = A4
+_MARGIN_LEFT = 36.0
+_MARGIN_RIGHT = 36.0
+_MARGIN_TOP = 42.0
+_MARGIN_BOTTOM = 42.0
+_CONTENT_WIDTH = _PAGE_WIDTH - _MARGIN_LEFT - _MARGIN_RIGHT
+
+_FONT_SIZE = 11.0
+_LEADING = 14.0
+_PARAGRAPH_SPACING = _LEADING * 0.5
+_DOUBLE_NEWLINE_EXTRA_SPACING = _LEADING
+_TAB_STEP = 36.0
+_SIGNATURE_TABLE_HEIGHT = 150.0
+
+# ("line", ((x, text, bold, underlined, width), ...)) | ("gap", dy) | ("page",) | ("signature",)
+_LayoutOp = tuple
+
+
+class _GlyphUnits(dict):
+    """
+    Символ -> ширина глифа в 1/1000 em (int), считается один раз. Сумма целых * 0.001 * size — та же арифметика,
+    что у pdfmetrics.stringWidth (включая Symbol/ZapfDingbats и .notdef), ширины совпадают побитно.
+    """
+
+    def __init__(self, font_name: str):
+        super().__init__()
+        self.font_name = font_name
+
+    def __missing__(self, ch: str) -> int:
+        font = getFont(self.font_name)
+        units = sum(sum(map(f.widths.__getitem__, t)) for f, t in unicode2T1(ch, [font] + font.substitutionFonts))
+        self[ch] = units
+        return units
+
+
+_GLYPH_UNITS = {False: _GlyphUnits(_font_name(False)), True: _GlyphUnits(_font_name(True))}
+
+
+def _text_width(text: str, is_bold: bool) -> float:
+    return sum(map(_GLYPH_UNITS[is_bold].__getitem__, text)) * 0.001 * _FONT_SIZE
+
+
+def _split_long_piece(piece: str, *, max_width: float, is_bold: bool) -> Iterator[tuple[str, float]]:
+    """
+    (часть, ширина) по символам под max_width, лениво. Ширина копится по глифам — раньше stringWidth всего буфера
+    на каждый символ (квадратично по длине), а raw-ветка ещё и пересчитывала весь остаток ради первой части.
+    """
+    glyph_units = _GLYPH_UNITS[is_bold]
+    start = 0
+    buf_units = 0
+    for i, ch in enumerate(piece):
+        units = glyph_units[ch]
+        if i > start and (buf_units + units) * 0.001 * _FONT_SIZE > max_width:
+            yield piece[start:i], buf_units * 0.001 * _FONT_SIZE
+            start = i
+            buf_units = units
+        else:
+            buf_units += units
+    if start < len(piece) or not piece:
+        yield piece[start:], buf_units * 0.001 * _FONT_SIZE
+
+
+def _next_tab_stop(x: float) -> float:
+    return (int(x / _TAB_STEP) + 1) * _TAB_STEP
+
+
+def _line_op(fragments: list[tuple[float, str, bool, bool, float]], centered: bool) -> _LayoutOp:
+    x_offset = 0.0
+    if centered and fragments:
+        width = max(x + w for x, _, _, _, w in fragments)
+        x_offset = max((_CONTENT_WIDTH - width) / 2.0, 0.0)
+    return ("line", tuple((_MARGIN_LEFT + x_offset + x, txt, bold, underlined, w) for x, txt, bold, underlined, w in fragments))
+
+
+def _break_source_line(
+    entries: tuple[tuple[str, str, bool, bool, bool], ...],
+    centered: bool,
+    list_indent_level: int,
+) -> tuple[int, tuple[_LayoutOp, ...]]:
+    """Одна исходная строка -> (новый list_indent_level, строки макета). Не зависит от позиции на странице."""
+    ops: list[_LayoutOp] = []
+    entries = list(entries)
+
+    def flush(line: list[tuple[float, str, bool, bool, float]]) -> None:
+        ops.append(_line_op(line, centered))
+
+    marker_text: str | None = None
+    line_is_raw = any(token_raw for _, _, _, _, token_raw in entries)
+    if not centered and not line_is_raw:
+        plain_line = _line_entries_to_plain(entries)
+        if plain_line.strip() == _SIGNATURE_TABLE_MARKER:
+            return list_indent_level, (("signature",),)
+        reset_match = _RESET_LIST_RE.match(plain_line)
+        if reset_match:
+            entries = _consume_prefix_chars(entries, reset_match.end())
+            list_indent_level = 0
+            plain_line = _line_entries_to_plain(entries)
+        number_match = _NUMBERED_POINT_RE.match(plain_line)
+        letter_match = _LETTERED_POINT_RE.match(plain_line)
+        bullet_match = _BULLET_POINT_RE.match(plain_line)
+        if number_match:
+            marker_text = number_match.group(1)
+            entries = _consume_prefix_chars(entries, number_match.end())
+            entries = _strip_leading_whitespace_entries(entries)
+            list_indent_level = 1
+        elif letter_match and list_indent_level >= 1:
+            marker_text = letter_match.group(1)
+            entries = _consume_prefix_chars(entries, letter_match.end())
+            entries = _strip_leading_whitespace_entries(entries)
+            list_indent_level = 2
+        elif bullet_match and list_indent_level >= 2:
+            marker_text = bullet_match.group(1)
+            entries = _consume_prefix_chars(entries, bullet_match.end())
+            entries = _strip_leading_whitespace_entries(entries)
+            list_indent_level = 3
+        elif bullet_match:
+            marker_text = bullet_match.group(1)
+            entries = _consume_prefix_chars(entries, bullet_match.end())
+            entries = _strip_leading_whitespace_entries(entries)
+            list_indent_level = 1
+
+    content_width = _CONTENT_WIDTH
+    line_indent = 0.0 if line_is_raw else ((_TAB_STEP * list_indent_level) if (list_indent_level > 0 and not centered) else 0.0
+    )
+    line: list[tuple[float, str, bool, bool, float]] = []
+    if marker_text:
+        marker_x = max(line_indent - _TAB_STEP, 0.0)
+        line.append((marker_x, marker_text, False, False, _text_width(marker_text, False)))
+    cursor_x = line_indent
+
+    def add_piece(piece: str, is_bold: bool, is_underlined: bool) -> None:
+        nonlocal line, cursor_x
+        if not piece:
+            return
+        piece_width = _text_width(piece, is_bold)
+        if cursor_x + piece_width <= content_width:
+            line.append((cursor_x, piece, is_bold, is_underlined, piece_width))
+            cursor_x += piece_width
+            return
+        if cursor_x > line_indent:
+            flush(line)
+            line = []
+            cursor_x = line_indent
+        if piece_width <= content_width:
+            if piece.strip():
+                line.append((cursor_x, piece, is_bold, is_underlined, piece_width))
+                cursor_x += piece_width
+            return
+        for part, part_width in _split_long_piece(piece, max_width=content_width - line_indent, is_bold=is_bold):
+            if part_width > content_width:
+                continue
+            if cursor_x + part_width > content_width and cursor_x > line_indent:
+                flush(line)
+                line = []
+                cursor_x = line_indent
+            line.append((cursor_x, part, is_bold, is_underlined, part_width))
+            cursor_x += part_width
+            if cursor_x >= content_width:
+                flush(line)
+                line = []
+                cursor_x = line_indent
+
+    if line_is_raw:
+        for token_type, token_value, token_bold, token_underlined, _ in entries:
+            if token_type == "tab":
+                cursor_x = _next_tab_stop(cursor_x)
+                continue
+            if token_type != "text" or not token_value:
+                continue
+            for seg_text, seg_bold in _split_inline_bold_markers(token_value, token_bold):
+                remaining = seg_text
+                while remaining:
+                    part_limit = max(content_width - cursor_x, 1.0)
+                    first, first_w = next(_split_long_piece(remaining, max_width=part_limit, is_bold=seg_bold))
+                    if cursor_x + first_w > content_width and cursor_x > line_indent:
+                        flush(line)
+                        line = []
+                        cursor_x = line_indent
+                        continue
+                    line.append((cursor_x, first, seg_bold, token_underlined, first_w))
+                    cursor_x += first_w
+                    remaining = remaining[len(first) :]
+                    if remaining:
+                        flush(line)
+                        line = []
+                        cursor_x = line_indent
+    else:
+        for token_type, token_value, token_bold, token_underlined, _ in entries:
+            if token_type == "tab":
+                tab_x = _next_tab_stop(cursor_x)
+                if tab_x > content_width:
+                    flush(line)
+                    line = []
+                    cursor_x = _next_tab_stop(line_indent)
+                else:
+                    cursor_x = tab_x
+                continue
+            for piece in _split_token_text(token_value):
+                add_piece(piece, token_bold, token_underlined)
+
+    if line:
+        flush(line)
+    return list_indent_level, tuple(ops)
+
+
+def _layout_text(text: str, line_cache: dict | None = None) -> tuple[_LayoutOp, ...]:
+    """Текст (после подстановок) -> макет."""
+    chunks = tuple((centered, _tokenize_text_with_bold(chunk_text)) for centered, chunk_text in _split_center_blocks(text))
+    return _layout_chunks(chunks, line_cache)
+
+
+def _layout_chunks(chunks, line_cache: dict | None = None) -> tuple[_LayoutOp, ...]:
+    """Токены по блокам -> макет. line_cache: (строка, centered, уровень списка) -> результат _break_source_line."""
+    line_cache = {} if line_cache is None else line_cache
+    ops: list[_LayoutOp] = []
+    for centered, chunk_tokens in chunks:
+        list_indent_level = 0
+        source_line_entries: list[tuple[str, str, bool, bool, bool]] = []
+        current_line_has_text = False
+
+        def render_source_line() -> None:
+            nonlocal list_indent_level, source_line_entries
+            if not source_line_entries:
+                return
+            key = (tuple(source_line_entries), centered, list_indent_level)
+            source_line_entries = []
+            cached = line_cache.get(key)
+            if cached is None:
+                cached = _break_source_line(*key)
+                line_cache[key] = cached
+            list_indent_level, line_ops = cached
+            ops.extend(line_ops)
+
+        for token_type, token_value, token_bold, token_underlined, token_raw in chunk_tokens:
+            if token_type == "page_break":
+                render_source_line()
+                ops.append(("page",))
+                current_line_has_text = False
+                continue
+            if token_type == "newline":
+                if source_line_entries:
+                    render_source_line()
+                elif token_raw:
+                    # In raw zone every newline is a literal blank line.
+                    ops.append(("gap", _LEADING))
+                if not token_raw:
+                    ops.append(("gap", _PARAGRAPH_SPACING))
+                    if not current_line_has_text:
+                        ops.append(("gap", _DOUBLE_NEWLINE_EXTRA_SPACING))
+                current_line_has_text = False
+                continue
+            source_line_entries.append((token_type, token_value, token_bold, token_underlined, token_raw))
+            if token_type == "text" and token_value.strip():
+                current_line_has_text = True
+
+        render_source_line()
+    return tuple(ops)
+
+
+# ---------------- отрисовка ----------------
+
+
+@dataclass(frozen=True)
+class _PlacedSignature:
+    image: Image.Image
+    draw_w: float
+    draw_h: float
+
+
+def _place_signature(raw: bytes | Image.Image | None, profile: str) -> _PlacedSignature | None:
+    """Декодирование + размер в поле подписи (одна колонка таблицы, высота 44 pt); compact — уменьшение до печати."""
+    if raw is None or (isinstance(raw, bytes) and not raw):
+        return None
+    try:
+        if isinstance(raw, Image.Image):
+            img = raw
+        else:
+            with Image.open(BytesIO(raw)) as raw_img:
+                img = raw_img.convert("RGBA")
+    except Exception:
+        return None
+    if img.width <= 0 or img.height <= 0:
+        return None
+    area_w = max(_CONTENT_WIDTH / 2.0 - 16.0, 1.0)
+    area_h = 44.0
+    scale = min(area_w / float(img.width), area_h / float(img.height))
+    draw_w = float(img.width) * scale
+    draw_h = float(img.height) * scale
+    if profile == PDF_PROFILE_COMPACT:
+        img = signature_for_print(img, draw_w, draw_h)
+    return _PlacedSignature(img, draw_w, draw_h)
+
+
 def _draw_signature_table(
-    c: rl_canvas.Canvas,
+    c: Canvas,
     *,
     y_top: float,
     margin_left: float,
@@ -282,8 +687,8 @@ def _draw_signature_table(
     today_str: str,
     servicepartner_name: str,
     servicepartner_city: str,
-    tippgeber_signature_png: bytes | None,
-    company_signature_png: bytes | None,
+    tippgeber_signature: _PlacedSignature | None,
+    company_signature: _PlacedSignature | None,
 ) -> float:
     col_w = content_width / 2.0
     left_x = margin_left
@@ -305,36 +710,23 @@ def _draw_signature_table(
     c.drawString(left_x + text_pad, y, f"Siegen, {today_str}")
     c.drawString(right_x + text_pad, y, f"{servicepartner_city or '-'}, {today_str}")
 
-    def _draw_signature_png(raw_png: bytes | None, *, area_x: float) -> None:
-        if not raw_png:
+    def _draw_signature_png(signature: _PlacedSignature | None, *, area_x: float) -> None:
+        if signature is None:
             return
         try:
-            with Image.open(BytesIO(raw_png)) as raw_img:
-                img = raw_img.convert("RGBA")
-                img_w = float(img.width)
-                img_h = float(img.height)
-                if img_w <= 0 or img_h <= 0:
-                    return
-                area_w = max(col_w - 16.0, 1.0)
-                area_h = 44.0
-                scale = min(area_w / img_w, area_h / img_h)
-                draw_w = img_w * scale
-                draw_h = img_h * scale
-                draw_x = area_x + text_pad
-                draw_y = y - 72.0
-                c.drawImage(
-                    ImageReader(img),
-                    draw_x,
-                    draw_y,
-                    width=draw_w,
-                    height=draw_h,
-                    mask="auto",
-                )
+            c.drawImage(
+                ImageReader(signature.image),
+                area_x + text_pad,
+                y - 72.0,
+                width=signature.draw_w,
+                height=signature.draw_h,
+                mask="auto",
+            )
         except Exception:
             return
 
-    _draw_signature_png(company_signature_png, area_x=left_x)
-    _draw_signature_png(tippgeber_signature_png, area_x=right_x)
+    _draw_signature_png(company_signature, area_x=left_x)
+    _draw_signature_png(tippgeber_signature, area_x=right_x)
 
     y -= 72.0
     c.setFont("Helvetica", 11.0)
@@ -347,6 +739,141 @@ def _draw_signature_table(
     return y - 14.0
 
 
+def tippgeber_signature_line_text(tippgeber, sign_date: date) -> str:
+    first_name = (getattr(tippgeber, "first_name", "") or "").strip()
+    last_name = (getattr(tippgeber, "last_name", "") or "").strip()
+    return f"{sign_date:%d.%m.%Y} ({first_name} {last_name})".strip()
+
+
+class TippgeberContractTextRenderer:
+    """
+    Один прогон (Servicepartner подписывает все недостающие эмиссии): блок {Tippgeber}, подписи и переносы строк —
+    один раз; разбор текста из БД — parse_contract_text (кэш по версии текста); PDF по эмиссиям — параллельно (build_many).
+    """
+
+    def __init__(
+        self,
+        *,
+        tippgeber=None,
+        tippgeber_signature_png: bytes | None = None,
+        company_signature_png: bytes | None = None,
+        sign_date: date | None = None,
+        profile: str | None = None,
+    ):
+        self.profile = pdf_output_profile(profile)
+        self.parsed = parse_contract_text(_load_contract_text())
+        self.tippgeber = tippgeber
+        self.tippgeber_block = _build_tippgeber_block(tippgeber)
+        self.sign_date = sign_date or timezone.localdate()
+        self.today_str = f"{self.sign_date:%d.%m.%Y}"
+        servicepartner_last = (getattr(tippgeber, "last_name", "") or "").strip()
+        servicepartner_first = (getattr(tippgeber, "first_name", "") or "").strip()
+        self.servicepartner_name = " ".join(part for part in [servicepartner_last, servicepartner_first] if part).strip()
+        self.servicepartner_city = (getattr(tippgeber, "city", "") or "").strip()
+
+        company_signature: bytes | Image.Image | None = company_signature_png
+        if company_signature is None:
+            cached_signature = get_company_signature()
+            company_signature = cached_signature.rgba if cached_signature else None
+        self.company_signature = _place_signature(company_signature, self.profile)
+        self.tippgeber_signature = _place_signature(tippgeber_signature_png, self.profile)
+        self._company_signature_sha = _company_signature_sha(company_signature_png)
+        self._tippgeber_signature_sha = bytes_sha256(tippgeber_signature_png)
+
+        self._line_cache = self.parsed.shared_line_cache()
+        self._layouts: dict[str, tuple[_LayoutOp, ...]] = {}  # значение {WKN / ISIN} -> макет
+
+    def placeholder_values(self, issue) -> dict[str, str]:
+        return {
+            "tippgeber": self.tippgeber_block,
+            "isin_wkn": (getattr(issue, "isin_wkn", "") or "").strip() if issue is not None else "",
+            "signature": _SIGNATURE_TABLE_MARKER,
+        }
+
+    def fingerprint(self, issue) -> str:
+        """= tippgeber_contract_fingerprint для этой эмиссии (версия текста и подписи — уже посчитаны)."""
+        return input_fingerprint(
+            [
+                *_tippgeber_input_parts(
+                    issue=issue,
+                    tippgeber=self.tippgeber,
+                    sign_date=self.sign_date,
+                    profile=self.profile,
+                    text_version=self.parsed.version,
+                    company_signature_sha=self._company_signature_sha,
+                ),
+                self._tippgeber_signature_sha,
+            ]
+        )
+
+    def layout(self, issue) -> tuple[_LayoutOp, ...]:
+        values = self.placeholder_values(issue)
+        # {WKN / ISIN} — единственная подстановка, зависящая от эмиссии
+        key = values["isin_wkn"] if "isin_wkn" in self.parsed.placeholders else ""
+        layout = self._layouts.get(key)
+        if layout is None:
+            layout = _layout_chunks(self.parsed.expand(values), self._line_cache)
+            self._layouts[key] = layout
+        return layout
+
+    def render(self, layout: tuple[_LayoutOp, ...], fingerprint: str = "") -> TippgeberContractTextPdfBuildResult:
+        buffer = BytesIO()
+        c = pdf_canvas(buffer, pagesize=A4, render_date=self.sign_date, document_id=fingerprint)
+        top = _PAGE_HEIGHT - _MARGIN_TOP
+        y = top
+        for op in layout:
+            kind = op[0]
+            if kind == "line":
+                if y < _MARGIN_BOTTOM:
+                    c.showPage()
+                    y = top
+                for x, txt, bold, underlined, width in op[1]:
+                    c.setFont(_font_name(bold), _FONT_SIZE)
+                    c.drawString(x, y, txt)
+                    if underlined and txt:
+                        c.setLineWidth(1.0)
+                        c.line(x, y - 2.2, x + width, y - 2.2)
+                y -= _LEADING
+            elif kind == "gap":
+                y -= op[1]
+            elif kind == "page":
+                c.showPage()
+                y = top
+            elif kind == "signature":
+                if y - _SIGNATURE_TABLE_HEIGHT < _MARGIN_BOTTOM:
+                    c.showPage()
+                    y = top
+                y = _draw_signature_table(
+                    c,
+                    y_top=y,
+                    margin_left=_MARGIN_LEFT,
+                    content_width=_CONTENT_WIDTH,
+                    today_str=self.today_str,
+                    servicepartner_name=self.servicepartner_name,
+                    servicepartner_city=self.servicepartner_city,
+                    tippgeber_signature=self.tippgeber_signature,
+                    company_signature=self.company_signature,
+                )
+        c.save()
+        return TippgeberContractTextPdfBuildResult(
+            pdf_bytes=finalize_pdf_bytes(buffer.getvalue(), profile=self.profile),
+            filename="FleXXLager-Tippgeber-Vertrag.pdf",
+            fingerprint=fingerprint,
+        )
+
+    def build(self, issue) -> TippgeberContractTextPdfBuildResult:
+        return self.render(self.layout(issue), self.fingerprint(issue))
+
+    def build_many(self, issues, *, max_workers: int = TIPPGEBER_RENDER_WORKERS) -> list[TippgeberContractTextPdfBuildResult]:
+        """Макеты — в текущем потоке (общий кэш строк), отрисовка + сжатие — в пуле потоков, порядок как у issues."""
+        layouts = [self.layout(issue) for issue in issues]
+        fingerprints = [self.fingerprint(issue) for issue in issues]
+        if max_workers <= 1 or len(layouts) <= 1:
+            return [self.render(layout, fingerprint) for layout, fingerprint in zip(layouts, fingerprints)]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(layouts))) as pool:
+            return list(pool.map(self.render, layouts, fingerprints))
+
+
 def build_tippgeber_contract_text_pdf(
     *,
     issue=None,
@@ -355,249 +882,83 @@ def build_tippgeber_contract_text_pdf(
     tippgeber_signature_line_text: str = "(Tippgeber)",
     company_signature_png: bytes | None = None,
     company_signature_line_text: str = "(FleXXLager GmbH & Co. KG)",
+    sign_date: date | None = None,
+    profile: str | None = None,
 ) -> TippgeberContractTextPdfBuildResult:
-    raw_text = TippgeberContractText.objects.filter(id=1).values_list("text", flat=True).first() or ""
-    text = _normalize_text(raw_text)
-    text = _apply_placeholders(text, issue=issue, tippgeber=tippgeber)
-    if company_signature_png is None:
-        flexx_sign = FlexxlagerSignature.objects.first()
-        if flexx_sign and flexx_sign.signature:
-            company_signature_png = _read_file_field_bytes(flexx_sign.signature)
-
-    page_width, page_height = A4
-    margin_left = 36.0
-    margin_right = 36.0
-    margin_top = 42.0
-    margin_bottom = 42.0
-    content_width = page_width - margin_left - margin_right
-
-    font_size = 11.0
-    leading = 14.0
-    paragraph_spacing = leading * 0.5
-    double_newline_extra_spacing = leading
-    tab_step = 36.0
-    today_str = f"{timezone.localdate():%d.%m.%Y}"
-    servicepartner_last = (getattr(tippgeber, "last_name", "") or "").strip()
-    servicepartner_first = (getattr(tippgeber, "first_name", "") or "").strip()
-    servicepartner_name = " ".join(part for part in [servicepartner_last, servicepartner_first] if part).strip()
-    servicepartner_city = (getattr(tippgeber, "city", "") or "").strip()
-
-    def next_tab_stop(x: float) -> float:
-        return (int(x / tab_step) + 1) * tab_step
-
-    def draw_line(c: rl_canvas.Canvas, y: float, fragments: list[tuple[float, str, bool, bool]], centered: bool) -> None:
-        if not fragments:
-            return
-        width = max((x + stringWidth(txt, _font_name(bold), font_size)) for x, txt, bold, _ in fragments)
-        x_offset = max((content_width - width) / 2.0, 0.0) if centered else 0.0
-        for x, txt, bold, underlined in fragments:
-            c.setFont(_font_name(bold), font_size)
-            draw_x = margin_left + x_offset + x
-            c.drawString(draw_x, y, txt)
-            if underlined and txt:
-                txt_width = stringWidth(txt, _font_name(bold), font_size)
-                underline_y = y - 2.2
-                c.setLineWidth(1.0)
-                c.line(draw_x, underline_y, draw_x + txt_width, underline_y)
-
-    def flush_line(
-        c: rl_canvas.Canvas,
-        y: float,
-        fragments: list[tuple[float, str, bool, bool]],
-        centered: bool,
-    ) -> tuple[rl_canvas.Canvas, float]:
-        if y < margin_bottom:
-            c.showPage()
-            y = page_height - margin_top
-        draw_line(c, y, fragments, centered)
-        return c, y - leading
-
-    buffer = BytesIO()
-    canvas = rl_canvas.Canvas(buffer, pagesize=A4)
-    y = page_height - margin_top
-
-    chunks = _split_center_blocks(text)
-    for centered, chunk_text in chunks:
-        tokens = _tokenize_text_with_bold(chunk_text)
-        list_indent_level = 0
-        source_line_entries: list[tuple[str, str, bool, bool, bool]] = []
-        current_line_has_text = False
+    renderer = TippgeberContractTextRenderer(
+        tippgeber=tippgeber,
+        tippgeber_signature_png=tippgeber_signature_png,
+        company_signature_png=company_signature_png,
+        sign_date=sign_date,
+        profile=profile,
+    )
+    return renderer.build(issue)
 
-        def render_source_line() -> None:
-            nonlocal canvas, y, list_indent_level, source_line_entries
-            entries = source_line_entries
-            source_line_entries = []
-            if not entries:
-                return
 
-            marker_text: str | None = None
-            line_is_raw = any(token_raw for _, _, _, _, token_raw in entries)
-            if not centered and not line_is_raw:
-                plain_line = _line_entries_to_plain(entries)
-                if plain_line.strip() == _SIGNATURE_TABLE_MARKER:
-                    required_h = 150.0
-                    if y - required_h < margin_bottom:
-                        canvas.showPage()
-                        y = page_height - margin_top
-                    y = _draw_signature_table(
-                        canvas,
-                        y_top=y,
-                        margin_left=margin_left,
-                        content_width=content_width,
-                        today_str=today_str,
-                        servicepartner_name=servicepartner_name,
-                        servicepartner_city=servicepartner_city,
-                        tippgeber_signature_png=tippgeber_signature_png,
-                        company_signature_png=company_signature_png,
-                    )
-                    return
-                reset_match = _RESET_LIST_RE.match(plain_line)
-                if reset_match:
-                    entries = _consume_prefix_chars(entries, reset_match.end())
-                    list_indent_level = 0
-                    plain_line = _line_entries_to_plain(entries)
-                number_match = _NUMBERED_POINT_RE.match(plain_line)
-                letter_match = _LETTERED_POINT_RE.match(plain_line)
-                bullet_match = _BULLET_POINT_RE.match(plain_line)
-                if number_match:
-                    marker_text = number_match.group(1)
-                    entries = _consume_prefix_chars(entries, number_match.end())
-                    entries = _strip_leading_whitespace_entries(entries)
-                    list_indent_level = 1
-                elif letter_match and list_indent_level >= 1:
-                    marker_text = letter_match.group(1)
-                    entries = _consume_prefix_chars(entries, letter_match.end())
-                    entries = _strip_leading_whitespace_entries(entries)
-                    list_indent_level = 2
-                elif bullet_match and list_indent_level >= 2:
-                    marker_text = bullet_match.group(1)
-                    entries = _consume_prefix_chars(entries, bullet_match.end())
-                    entries = _strip_leading_whitespace_entries(entries)
-                    list_indent_level = 3
-                elif bullet_match:
-                    marker_text = bullet_match.group(1)
-                    entries = _consume_prefix_chars(entries, bullet_match.end())
-                    entries = _strip_leading_whitespace_entries(entries)
-                    list_indent_level = 1
-
-            line_indent = 0.0 if line_is_raw else ((tab_step * list_indent_level) if (list_indent_level > 0 and not centered) else 0.0
-            )
-            line: list[tuple[float, str, bool, bool]] = []
-            if marker_text:
-                marker_x = max(line_indent - tab_step, 0.0)
-                line.append((marker_x, marker_text, False, False))
-            cursor_x = line_indent
+_TIPPGEBER_PROFILE_FIELDS = ("company", "first_name", "last_name", "street", "zip_code", "city")
 
-            def add_piece(piece: str, is_bold: bool, is_underlined: bool) -> None:
-                nonlocal line, cursor_x, canvas, y
-                if not piece:
-                    return
-                font_name = _font_name(is_bold)
-                piece_width = stringWidth(piece, font_name, font_size)
-                if cursor_x + piece_width <= content_width:
-                    line.append((cursor_x, piece, is_bold, is_underlined))
-                    cursor_x += piece_width
-                    return
-                if cursor_x > line_indent:
-                    canvas, y = flush_line(canvas, y, line, centered)
-                    line = []
-                    cursor_x = line_indent
-                if stringWidth(piece, font_name, font_size) <= content_width:
-                    if piece.strip():
-                        line.append((cursor_x, piece, is_bold, is_underlined))
-                        cursor_x += stringWidth(piece, font_name, font_size)
-                    return
-                for part in _split_long_piece(piece, max_width=content_width - line_indent, font_name=font_name, font_size=font_size):
-                    part_width = stringWidth(part, font_name, font_size)
-                    if part_width > content_width:
-                        continue
-                    if cursor_x + part_width > content_width and cursor_x > line_indent:
-                        canvas, y = flush_line(canvas, y, line, centered)
-                        line = []
-                        cursor_x = line_indent
-                    line.append((cursor_x, part, is_bold, is_underlined))
-                    cursor_x += part_width
-                    if cursor_x >= content_width:
-                        canvas, y = flush_line(canvas, y, line, centered)
-                        line = []
-                        cursor_x = line_indent
 
-            if line_is_raw:
-                for token_type, token_value, token_bold, token_underlined, _ in entries:
-                    if token_type == "tab":
-                        cursor_x = next_tab_stop(cursor_x)
-                        continue
-                    if token_type != "text" or not token_value:
-                        continue
-                    for seg_text, seg_bold in _split_inline_bold_markers(token_value, token_bold):
-                        remaining = seg_text
-                        while remaining:
-                            part_limit = max(content_width - cursor_x, 1.0)
-                            parts = _split_long_piece(
-                                remaining,
-                                max_width=part_limit,
-                                font_name=_font_name(seg_bold),
-                                font_size=font_size,
-                            )
-                            first = parts[0]
-                            first_w = stringWidth(first, _font_name(seg_bold), font_size)
-                            if cursor_x + first_w > content_width and cursor_x > line_indent:
-                                canvas, y = flush_line(canvas, y, line, centered)
-                                line = []
-                                cursor_x = line_indent
-                                continue
-                            line.append((cursor_x, first, seg_bold, token_underlined))
-                            cursor_x += first_w
-                            remaining = remaining[len(first) :]
-                            if remaining:
-                                canvas, y = flush_line(canvas, y, line, centered)
-                                line = []
-                                cursor_x = line_indent
-            else:
-                for token_type, token_value, token_bold, token_underlined, _ in entries:
-                    if token_type == "tab":
-                        tab_x = next_tab_stop(cursor_x)
-                        if tab_x > content_width:
-                            canvas, y = flush_line(canvas, y, line, centered)
-                            line = []
-                            cursor_x = next_tab_stop(line_indent)
-                        else:
-                            cursor_x = tab_x
-                        continue
-                    for piece in _split_token_text(token_value):
-                        add_piece(piece, token_bold, token_underlined)
+def _company_signature_sha(company_signature_png: bytes | None = None) -> str:
+    if company_signature_png is not None:
+        return bytes_sha256(company_signature_png)
+    company_signature = get_company_signature()
+    return company_signature.sha256 if company_signature else ""
 
-            if line:
-                canvas, y = flush_line(canvas, y, line, centered)
 
-        for token_type, token_value, token_bold, token_underlined, token_raw in tokens:
-            if token_type == "page_break":
-                render_source_line()
-                canvas.showPage()
-                y = page_height - margin_top
-                current_line_has_text = False
-                continue
-            if token_type == "newline":
-                if source_line_entries:
-                    render_source_line()
-                elif token_raw:
-                    # In raw zone every newline is a literal blank line.
-                    y -= leading
-                if not token_raw:
-                    y -= paragraph_spacing
-                    if not current_line_has_text:
-                        y -= double_newline_extra_spacing
-                current_line_has_text = False
-                continue
-            source_line_entries.append((token_type, token_value, token_bold, token_underlined, token_raw))
-            if token_type == "text" and token_value.strip():
-                current_line_has_text = True
+def _tippgeber_input_parts(
+    *,
+    issue,
+    tippgeber,
+    sign_date: date,
+    profile: str | None,
+    text_version: str,
+    company_signature_sha: str,
+) -> list:
+    return [
+        TIPPGEBER_CONTRACT_RENDER_VERSION,
+        pdf_output_profile(profile),
+        text_version,
+        sign_date.isoformat(),
+        getattr(issue, "id", None),
+        (getattr(issue, "isin_wkn", "") or "").strip(),
+        getattr(tippgeber, "id", None),
+        [(getattr(tippgeber, name, "") or "").strip() for name in _TIPPGEBER_PROFILE_FIELDS],
+        company_signature_sha,
+    ]
+
+
+def tippgeber_preview_fingerprint(*, issue, tippgeber, sign_date: date, profile: str | None = None) -> str:
+    """
+    Хэш всех входных данных превью (без подписи Servicepartner): версия вёрстки, профиль PDF, версия текста,
+    дата, {WKN / ISIN}, поля профиля Servicepartner, подпись FleXXLager (sha256).
+    """
+    return input_fingerprint(
+        _tippgeber_input_parts(
+            issue=issue,
+            tippgeber=tippgeber,
+            sign_date=sign_date,
+            profile=profile,
+            text_version=contract_text_version(_load_contract_text()),
+            company_signature_sha=_company_signature_sha(),
+        )
+    )
 
-        render_source_line()
 
-    canvas.save()
-    pdf_bytes = buffer.getvalue()
-    return TippgeberContractTextPdfBuildResult(
-        pdf_bytes=pdf_bytes,
-        filename="FleXXLager-Tippgeber-Vertrag.pdf",
+def tippgeber_contract_fingerprint(
+    *,
+    issue,
+    tippgeber,
+    sign_date: date,
+    tippgeber_signature_png: bytes | None,
+    profile: str | None = None,
+) -> str:
+    """Подписанный Servicepartner-Vertrag (signed_contract_pdf): входы превью + sha256 подписи Servicepartner."""
+    parts = _tippgeber_input_parts(
+        issue=issue,
+        tippgeber=tippgeber,
+        sign_date=sign_date,
+        profile=profile,
+        text_version=contract_text_version(_load_contract_text()),
+        company_signature_sha=_company_signature_sha(),
     )
+    return input_fingerprint([*parts, bytes_sha256(tippgeber_signature_png)])
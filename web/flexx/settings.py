@@ -128,6 +128,17 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # reset/set password links: 7 days
 PASSWORD_RESET_TIMEOUT = 60 * 60 * 24 * 7
 
+# PDF договора + письма: в проде — очередь PdfRenderJob (сервис pdf_worker в docker-compose),
+# в dev (DJANGO_DEBUG=1) — синхронно после commit, без отдельного воркера.
+PDF_RENDER_ASYNC = not DEBUG
+
+# "compact": подписи в разрешении печати, одинаковые картинки один раз, object streams + linearize (flexx/pdf_output.py);
+# "standard" — прежний вывод.
+PDF_OUTPUT_PROFILE = "compact"
+
+# Кэш PDF-превью (Servicepartner-Vertrag) по отпечатку входных данных: в контейнере, не под MEDIA_ROOT (/media отдаёт nginx).
+PDF_PREVIEW_CACHE_DIR = "/app/cache/pdf_preview"
+
 # ---------------- LOGGING (hard-coded) ----------------
 
 LOG_DIR = Path("/app/logs")
@@ -0,0 +1,201 @@
+# FILE: web/flexx/stueckzins_table.py  (новое — 2026-10-17)
+# PURPOSE: Сохранённая Stückzins-Tabelle на эмиссию: строится при сохранении BondIssue,
+#          читается PDF / публичной таблицей / расчётом договора (память процесса → 1 запрос по issue_id).
+#          calc_issue_contract_amounts — расчёт договора с кэшем Stückzins по (issue, settlement_date).
+#          Zinsmethode — issue.day_count_convention (flexx.day_count), входит в ключ таблицы.
+
+from __future__ import annotations
+
+from datetime import date
+from decimal import Decimal
+import hashlib
+
+from flexx.contract_helpers import (
+    StueckzinsRow,
+    _contract_amounts,
+    add_banking_days,
+    build_stueckzinsen_rows_for_issue,
+    calc_stueckzins_for_date,
+)
+from flexx.day_count import get_day_count
+from flexx.models import BondIssue, BondIssueStueckzinsTable
+
+# Менять при изменении формата строк или логики расчёта — все таблицы пересоберутся лениво.
+STUECKZINS_TABLE_VERSION = 1
+STUECKZINS_TABLE_DECIMALS = 6
+STUECKZINS_TABLE_HOLIDAY_COUNTRY = "DE"
+
+# Поля BondIssue, от которых зависит таблица (для save(update_fields=...)).
+STUECKZINS_TABLE_SOURCE_FIELDS = frozenset(
+    {"issue_date", "term_months", "interest_rate", "bond_price", "holiday_subdiv", "day_count_convention"}
+)
+
+_ROWS_CACHE: dict[int, tuple[str, list[StueckzinsRow]]] = {}
+
+# (issue_id, table_key, pay_date) -> Stückzins одной облигации; сбрасывается целиком при переполнении.
+_ST_ON_DATE_CACHE: dict[tuple[int, str, date], Decimal] = {}
+_ST_ON_DATE_CACHE_MAX = 50000
+
+
+def _quantize_2(value) -> Decimal:
+    return Decimal(str(value)).quantize(Decimal("0.01"))
+
+
+def _table_params(issue: BondIssue) -> dict | None:
+    if not (issue.issue_date and issue.term_months and issue.interest_rate is not None and issue.bond_price is not None):
+        return None
+    return {
+        "issue_date": issue.issue_date,
+        "term_months": int(issue.term_months),
+        "interest_rate_percent": _quantize_2(issue.interest_rate),
+        "nominal_value": _quantize_2(issue.bond_price),
+        "decimals": STUECKZINS_TABLE_DECIMALS,
+        "holiday_country": STUECKZINS_TABLE_HOLIDAY_COUNTRY,
+        "holiday_subdiv": issue.holiday_subdiv or None,
+        "day_count": get_day_count(issue.day_count_convention).code,
+    }
+
+
+def stueckzins_table_key(issue: BondIssue) -> str:
+    params = _table_params(issue)
+    if params is None:
+        return ""
+    raw = "|".join(
+        [
+            f"v{STUECKZINS_TABLE_VERSION}",
+            params["issue_date"].isoformat(),
+            str(params["term_months"]),
+            str(params["interest_rate_percent"]),
+            str(params["nominal_value"]),
+            str(params["decimals"]),
+            params["holiday_country"],
+            params["holiday_subdiv"] or "",
+            params["day_count"],
+        ]
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _serialize_rows(rows: list[StueckzinsRow]) -> list[list]:
+    return [
+        [r.pay_date.isoformat(), str(r.stueckzins), r.stueckzins_de, r.is_weekend, r.is_holiday, r.holiday_name]
+        for r in rows
+    ]
+
+
+def _deserialize_rows(raw_rows: list) -> list[StueckzinsRow]:
+    return [
+        StueckzinsRow(
+            pay_date=date.fromisoformat(pay_date),
+            stueckzins=Decimal(stueckzins),
+            stueckzins_de=stueckzins_de,
+            is_weekend=bool(is_weekend),
+            is_holiday=bool(is_holiday),
+            holiday_name=holiday_name,
+        )
+        for pay_date, stueckzins, stueckzins_de, is_weekend, is_holiday, holiday_name in raw_rows
+    ]
+
+
+def rebuild_issue_stueckzins_table(issue: BondIssue) -> list[StueckzinsRow]:
+    """Считает таблицу заново и сохраняет её в bond_issue_stueckzins_tables."""
+    params = _table_params(issue)
+    rows = build_stueckzinsen_rows_for_issue(**params) if params is not None else []
+    key = stueckzins_table_key(issue)
+    BondIssueStueckzinsTable.objects.update_or_create(
+        issue_id=issue.id,
+        defaults={
+            "version": STUECKZINS_TABLE_VERSION,
+            "table_key": key,
+            "rows": _serialize_rows(rows),
+        },
+    )
+    _ROWS_CACHE[issue.id] = (key, rows)
+    return rows
+
+
+def ensure_issue_stueckzins_table(issue: BondIssue) -> None:
+    """Пересобирает таблицу, только если ключ (issue_date, term, rate, price, subdiv, Zinsmethode, version) изменился."""
+    key = stueckzins_table_key(issue)
+    stored_key = (
+        BondIssueStueckzinsTable.objects.filter(issue_id=issue.id)
+        .values_list("table_key", flat=True)
+        .first()
+    )
+    if stored_key != key:
+        rebuild_issue_stueckzins_table(issue)
+
+
+def get_issue_stueckzins_rows(issue: BondIssue) -> list[StueckzinsRow]:
+    """
+    Строки Stückzins-Tabelle эмиссии (только чтение, список общий для процесса).
+    Порядок: память процесса → одна выборка по issue_id → пересборка (если таблицы нет или ключ устарел).
+    """
+    key = stueckzins_table_key(issue)
+    if not key:
+        return []
+
+    cached = _ROWS_CACHE.get(issue.id)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    stored = (
+        BondIssueStueckzinsTable.objects.filter(issue_id=issue.id)
+        .values_list("table_key", "rows")
+        .first()
+    )
+    if stored is None or stored[0] != key:
+        return rebuild_issue_stueckzins_table(issue)
+
+    rows = _deserialize_rows(stored[1])
+    _ROWS_CACHE[issue.id] = (key, rows)
+    return rows
+
+
+def get_issue_stueckzins_on(issue: BondIssue, pay_date: date) -> Decimal:
+    """Stückzins одной облигации на pay_date (значение как в таблице, без её загрузки)."""
+    key = stueckzins_table_key(issue)
+    if not key:
+        return Decimal("0")
+
+    cache_key = (issue.id, key, pay_date)
+    st_one = _ST_ON_DATE_CACHE.get(cache_key)
+    if st_one is None:
+        params = _table_params(issue)
+        st_one = calc_stueckzins_for_date(
+            issue_date=params["issue_date"],
+            term_months=params["term_months"],
+            interest_rate_percent=params["interest_rate_percent"],
+            nominal_value=params["nominal_value"],
+            pay_date=pay_date,
+            day_count=params["day_count"],
+        )
+        if len(_ST_ON_DATE_CACHE) >= _ST_ON_DATE_CACHE_MAX:
+            _ST_ON_DATE_CACHE.clear()
+        _ST_ON_DATE_CACHE[cache_key] = st_one
+    return st_one
+
+
+def calc_issue_contract_amounts(
+    issue: BondIssue,
+    *,
+    sign_date: date,
+    quantity: int,
+    banking_days_plus: int = 10,
+) -> tuple[date, Decimal, Decimal, Decimal]:
+    """
+    (settlement_date, nominal_amount, accrued_interest, total_amount) для договора эмиссии —
+    как calc_contract_amounts, праздники по issue.holiday_subdiv, Stückzins из кэша по settlement_date.
+    """
+    settlement_date = add_banking_days(
+        sign_date,
+        banking_days_plus,
+        holiday_country=STUECKZINS_TABLE_HOLIDAY_COUNTRY,
+        holiday_subdiv=issue.holiday_subdiv or None,
+    )
+    return _contract_amounts(
+        settlement_date=settlement_date,
+        nominal_value=_quantize_2(issue.bond_price),
+        quantity=quantity,
+        st_one=get_issue_stueckzins_on(issue, settlement_date),
+    )
@@ -14,3 +14,17 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'flexx.settings')
 
 application = get_wsgi_application()
+
+# подпись FleXXLager в кэш процесса до первого PDF (get_company_signature) — в начале первого запроса воркера,
+# не при импорте: с gunicorn --preload импорт идёт в master, и его соединение с БД унаследовали бы все воркеры
+from django.core.signals import request_started
+
+from flexx.pdf_contract import warm_company_signature
+
+
+def _warm_on_first_request(**kwargs):
+    request_started.disconnect(_warm_on_first_request)
+    warm_company_signature()
+
+
+request_started.connect(_warm_on_first_request)
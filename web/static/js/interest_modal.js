@@ -1,5 +1,6 @@
-// FILE: web/static/js/interest_modal.js  (обновлено — 2026-02-16)
+// FILE: web/static/js/interest_modal.js  (обновлено — 2026-10-17)
 // PURPOSE: Навешивает handlers после загрузки DOM (работает даже если скрипт подключён в <head>).
+//          Stückzinstabelle по годам: JSON-оглавление + сегмент по запросу, рендер на клиенте, кэш в памяти страницы.
 
 (() => {
   const init = () => {
@@ -8,6 +9,11 @@
     const panel = modal ? modal.querySelector("[data-interest-modal-panel]") : null;
     if (!modal || !body) return;
 
+    // issueId -> Promise(оглавление); `${issueId}:${index}` -> Promise(сегмент)
+    const tocCache = new Map();
+    const segmentCache = new Map();
+    let openToken = 0;
+
     const openModal = () => {
       modal.classList.remove("hidden");
       modal.setAttribute("aria-hidden", "false");
@@ -15,27 +21,193 @@
     };
 
     const closeModal = () => {
+      openToken += 1;
       modal.classList.add("hidden");
       modal.setAttribute("aria-hidden", "true");
-      body.innerHTML = "Laden...";
+      body.textContent = "Laden...";
       document.body.style.overflow = "";
     };
 
+    const fetchJson = async (url) => {
+      const resp = await fetch(url, { credentials: "same-origin" });
+      if (!resp.ok) throw new Error(`${resp.status} ${resp.statusText}`);
+      return resp.json();
+    };
+
+    const cached = (cache, key, load) => {
+      if (!cache.has(key)) {
+        const p = load().catch((err) => {
+          cache.delete(key); // повторная попытка при следующем открытии
+          throw err;
+        });
+        cache.set(key, p);
+      }
+      return cache.get(key);
+    };
+
+    const baseUrl = (id) => `/issue/${encodeURIComponent(id)}/interest-table/segments/`;
+    const getToc = (id) => cached(tocCache, id, () => fetchJson(baseUrl(id)));
+    const getSegment = (id, index) =>
+      cached(segmentCache, `${id}:${index}`, () => fetchJson(`${baseUrl(id)}${index}/`));
+
+    const el = (tag, className, text) => {
+      const node = document.createElement(tag);
+      if (className) node.className = className;
+      if (text !== undefined) node.textContent = text;
+      return node;
+    };
+
+    const tableShell = () => {
+      const table = el("table", "border border-[var(--text)] text-sm border-separate border-spacing-0 table-fixed");
+      table.style.width = "320px";
+      const colgroup = el("colgroup");
+      for (let i = 0; i < 2; i += 1) {
+        const col = el("col");
+        col.style.width = "150px";
+        colgroup.appendChild(col);
+      }
+      table.appendChild(colgroup);
+      return table;
+    };
+
+    const columnsGrid = (extra) => {
+      const grid = el("div", `${extra} grid gap-7`);
+      grid.style.gridTemplateColumns = "repeat(3, 325px)";
+      return grid;
+    };
+
+    const renderHeader = (issue) => {
+      const wrap = el("div", "shrink-0 bg-white pb-4 border-b border-gray-200");
+      const rowEl = el("div", "flex items-start");
+      const left = el("div", "flex-1");
+      left.appendChild(el("div", "text-lg font-semibold", "Stückzinstabelle"));
+      left.appendChild(el("div", "text-sm text-gray-600 mt-1", `${issue.issue_date}: ${issue.title} · EUR ${issue.bond_price}`));
+
+      const right = el("div", "flex items-center gap-2");
+      const closeText = el("button", "underline hover:text-[var(--accent)] transition whitespace-nowrap", "Schließen");
+      closeText.type = "button";
+      closeText.setAttribute("data-interest-modal-close", "");
+      const closeX = el(
+        "button",
+        "h-8 w-8 inline-flex items-center justify-center rounded-md border border-[var(--text)] hover:bg-gray-100 transition",
+        "✕",
+      );
+      closeX.type = "button";
+      closeX.setAttribute("data-interest-modal-close", "");
+      closeX.setAttribute("aria-label", "Schließen");
+      right.append(closeText, closeX);
+
+      rowEl.append(left, right);
+      wrap.appendChild(rowEl);
+      return wrap;
+    };
+
+    const renderColumnHeads = (issue) => {
+      const grid = columnsGrid("mt-4 shrink-0");
+      for (let i = 0; i < 3; i += 1) {
+        const table = tableShell();
+        const thead = el("thead", "bg-white");
+        const tr = el("tr");
+        const th1 = el("th", "border border-[var(--text)] px-2 py-2 text-center text-xs font-semibold leading-tight bg-white align-middle");
+        th1.append("Stückzinsen je Teilschuld-", el("br"), `verschreibung zu EUR ${issue.bond_price}`, el("br"), "in EUR");
+        const th2 = el("th", "border border-[var(--text)] px-2 py-2 text-center text-xs font-semibold leading-tight bg-white align-middle", "Datum der Einzahlung");
+        tr.append(th1, th2);
+        thead.appendChild(tr);
+        table.appendChild(thead);
+        grid.appendChild(table);
+      }
+      return grid;
+    };
+
+    const rowClass = (row, today) => {
+      const [isoDate, , , kind] = row;
+      if (isoDate < today) return "bg-gray-100";
+      if (kind === "h") return "bg-red-100";
+      if (kind === "w") return "bg-yellow-100";
+      return "";
+    };
+
+    // как в issue_interest_table.html: строки сегмента в 3 колонки по ceil(n / 3)
+    const renderSegmentRows = (segment) => {
+      const rows = segment.rows || [];
+      const perCol = Math.ceil(rows.length / 3);
+      const grid = columnsGrid("mt-2");
+      for (let c = 0; c < 3; c += 1) {
+        const table = tableShell();
+        const tbody = el("tbody");
+        for (const row of rows.slice(c * perCol, (c + 1) * perCol)) {
+          const tr = el("tr", rowClass(row, segment.today));
+          if (row[4]) tr.title = row[4];
+          tr.appendChild(el("td", "border border-[var(--text)] px-2 py-1 text-center align-middle", row[2]));
+          tr.appendChild(el("td", "border border-[var(--text)] px-2 py-1 text-center align-middle", row[1]));
+          tbody.appendChild(tr);
+        }
+        table.appendChild(tbody);
+        grid.appendChild(table);
+      }
+      return grid;
+    };
+
     const loadIssueTable = async (issueId) => {
       const id = String(issueId || "").trim();
       if (!id) {
-        body.innerHTML = "Fehler: issue_id fehlt.";
+        body.textContent = "Fehler: issue_id fehlt.";
         return;
       }
 
-      const url = `/issue/${encodeURIComponent(id)}/interest-table/`;
-      const resp = await fetch(url, { credentials: "same-origin" });
-      if (!resp.ok) {
-        body.innerHTML = `Fehler: ${resp.status} ${resp.statusText}`;
+      const token = openToken;
+      const toc = await getToc(id);
+      if (token !== openToken) return;
+
+      const root = el("div", "h-full min-h-0 flex flex-col");
+      root.appendChild(renderHeader(toc.issue));
+
+      const segments = toc.segments || [];
+      if (!segments.length) {
+        body.replaceChildren(root);
         return;
       }
+      root.appendChild(renderColumnHeads(toc.issue));
+
+      const tabs = el("div", "mt-3 shrink-0 flex flex-wrap gap-2");
+      const content = el("div", "mt-2 flex-1 min-h-0 overflow-y-scroll");
+      content.style.scrollbarGutter = "stable";
+      if (segments.length > 1) root.appendChild(tabs);
+      root.appendChild(content);
+      body.replaceChildren(root);
+
+      const tabButtons = segments.map((seg) => {
+        const btn = el("button", "px-3 py-1 rounded-md border border-gray-400 text-xs hover:bg-gray-100 transition", seg.label);
+        btn.type = "button";
+        btn.addEventListener("click", () => showSegment(seg.index));
+        tabs.appendChild(btn);
+        return btn;
+      });
+
+      const showSegment = async (index) => {
+        tabButtons.forEach((btn, i) => {
+          btn.classList.toggle("bg-gray-100", i === index);
+          btn.classList.toggle("font-semibold", i === index);
+        });
+        content.textContent = "Laden...";
+        try {
+          const segment = await getSegment(id, index);
+          if (token !== openToken) return;
+          const blocks = [];
+          if (segment.label) {
+            blocks.push(el("div", "mt-2 text-sm font-semibold text-[var(--text)]", segment.label));
+          }
+          blocks.push(renderSegmentRows(segment));
+          content.replaceChildren(...blocks);
+          content.scrollTop = 0;
+          // соседний год — заранее, чтобы переключение было мгновенным
+          if (index + 1 < segments.length) getSegment(id, index + 1).catch(() => {});
+        } catch (err) {
+          if (token === openToken) content.textContent = `Fehler: ${err.message || "Laden fehlgeschlagen"}`;
+        }
+      };
 
-      body.innerHTML = await resp.text();
+      await showSegment(Math.min(toc.current || 0, segments.length - 1));
     };
 
     document.addEventListener("click", async (ev) => {
@@ -57,7 +229,7 @@
         try {
           await loadIssueTable(issueId);
         } catch {
-          body.innerHTML = "Fehler beim Laden.";
+          body.textContent = "Fehler beim Laden.";
         }
         return;
       }
@@ -0,0 +1,65 @@
+// FILE: web/static/js/pdf_status.js  (новое — 2026-10-17)
+// PURPOSE: «Dokument wird vorbereitet…» — пока PDF договора в очереди (PdfRenderJob), опрашивает
+//          contracts_pdf_status и подставляет ссылку на готовый файл без перезагрузки страницы;
+//          задание FAILED — текст ошибки вместо «wird vorbereitet» (после перезагрузки действие можно повторить).
+
+(() => {
+  const script = document.currentScript;
+  const statusUrl = script ? script.getAttribute("data-pdf-status-url") : "";
+  const POLL_MS = 3000;
+  const MAX_POLLS = 200; // ~10 минут, дальше — только после перезагрузки
+
+  const init = () => {
+    if (!statusUrl) return;
+    let polls = 0;
+
+    const pending = () => Array.from(document.querySelectorAll("[data-pdf-pending]"));
+
+    const linkFor = (file) => {
+      const a = document.createElement("a");
+      a.href = file.url;
+      a.title = file.name;
+      a.className = "underline hover:text-[var(--accent)] transition";
+      a.textContent = file.name;
+      return a;
+    };
+
+    const poll = async () => {
+      const nodes = pending();
+      if (!nodes.length || polls >= MAX_POLLS) return;
+      polls += 1;
+
+      const ids = Array.from(new Set(nodes.map((n) => n.getAttribute("data-contract-id"))));
+      try {
+        const resp = await fetch(`${statusUrl}?ids=${encodeURIComponent(ids.join(","))}`, {
+          credentials: "same-origin",
+        });
+        if (resp.ok) {
+          const data = await resp.json();
+          for (const node of nodes) {
+            const contract = (data.contracts || {})[node.getAttribute("data-contract-id")] || {};
+            const file = contract[node.getAttribute("data-pdf-kind")];
+            if (file && file.url) {
+              node.replaceWith(linkFor(file));
+            } else if (file && file.status === "failed") {
+              node.removeAttribute("data-pdf-pending");
+              node.className = "text-red-700";
+              node.textContent = "Das Dokument konnte technisch nicht erstellt werden. Bitte laden Sie die Seite neu.";
+            }
+          }
+        }
+      } catch {
+        // сеть — попробуем в следующий раз
+      }
+      if (pending().length) window.setTimeout(poll, POLL_MS);
+    };
+
+    window.setTimeout(poll, POLL_MS);
+  };
+
+  if (document.readyState === "loading") {
+    document.addEventListener("DOMContentLoaded", init);
+  } else {
+    init();
+  }
+})();